@@ -0,0 +1,350 @@
+from collections import namedtuple
+from operator import attrgetter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from experchat.versioned_cache import CacheVersion
+
+# Minimum length (in seconds) of the free part left over after a booking is carved out of a window.
+MIN_SPLIT_SECONDS = 60 * 20
+
+AVAILABILITY_CACHE_KEY_PREFIX = getattr(settings, 'AVAILABILITY_CACHE_KEY_PREFIX', 'AVAILABILITY')
+AVAILABILITY_CACHE_TTL = getattr(settings, 'AVAILABILITY_CACHE_TTL', 60 * 60 * 24)
+# longer than AVAILABILITY_CACHE_TTL, so the slots cached under a version expire first
+AVAILABILITY_CACHE_VERSION_TTL = getattr(settings, 'AVAILABILITY_CACHE_VERSION_TTL', 60 * 60 * 24 * 7)
+
+Window = namedtuple('Window', ['start_time', 'end_time', 'day', 'date_string'])
+
+# Free windows prepared for splitting, all values are integer microseconds since the epoch. offset is the utc offset of
+# the start, which is kept for all the slots of the window like timedelta arithmetic on the localized datetime does.
+FreeInterval = namedtuple('FreeInterval', ['start', 'end', 'offset', 'length_seconds', 'is_past'])
+
+EPOCH = timezone.datetime(1970, 1, 1, tzinfo=timezone.pytz.UTC)
+MICROSECONDS_IN_SECOND = 10 ** 6
+MICROSECONDS_IN_MINUTE = 60 * MICROSECONDS_IN_SECOND
+MICROSECONDS_IN_DAY = 24 * 60 * MICROSECONDS_IN_MINUTE
+MINUTE_LABELS = ['{:02d}:{:02d}'.format(minute // 60, minute % 60) for minute in range(24 * 60)]
+
+
+def window_from_slot(slot):
+    """
+    Build a Window from the slot dict used by experchat.utils.
+    """
+    return Window(slot['start_time'], slot['end_time'], slot.get('day'), slot.get('date_string'))
+
+
+def window_to_slot(window):
+    """
+    Build the slot dict used by experchat.utils from a Window.
+    """
+    return {
+        'start_time': window.start_time,
+        'end_time': window.end_time,
+        'day': window.day,
+        'date_string': window.date_string,
+    }
+
+
+def expand_calendars(calendars, today, num_weeks):
+    """
+    Expand the weekly calendar recurrences into dated UTC windows.
+    Args:
+        calendars (iterable): Calendar objects of one expert
+        today (obj): date from which the recurrences will be calculated
+        num_weeks (int): number of weeks to expand
+    Return:
+        windows (list): Window tuples sorted on start_time and day
+    """
+    windows = []
+    today_weekday = today.weekday()
+    week = timezone.timedelta(days=7)
+
+    for calendar in calendars:
+        time_zone = calendar.timezone
+        if isinstance(time_zone, str):
+            time_zone = timezone.pytz.timezone(time_zone)
+
+        for week_day in calendar.week_days.all():
+            day = week_day.day
+            daydiff = (day - today_weekday - 1) % 7
+            date = today + timezone.timedelta(days=daydiff)
+
+            for _ in range(num_weeks):
+                start_time = timezone.make_aware(
+                    timezone.datetime.combine(date, calendar.start_time), time_zone
+                ).astimezone(timezone.pytz.UTC)
+                end_time = timezone.make_aware(
+                    timezone.datetime.combine(date, calendar.end_time), time_zone
+                ).astimezone(timezone.pytz.UTC)
+                windows.append(Window(start_time, end_time, day, start_time.date()))
+                date += week
+
+    windows.sort(key=attrgetter('start_time', 'day'))
+    return windows
+
+
+def merge_windows(windows):
+    """
+    Merge overlapping windows of the same day in a single pass.
+    Args:
+        windows (list): Window tuples sorted on start_time and day
+    Return:
+        merged (list): Window tuples
+    """
+    merged = []
+    if not windows:
+        return merged
+
+    current = windows[0]
+    for following in windows[1:]:
+        is_mergable = (
+            current.start_time <= following.start_time <= current.end_time and current.day == following.day
+        )
+        if not is_mergable:
+            merged.append(current)
+            current = following
+        elif following.end_time > current.end_time:
+            current = following._replace(start_time=current.start_time)
+
+    merged.append(current)
+    return merged
+
+
+def subtract_booked(windows, booked):
+    """
+    Carve the booked intervals out of the available windows.
+
+    Both inputs are sorted on start time, so this walks them once with a cursor on the windows instead of
+    popping/inserting at the head of a list.
+    Args:
+        windows (list): merged Window tuples sorted on start_time
+        booked (list): (start_time, end_time) tuples sorted on start_time
+    Return:
+        free (list): Window tuples which are still available
+    """
+    available = list(windows)
+    free = []
+    index = 0
+    total = len(available)
+
+    for booked_start, booked_end in booked:
+        if index == total:
+            return free
+
+        # windows ending before this booking starts are not affected by it (or by any later booking)
+        while index < total and booked_start > available[index].end_time:
+            free.append(available[index])
+            index += 1
+
+        # booking starts before the current window, nothing to carve out
+        if index == total or booked_start < available[index].start_time:
+            continue
+
+        window = available[index]
+        if (window.start_time <= booked_start <= window.end_time and
+                window.start_time <= booked_end <= window.end_time):
+            start_time_diff = (booked_start - window.start_time).seconds
+            end_time_diff = (window.end_time - booked_end).seconds
+
+            if start_time_diff >= MIN_SPLIT_SECONDS and end_time_diff >= MIN_SPLIT_SECONDS:
+                free.append(window._replace(end_time=booked_start))
+                available[index] = window._replace(start_time=booked_end)
+            elif start_time_diff >= MIN_SPLIT_SECONDS:
+                free.append(window._replace(end_time=booked_start))
+                index += 1
+            elif end_time_diff >= MIN_SPLIT_SECONDS:
+                available[index] = window._replace(start_time=booked_end)
+            elif end_time_diff == 0:
+                index += 1
+        else:
+            free.append(window)
+            index += 1
+
+    free.extend(available[index:])
+    return free
+
+
+def to_microseconds(value):
+    """
+    Convert a timedelta or an aware datetime (since the epoch) into integer microseconds.
+    """
+    if isinstance(value, timezone.datetime):
+        value = value - EPOCH
+    return (value.days * 24 * 60 * 60 + value.seconds) * MICROSECONDS_IN_SECOND + value.microseconds
+
+
+def to_free_intervals(slots, time_zone, current_time):
+    """
+    Prepare the filtered slots for splitting in durations.
+    Args:
+        slots (list): list of dict of filtered slots
+        time_zone (str): timezone in which the slots will be returned
+        current_time (obj): current datetime, slots before it are not returned
+    Return:
+        intervals (list): FreeInterval tuples
+    """
+    # convert the current_time into same format as the Calendar format
+    current_time = timezone.make_aware(
+        current_time.replace(second=0, microsecond=0, tzinfo=None), timezone.pytz.UTC
+    )
+    local_timezone = None if time_zone == 'UTC' else timezone.pytz.timezone(time_zone)
+    if local_timezone is not None:
+        current_time = current_time.astimezone(local_timezone)
+
+    current = to_microseconds(current_time)
+    current_offset = to_microseconds(current_time.utcoffset())
+
+    intervals = []
+    for slot in slots:
+        start_time = slot['start_time']
+        if local_timezone is not None:
+            start_time = start_time.astimezone(local_timezone)
+
+        start = to_microseconds(start_time)
+        end = to_microseconds(slot['end_time'])
+        offset = to_microseconds(start_time.utcoffset())
+        # same as timedelta.seconds, which ignores the days
+        length_seconds = ((end - start) // MICROSECONDS_IN_SECOND) % (24 * 60 * 60)
+        is_past = start < current and end <= current
+        if start < current:
+            start, offset = current, current_offset
+
+        intervals.append(FreeInterval(start, end, offset, length_seconds, is_past))
+    return intervals
+
+
+def split_intervals(intervals, duration):
+    """
+    Split the free intervals in slots of the passed duration.
+
+    Slot starts are produced with integer arithmetic and only formatted when they are added to the result.
+    Args:
+        intervals (list): FreeInterval tuples
+        duration (int): length of the session in minutes
+    Return:
+        slots (dict): start times (HH:MM) of the slots grouped by date (YYYY-MM-DD) for the duration
+    """
+    step = duration * MICROSECONDS_IN_MINUTE
+    dates = {}
+    slots = {}
+
+    for interval in intervals:
+        if interval.length_seconds < 60 * duration or interval.is_past:
+            continue
+
+        # the first slot starts on the next (local) minute which is a multiple of the duration
+        start = interval.start
+        minute = ((start + interval.offset) // MICROSECONDS_IN_MINUTE) % 60
+        if minute % duration:
+            start += (duration - minute % duration) * MICROSECONDS_IN_MINUTE
+
+        count = (interval.end - start) // step if interval.end >= start else 0
+        for slot_start in range(start + interval.offset, start + interval.offset + count * step, step):
+            day, time_of_day = divmod(slot_start, MICROSECONDS_IN_DAY)
+            slot_date = dates.get(day)
+            if slot_date is None:
+                slot_date = dates[day] = (EPOCH + timezone.timedelta(days=day)).strftime('%Y-%m-%d')
+                slots.setdefault(slot_date, [])
+            slots[slot_date].append({'start_time': MINUTE_LABELS[time_of_day // MICROSECONDS_IN_MINUTE]})
+
+    return slots
+
+
+def get_availability_cache():
+    """
+    Cache backend shared by all the services reading or changing the expert availability.
+    """
+    return caches[getattr(settings, 'AVAILABILITY_CACHE_ALIAS', 'default')]
+
+
+class AvailabilityCache(object):
+    """
+    Versioned cache of the filtered (available minus booked) slots of an expert.
+
+    Every Calendar, week day or session write bumps the expert's version, so slots cached under an older version
+    are never read again and simply expire.
+    """
+    def __init__(self, expert_id):
+        self.expert_id = expert_id
+        self.cache = get_availability_cache()
+
+    @classmethod
+    def get_many_versions(cls, expert_ids):
+        """
+        Get the current versions of many experts with one cache round trip
+        Args:
+            expert_ids (iterable): Expert ids
+        return:
+            versions (dict): version of each expert id
+        """
+        return CacheVersion.get_many({expert_id: cls(expert_id).version() for expert_id in expert_ids})
+
+    @classmethod
+    def get_many_slots(cls, versions, today, num_weeks):
+        """
+        Get the cached slots of many experts with one cache round trip
+        Args:
+            versions (dict): version of each expert id
+            today (obj): date from which the slots are calculated
+            num_weeks (int): number of weeks of slots
+        return:
+            slots (dict): cached slots of each expert id, experts without cached slots are left out
+        """
+        keys = {
+            cls(expert_id).slots_key(version, today, num_weeks): expert_id for expert_id, version in versions.items()
+        }
+        if not keys:
+            return {}
+
+        cached_slots = get_availability_cache().get_many(list(keys))
+        return {keys[key]: slots for key, slots in cached_slots.items()}
+
+    @classmethod
+    def cache_many_slots(cls, slots, versions, today, num_weeks):
+        """
+        Cache the slots of many experts with one cache round trip
+        Args:
+            slots (dict): slots of each expert id
+            versions (dict): version of each expert id
+            today (obj): date from which the slots are calculated
+            num_weeks (int): number of weeks of slots
+        """
+        if not slots:
+            return
+
+        get_availability_cache().set_many({
+            cls(expert_id).slots_key(versions[expert_id], today, num_weeks): expert_slots
+            for expert_id, expert_slots in slots.items()
+        }, AVAILABILITY_CACHE_TTL)
+
+    def version(self):
+        version_key = AVAILABILITY_CACHE_KEY_PREFIX + "_VERSION_{}".format(self.expert_id)
+        return CacheVersion(version_key, AVAILABILITY_CACHE_VERSION_TTL, self.cache)
+
+    def slots_key(self, version, today, num_weeks):
+        """
+        make the key for caching
+        Args:
+            version (int): current version of the expert availability
+            today (obj): date from which the slots are calculated
+            num_weeks (int): number of weeks of slots
+        return:
+            key which needs to be cached
+        """
+        return AVAILABILITY_CACHE_KEY_PREFIX + "_{}_{}_{}_{}".format(
+            self.expert_id, version, today.strftime('%Y-%m-%d'), num_weeks
+        )
+
+    def get_version(self):
+        return self.version().get()
+
+    def get_slots(self, version, today, num_weeks):
+        return self.cache.get(self.slots_key(version, today, num_weeks))
+
+    def cache_slots(self, slots, version, today, num_weeks):
+        self.cache.set(self.slots_key(version, today, num_weeks), slots, AVAILABILITY_CACHE_TTL)
+
+    def invalidate(self):
+        self.version().invalidate()
@@ -0,0 +1,202 @@
+import datetime
+import json
+import random
+import time
+import tracemalloc
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from experchat.enumerations import CallStatus
+from experchat.models.appointments import Calendar, WeekDay
+from experchat.models.session_pricing import SessionPricing
+from experchat.models.sessions import EcDevice, EcSession
+from experchat.models.users import Expert, ExpertProfile
+from experchat.utils import (
+    combine_slots, filter_slots, get_booked_and_available_slots, process_and_merge_slots, split_and_update_price,
+    split_in_duration
+)
+
+User = get_user_model()
+
+STAGES = ('process_and_merge_slots', 'filter_slots', 'split_in_duration', 'split_and_update_price', 'combine_slots')
+
+
+class Command(BaseCommand):
+    """
+    Benchmark the scheduling/slot pipeline on synthetic calendars and bookings.
+
+    The synthetic data is created in a transaction which is rolled back at the end, so nothing is left in the
+    database. Each stage is timed separately, then run once more to count the queries and once under tracemalloc to
+    measure the allocations.
+    """
+    help = 'Benchmark the slot calculation utils on synthetic calendars and bookings.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--experts', type=int, default=10, help='Number of experts.')
+        parser.add_argument('--windows', type=int, default=3, help='Calendar windows per expert.')
+        parser.add_argument('--bookings', type=int, default=10, help='Booked sessions per expert.')
+        parser.add_argument('--weeks', type=int, default=2, help='Weeks of slots (NEXT_SLOTS_LIMIT_WEEKS).')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per stage, the best one is reported.')
+        parser.add_argument('--seed', type=int, default=0, help='Seed for the synthetic data.')
+        parser.add_argument('--baseline', help='Baseline JSON file to compare with.')
+        parser.add_argument('--save-baseline', action='store_true', help='Write the results to the baseline file.')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='Allowed slowdown against the baseline before failing (0.2 is 20%%).'
+        )
+
+    def handle(self, *args, **options):
+        if options['save_baseline'] and not options['baseline']:
+            raise CommandError('--save-baseline needs --baseline.')
+
+        random.seed(options['seed'])
+        with override_settings(NEXT_SLOTS_LIMIT_WEEKS=options['weeks']), transaction.atomic():
+            expert_ids = self.create_data(options)
+            results = self.run_stages(expert_ids, options['repeat'])
+            transaction.set_rollback(True)
+
+        scale = {key: options[key] for key in ('experts', 'windows', 'bookings', 'weeks')}
+        self.report(scale, results)
+
+        if not options['baseline']:
+            return
+
+        if options['save_baseline']:
+            with open(options['baseline'], 'w') as baseline_file:
+                json.dump({'scale': scale, 'results': results}, baseline_file, indent=4, sort_keys=True)
+            self.stdout.write('Baseline saved to {}'.format(options['baseline']))
+            return
+
+        self.compare(options['baseline'], scale, results, options['tolerance'])
+
+    def create_data(self, options):
+        """
+        Create the experts with random calendar windows and bookings inside those windows.
+        """
+        week_days = [WeekDay.objects.get_or_create(day=day)[0] for day in range(1, 8)]
+        for session_length, price in ((10, 20), (20, 40), (30, 50), (60, 70)):
+            SessionPricing.objects.get_or_create(session_length=session_length, defaults={'price': price})
+
+        today = timezone.now().replace(second=0, microsecond=0)
+        expert_ids = []
+        for count in range(options['experts']):
+            user = User.objects.create(email='benchmark{}@example.com'.format(count))
+            expert = Expert.objects.create(userbase=user)
+            expert_profile = ExpertProfile.objects.create(expert=expert)
+            device = EcDevice.objects.create(user=user)
+
+            windows = []
+            for _ in range(options['windows']):
+                start_minute = random.randrange(0, 20 * 60, 5)
+                end_minute = start_minute + random.randrange(60, 4 * 60, 5)
+                calendar = Calendar.objects.create(
+                    title='Benchmark',
+                    expert=expert,
+                    start_time=datetime.time(start_minute // 60, start_minute % 60),
+                    end_time=datetime.time(end_minute // 60, end_minute % 60),
+                    timezone='UTC',
+                )
+                calendar.week_days.set(random.sample(week_days, random.randint(1, 7)))
+                windows.append((start_minute, end_minute))
+
+            for _ in range(options['bookings']):
+                start_minute, end_minute = random.choice(windows)
+                duration = random.choice((10, 20, 30, 60))
+                scheduled_datetime = today.replace(hour=0, minute=0) + timezone.timedelta(
+                    days=random.randrange(options['weeks'] * 7),
+                    minutes=random.randrange(start_minute, max(start_minute + 1, end_minute - duration), 5)
+                )
+                EcSession.objects.create(
+                    expert_profile=expert_profile,
+                    expert=expert,
+                    user=user,
+                    user_device=device,
+                    scheduled_duration=duration,
+                    scheduled_datetime=scheduled_datetime,
+                    call_status=CallStatus.SCHEDULED.value,
+                )
+            expert_ids.append(expert.id)
+        return expert_ids
+
+    def run_stages(self, expert_ids, repeat):
+        """
+        Run every stage for all the experts, each stage gets the output of the previous one as input.
+        """
+        inputs = [get_booked_and_available_slots(expert_id) for expert_id in expert_ids]
+        for available_slots, booked_slots in inputs:
+            # load the calendars once, so only the stages' own queries are counted
+            list(available_slots)
+
+        filtered = [filter_slots(available_slots, booked_slots) for available_slots, booked_slots in inputs]
+        split = [split_in_duration(slots, 30) for slots in filtered]
+        stages = [
+            ('process_and_merge_slots', lambda: [process_and_merge_slots(available) for available, _ in inputs]),
+            ('filter_slots', lambda: [filter_slots(available, booked) for available, booked in inputs]),
+            ('split_in_duration', lambda: [split_in_duration(slots, 30) for slots in filtered]),
+            ('split_and_update_price', lambda: [split_and_update_price(slots) for slots in filtered]),
+            ('combine_slots', lambda: [combine_slots(slots) for slots in split]),
+        ]
+
+        results = {}
+        for name, stage in stages:
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                stage()
+                timings.append(time.perf_counter() - started)
+
+            with CaptureQueriesContext(connection) as queries:
+                stage()
+
+            tracemalloc.start()
+            stage()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            results[name] = {
+                'best_ms': round(min(timings) * 1000, 3),
+                'mean_ms': round(sum(timings) / len(timings) * 1000, 3),
+                'queries': len(queries),
+                'peak_kb': round(peak / 1024, 1),
+            }
+        return results
+
+    def report(self, scale, results):
+        self.stdout.write('experts={experts} windows={windows} bookings={bookings} weeks={weeks}'.format(**scale))
+        self.stdout.write('{:<24}{:>12}{:>12}{:>10}{:>12}'.format('stage', 'best ms', 'mean ms', 'queries', 'peak KB'))
+        for name in STAGES:
+            result = results[name]
+            self.stdout.write('{:<24}{:>12}{:>12}{:>10}{:>12}'.format(
+                name, result['best_ms'], result['mean_ms'], result['queries'], result['peak_kb']
+            ))
+
+    def compare(self, path, scale, results, tolerance):
+        """
+        Fail if any stage is slower, allocates more or runs more queries than the baseline allows.
+        """
+        try:
+            with open(path) as baseline_file:
+                baseline = json.load(baseline_file)
+        except (IOError, ValueError) as e:
+            raise CommandError('Invalid baseline {}: {}'.format(path, e))
+
+        if baseline['scale'] != scale:
+            raise CommandError('Baseline was recorded for {}, not {}.'.format(baseline['scale'], scale))
+
+        regressions = []
+        for name in STAGES:
+            expected, result = baseline['results'][name], results[name]
+            if result['best_ms'] > expected['best_ms'] * (1 + tolerance):
+                regressions.append('{}: {} ms (baseline {} ms)'.format(name, result['best_ms'], expected['best_ms']))
+            if result['peak_kb'] > expected['peak_kb'] * (1 + tolerance):
+                regressions.append('{}: {} KB (baseline {} KB)'.format(name, result['peak_kb'], expected['peak_kb']))
+            if result['queries'] > expected['queries']:
+                regressions.append('{}: {} queries (baseline {})'.format(name, result['queries'], expected['queries']))
+
+        if regressions:
+            raise CommandError('Slot pipeline regressed:\n' + '\n'.join(regressions))
+        self.stdout.write('No regression against {}'.format(path))
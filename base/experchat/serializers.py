@@ -1,4 +1,5 @@
 from django.conf import settings
+from django.db import models
 from django.utils import timezone
 from django.utils.html import strip_tags
 from rest_framework import serializers
@@ -8,7 +9,7 @@ from experchat.models.appointments import Calendar
 from experchat.models.domains import Tag
 from experchat.models.ratings import SessionRating
 from experchat.models.users import Expert, ExpertProfile, FollowExpert, User, UserMedia
-from experchat.utils import combine_slots, filter_slots, get_booked_and_available_slots, split_in_duration
+from experchat.utils import combine_slots, get_available_slots, get_available_slots_bulk, split_in_duration
 
 
 class EmptySerializer(serializers.Serializer):
@@ -113,6 +114,17 @@ class TagSerializer(serializers.ModelSerializer):
         return fields
 
 
+class ExpertProfileBulkListSerializer(serializers.ListSerializer):
+    """
+    Calculates the slots of all the listed experts at once and passes them to each row in the context.
+    """
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.Manager) else data
+        profiles = list(iterable)
+        self.context['available_slots'] = get_available_slots_bulk(profile.expert_id for profile in profiles)
+        return super(ExpertProfileBulkListSerializer, self).to_representation(profiles)
+
+
 class ExpertProfileListSerializer(serializers.ModelSerializer):
     """
     Expert serializer for list action.
@@ -128,11 +140,14 @@ class ExpertProfileListSerializer(serializers.ModelSerializer):
         fields = ('id', 'expert', 'headline', 'calendars', 'following', 'is_featured', 'review_status', 'summary',
                   'content_count', 'profile_submission_timestamp')
         read_only_fields = ('is_featured', 'review_status', 'content_count', 'profile_submission_timestamp')
+        list_serializer_class = ExpertProfileBulkListSerializer
 
     def get_calendars(self, obj):
-        slots = obj.expert.calendars.all().order_by('start_time')
-        available_slots, booked_slots = get_booked_and_available_slots(obj.expert_id)
-        filtered_booked_slots = filter_slots(slots, booked_slots)
+        available_slots = self.context.get('available_slots', {})
+        if obj.expert_id in available_slots:
+            filtered_booked_slots = available_slots[obj.expert_id]
+        else:
+            filtered_booked_slots = get_available_slots(obj.expert_id)
         # GET the slots with 30 min duration
         final_slots = split_in_duration(filtered_booked_slots, 30)
         combined_slots = combine_slots(final_slots, only_till_next_day=True)
@@ -154,9 +169,7 @@ class ExpertProfileDetailSerializer(ExpertProfileSerializer):
     following = serializers.SerializerMethodField()
 
     def get_calendars(self, obj):
-        slots = obj.expert.calendars.all().order_by('start_time')
-        available_slots, booked_slots = get_booked_and_available_slots(obj.expert_id)
-        filtered_booked_slots = filter_slots(slots, booked_slots)
+        filtered_booked_slots = get_available_slots(obj.expert_id)
         # GET the slots with 30 min duration
         final_slots = split_in_duration(filtered_booked_slots, 30)
         combined_slots = combine_slots(final_slots)
@@ -1,6 +1,10 @@
-from django.db.models.signals import pre_save
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
 from django.dispatch import receiver
 
+from experchat.availability import AvailabilityCache
+from experchat.models.appointments import Calendar
+from experchat.models.sessions import EcSession
 from experchat.models.users import UserMedia
 
 
@@ -8,3 +12,45 @@ from experchat.models.users import UserMedia
 def set_primary_media(sender, instance, **kwargs):
     if instance.is_primary:
         UserMedia.objects.filter(owner=instance.owner, is_primary=True).update(is_primary=False)
+
+
+def invalidate_availability(expert_id):
+    """
+    Bump the availability version of the expert once the current transaction is committed, so the slots are not
+    calculated again from the data which is still being written.
+    """
+    transaction.on_commit(lambda: AvailabilityCache(expert_id).invalidate())
+
+
+@receiver(post_save, sender=Calendar)
+@receiver(post_delete, sender=Calendar)
+def calendar_availability_changed(sender, instance, **kwargs):
+    invalidate_availability(instance.expert_id)
+
+
+@receiver(m2m_changed, sender=Calendar.week_days.through)
+def calendar_week_days_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            invalidate_availability(instance.expert_id)
+        return
+
+    # changed from the week day side, the calendars are in pk_set or still linked to the week day before clearing
+    if action in ('post_add', 'post_remove'):
+        calendars = Calendar.objects.filter(pk__in=pk_set)
+    elif action == 'pre_clear':
+        calendars = Calendar.objects.filter(week_days=instance)
+    else:
+        return
+
+    for expert_id in set(calendars.values_list('expert_id', flat=True)):
+        invalidate_availability(expert_id)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def session_availability_changed(sender, instance, **kwargs):
+    # services save sessions through proxy models of EcSession, which send the signals with the proxy as sender
+    if not issubclass(sender, EcSession):
+        return
+    invalidate_availability(instance.expert_id)
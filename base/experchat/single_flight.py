@@ -0,0 +1,175 @@
+import time
+import uuid
+from collections import namedtuple
+
+from django.core.cache import cache as default_cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+# value cached by SingleFlightCache, with the unix time after which it is recomputed
+CacheEntry = namedtuple('CacheEntry', ['value', 'stale_at'])
+
+# deletes the lock only if it still holds the token of the worker, in one step
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlightLock(object):
+    """
+    Lock shared by all the workers through the cache, so only one of them recomputes a value at a time. The lock
+    expires after `timeout` seconds in case its holder dies.
+    """
+    def __init__(self, key, timeout, cache=None):
+        self.key = key
+        self.timeout = timeout
+        self.cache = cache or default_cache
+        self.token = None
+
+    def acquire(self):
+        """
+        Take the lock without waiting
+        return:
+            Boolean True if the lock was taken
+        """
+        token = uuid.uuid4().hex
+        if not self.cache.add(self.key, token, self.timeout):
+            return False
+        self.token = token
+        return True
+
+    def release(self):
+        # the lock may have expired and been taken by another worker meanwhile, only its holder deletes it
+        if self.token is None:
+            return
+        client = getattr(self.cache, 'client', None)
+        if hasattr(client, 'get_client'):
+            # django-redis, compared and deleted atomically
+            client.get_client(write=True).eval(
+                RELEASE_LOCK_SCRIPT, 1, client.make_key(self.key), client.encode(self.token)
+            )
+        elif self.cache.get(self.key) == self.token:
+            self.cache.delete(self.key)
+        self.token = None
+
+    def wait(self, timeout, interval=0.05):
+        """
+        Wait until the lock is released by its holder
+        Args:
+            timeout (float): max. seconds to wait
+            interval (float): seconds between two checks
+        return:
+            Boolean True if the lock was released in time
+        """
+        deadline = time.time() + timeout
+        while self.cache.get(self.key) is not None:
+            if time.time() >= deadline:
+                return False
+            time.sleep(interval)
+        return True
+
+
+class SingleFlight(object):
+    """
+    Recomputation run by one worker at a time, with stale-while-revalidate. The worker which takes the lock
+    recomputes the value while the other ones get the stale value. When there is no stale value, they wait a few
+    seconds for the one being computed instead of computing it as well.
+    """
+    def __init__(self, key, lock_timeout, wait_timeout, cache=None):
+        """
+        Args:
+            key (str): cache key of the lock
+            lock_timeout (int): max. seconds of a computation, the lock expires after that
+            wait_timeout (float): max. seconds the other workers wait for the computation
+            cache (obj): cache backend, the default one if not given
+        """
+        self.lock = SingleFlightLock(key, lock_timeout, cache)
+        self.wait_timeout = wait_timeout
+
+    def run(self, compute, get_stale):
+        """
+        Recompute the value, or get the stale one if another worker is recomputing it
+        Args:
+            compute (callable): computes and caches the value
+            get_stale (callable): gets the cached value, None if there is none
+        return:
+            value, None if there is still none once the other worker is waited for
+        """
+        if self.lock.acquire():
+            try:
+                return compute()
+            finally:
+                self.lock.release()
+
+        value = get_stale()
+        if value is None and self.lock.wait(self.wait_timeout):
+            value = get_stale()
+        return value
+
+
+class SingleFlightCache(object):
+    """
+    Cached value recomputed by one worker at a time, see SingleFlight. The value is fresh for `ttl` seconds and kept
+    for `stale_ttl` more seconds, it is served while it is recomputed.
+    """
+    def __init__(self, key, ttl, stale_ttl=60, lock_timeout=30, wait_timeout=3, cache=None):
+        """
+        Args:
+            key (str): cache key of the value
+            ttl (int or callable): seconds the value is fresh, or a function of the value returning them. The value
+                never expires if it is None
+            stale_ttl (int): seconds the stale value is served while it is recomputed
+            lock_timeout (int): max. seconds of a computation
+            wait_timeout (float): max. seconds the other workers wait for the computation when there is no value,
+                they compute it as well after that
+            cache (obj): cache backend, the default one if not given
+        """
+        self.key = key
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.cache = cache or default_cache
+        self.single_flight = SingleFlight(key + '_LOCK', lock_timeout, wait_timeout, self.cache)
+
+    def get_entry(self):
+        entry = self.cache.get(self.key)
+        # values cached under the key by plain cache.set are ignored
+        return entry if isinstance(entry, CacheEntry) else None
+
+    def get_value(self):
+        entry = self.get_entry()
+        return entry.value if entry is not None else None
+
+    def set(self, value):
+        ttl = self.ttl(value) if callable(self.ttl) else self.ttl
+        if ttl is DEFAULT_TIMEOUT:
+            ttl = self.cache.default_timeout
+        if ttl is None:
+            self.cache.set(self.key, CacheEntry(value, float('inf')), None)
+        else:
+            self.cache.set(self.key, CacheEntry(value, time.time() + ttl), ttl + self.stale_ttl)
+
+    def compute(self, compute):
+        value = compute()
+        self.set(value)
+        return value
+
+    def get(self, compute, force=False):
+        """
+        Get the value, recomputing it once it is stale
+        Args:
+            compute (callable): computes the value, which can't be None
+            force (bool): the cached value can't be used, even a stale one
+        return:
+            value
+        """
+        entry = None if force else self.get_entry()
+        if entry is not None and entry.stale_at > time.time():
+            return entry.value
+
+        value = self.single_flight.run(lambda: self.compute(compute), (lambda: None) if force else self.get_value)
+        if value is None:
+            # the other worker failed or is stuck
+            return self.compute(compute)
+        return value
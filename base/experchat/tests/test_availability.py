@@ -0,0 +1,135 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from experchat.availability import AvailabilityCache, Window, merge_windows, subtract_booked
+from experchat.models.appointments import Calendar, WeekDay
+from experchat.models.sessions import EcDevice, EcSession
+from experchat.models.users import Expert, ExpertProfile
+from experchat.utils import get_available_slots, get_available_slots_bulk
+
+User = get_user_model()
+
+
+def _at(hour, minute=0, day=5):
+    return timezone.datetime(2017, 4, day, hour, minute, tzinfo=timezone.pytz.UTC)
+
+
+class TestAvailabilityEngine:
+    """
+    Test merging and filtering of availability windows.
+    """
+
+    def test_merge_overlapping_windows(self):
+        windows = [
+            Window(_at(10), _at(11), 3, _at(10).date()),
+            Window(_at(10, 30), _at(12), 3, _at(10).date()),
+            Window(_at(11, 30), _at(11, 45), 3, _at(10).date()),
+            Window(_at(13), _at(14), 3, _at(10).date()),
+        ]
+        assert merge_windows(windows) == [
+            Window(_at(10), _at(12), 3, _at(10).date()),
+            Window(_at(13), _at(14), 3, _at(10).date()),
+        ]
+
+    def test_merge_keeps_windows_of_different_days(self):
+        windows = [
+            Window(_at(10), _at(11), 3, _at(10).date()),
+            Window(_at(10, 30), _at(12), 4, _at(10).date()),
+        ]
+        assert merge_windows(windows) == windows
+
+    def test_subtract_booked_splits_window(self):
+        windows = [Window(_at(10), _at(12), 3, _at(10).date())]
+        booked = [(_at(10, 30), _at(11))]
+        assert subtract_booked(windows, booked) == [
+            Window(_at(10), _at(10, 30), 3, _at(10).date()),
+            Window(_at(11), _at(12), 3, _at(10).date()),
+        ]
+
+    def test_subtract_booked_drops_short_remainders(self):
+        windows = [
+            Window(_at(10), _at(11), 3, _at(10).date()),
+            Window(_at(12), _at(13), 3, _at(10).date()),
+        ]
+        booked = [(_at(10, 10), _at(10, 30)), (_at(12, 30), _at(12, 50))]
+        assert subtract_booked(windows, booked) == [
+            Window(_at(10, 30), _at(11), 3, _at(10).date()),
+            Window(_at(12), _at(12, 30), 3, _at(10).date()),
+        ]
+
+    def test_subtract_booked_without_windows(self):
+        assert subtract_booked([], [(_at(10), _at(11))]) == []
+
+
+class TestAvailabilityCache(TestCase):
+    """
+    Test the versioned availability cache.
+    """
+
+    def test_invalidate_bumps_version(self):
+        availability_cache = AvailabilityCache(1)
+        version = availability_cache.get_version()
+        availability_cache.invalidate()
+        assert availability_cache.get_version() == version + 1
+
+    @mock.patch('experchat.utils.get_booked_and_available_slots', return_value=([], []))
+    def test_get_available_slots_from_cache(self, mock_get_booked_and_available_slots):
+        assert get_available_slots(2) == []
+        assert get_available_slots(2) == []
+        assert mock_get_booked_and_available_slots.call_count == 1
+
+        AvailabilityCache(2).invalidate()
+        assert get_available_slots(2) == []
+        assert mock_get_booked_and_available_slots.call_count == 2
+
+
+class TestAvailableSlotsBulk(TestCase):
+    """
+    Test calculating the slots of many experts at once.
+    """
+
+    def setUp(self):
+        cache.clear()
+        for day in [1, 2, 3, 4, 5, 6, 7]:
+            WeekDay.objects.create(day=day)
+
+        self.expert_ids = []
+        for count in range(3):
+            user = User.objects.create(email='expert{}@example.com'.format(count), is_email_verified=True)
+            expert = Expert.objects.create(userbase=user)
+            expert_profile = ExpertProfile.objects.create(expert=expert)
+            device = EcDevice.objects.create(user=user)
+            for start_time, end_time in [('09:00', '12:00'), ('14:00', '18:00')]:
+                calendar = Calendar.objects.create(
+                    title='Slots', expert=expert, start_time=start_time, end_time=end_time, timezone='UTC'
+                )
+                calendar.week_days.set([1, 2, 3, 4, 5, 6, 7])
+            EcSession.objects.create(
+                expert_profile=expert_profile,
+                expert=expert,
+                user=user,
+                user_device=device,
+                scheduled_duration=30,
+                scheduled_datetime=timezone.now().replace(hour=10, minute=0, second=0, microsecond=0) +
+                timezone.timedelta(days=1)
+            )
+            self.expert_ids.append(expert.id)
+
+    def test_bulk_matches_single_expert_slots(self):
+        slots = get_available_slots_bulk(self.expert_ids)
+        cache.clear()
+        for expert_id in self.expert_ids:
+            assert slots[expert_id]
+            assert slots[expert_id] == get_available_slots(expert_id)
+
+    def test_bulk_queries_do_not_grow_with_experts(self):
+        # calendars, week days and sessions
+        with self.assertNumQueries(3):
+            get_available_slots_bulk(self.expert_ids)
+
+        with self.assertNumQueries(0):
+            get_available_slots_bulk(self.expert_ids)
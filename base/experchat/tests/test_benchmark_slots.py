@@ -0,0 +1,48 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+import pytest
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from experchat.models.appointments import Calendar
+from experchat.models.sessions import EcSession
+
+
+class TestBenchmarkSlots(TestCase):
+    """
+    Test the slot pipeline benchmark command on a tiny scale.
+    """
+
+    def setUp(self):
+        self.baseline = os.path.join(tempfile.mkdtemp(), 'baseline.json')
+        self.options = {'experts': 2, 'windows': 2, 'bookings': 3, 'repeat': 1, 'stdout': StringIO()}
+
+    def tearDown(self):
+        if os.path.exists(self.baseline):
+            os.remove(self.baseline)
+
+    def test_benchmark_saves_baseline_and_rolls_back_data(self):
+        call_command('benchmark_slots', baseline=self.baseline, save_baseline=True, **self.options)
+
+        with open(self.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        assert set(baseline['results']) == {
+            'process_and_merge_slots', 'filter_slots', 'split_in_duration', 'split_and_update_price', 'combine_slots'
+        }
+        assert not Calendar.objects.exists()
+        assert not EcSession.objects.exists()
+
+    def test_benchmark_fails_on_regression(self):
+        call_command('benchmark_slots', baseline=self.baseline, save_baseline=True, **self.options)
+
+        with open(self.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        baseline['results']['filter_slots']['queries'] = -1
+        with open(self.baseline, 'w') as baseline_file:
+            json.dump(baseline, baseline_file)
+
+        with pytest.raises(CommandError):
+            call_command('benchmark_slots', baseline=self.baseline, tolerance=100, **self.options)
@@ -0,0 +1,100 @@
+import time
+from unittest import mock
+
+from django.core.cache import cache
+
+from experchat.single_flight import RELEASE_LOCK_SCRIPT, SingleFlight, SingleFlightCache, SingleFlightLock
+
+
+class TestSingleFlightCache:
+    """
+    Test the cache recomputed by one worker at a time.
+    """
+    def setup_method(self):
+        cache.clear()
+        self.computed = []
+
+    def compute(self):
+        self.computed.append(len(self.computed))
+        return len(self.computed)
+
+    def test_fresh_value_is_not_recomputed(self):
+        single_flight = SingleFlightCache('SINGLE_FLIGHT', 60)
+        assert single_flight.get(self.compute) == 1
+        assert single_flight.get(self.compute) == 1
+        assert single_flight.get(self.compute, force=True) == 2
+
+    def test_stale_value_is_served_while_recomputed(self):
+        single_flight = SingleFlightCache('SINGLE_FLIGHT', 60)
+        single_flight.get(self.compute)
+        cache.set(single_flight.key, single_flight.get_entry()._replace(stale_at=time.time() - 1))
+
+        # another worker holds the lock
+        assert SingleFlightLock(single_flight.single_flight.lock.key, 30).acquire()
+        assert single_flight.get(self.compute) == 1
+        assert len(self.computed) == 1
+
+        cache.delete(single_flight.single_flight.lock.key)
+        assert single_flight.get(self.compute) == 2
+
+    def test_missing_value_waits_for_the_other_worker(self):
+        single_flight = SingleFlightCache('SINGLE_FLIGHT', 60, wait_timeout=0.1)
+        assert SingleFlightLock(single_flight.single_flight.lock.key, 30).acquire()
+        # the other worker is stuck, so the value is computed after the wait
+        assert single_flight.get(self.compute) == 1
+
+    def test_ttl_of_the_value(self):
+        single_flight = SingleFlightCache('SINGLE_FLIGHT', lambda value: 0 if value == 1 else 60)
+        assert single_flight.get(self.compute) == 1
+        assert single_flight.get(self.compute) == 2
+        assert single_flight.get(self.compute) == 2
+
+
+class TestSingleFlight:
+    """
+    Test the recomputation run by one worker at a time.
+    """
+    def setup_method(self):
+        cache.clear()
+
+    def test_stale_value_while_another_worker_computes(self):
+        single_flight = SingleFlight('SINGLE_FLIGHT_LOCK', 30, 0.1)
+        assert single_flight.run(lambda: 'fresh', lambda: 'stale') == 'fresh'
+
+        assert SingleFlightLock('SINGLE_FLIGHT_LOCK', 30).acquire()
+        assert single_flight.run(lambda: 'fresh', lambda: 'stale') == 'stale'
+        # nothing to serve once the other worker is waited for
+        assert single_flight.run(lambda: 'fresh', lambda: None) is None
+
+
+class TestSingleFlightLock:
+    """
+    Test the lock shared through the cache.
+    """
+    def setup_method(self):
+        cache.clear()
+
+    def test_only_the_holder_releases_the_lock(self):
+        lock = SingleFlightLock('SINGLE_FLIGHT_LOCK', 30)
+        other_lock = SingleFlightLock('SINGLE_FLIGHT_LOCK', 30)
+        assert lock.acquire()
+        assert not other_lock.acquire()
+        other_lock.release()
+        assert not lock.wait(0.1)
+
+        lock.release()
+        assert lock.wait(0.1)
+        assert other_lock.acquire()
+
+    def test_release_compares_and_deletes_in_redis(self):
+        redis_cache = mock.MagicMock()
+        redis_cache.add.return_value = True
+        lock = SingleFlightLock('SINGLE_FLIGHT_LOCK', 30, redis_cache)
+        assert lock.acquire()
+        lock.release()
+        client = redis_cache.client
+        client.get_client.return_value.eval.assert_called_once_with(
+            RELEASE_LOCK_SCRIPT, 1, client.make_key.return_value, client.encode.return_value
+        )
+        client.encode.assert_called_once_with(redis_cache.add.call_args[0][1])
+        redis_cache.delete.assert_not_called()
@@ -0,0 +1,39 @@
+from unittest import mock
+
+from django.core.cache import cache
+
+from experchat.versioned_cache import CacheVersion
+
+
+class TestCacheVersion:
+    """
+    Test the versions of the cached objects.
+    """
+    def setup_method(self):
+        cache.clear()
+
+    def test_invalidate_bumps_version(self):
+        cache_version = CacheVersion('VERSION_1', 60)
+        version = cache_version.get()
+        cache_version.invalidate()
+        assert cache_version.get() == version + 1
+
+    def test_version_key_expires(self):
+        with mock.patch.object(cache, 'add', wraps=cache.add) as mock_add:
+            CacheVersion('VERSION_1', 60).get()
+        assert mock_add.call_args[0][2] == 60
+
+    def test_expired_version_is_not_reused(self):
+        cache_version = CacheVersion('VERSION_1', 60)
+        version = cache_version.get()
+        cache.delete('VERSION_1')
+        with mock.patch('experchat.versioned_cache.time.time', return_value=version / 1000 + 1):
+            cache_version.invalidate()
+        assert cache_version.get() > version
+
+    def test_get_many_seeds_only_the_missing_versions(self):
+        version = CacheVersion('VERSION_1', 60).get()
+        with mock.patch.object(cache, 'add', wraps=cache.add) as mock_add:
+            versions = CacheVersion.get_many({1: CacheVersion('VERSION_1', 60), 2: CacheVersion('VERSION_2', 60)})
+        assert versions == {1: version, 2: cache.get('VERSION_2')}
+        assert mock_add.call_count == 1
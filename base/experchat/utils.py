@@ -1,7 +1,5 @@
 import datetime
 import io
-from copy import deepcopy
-from operator import itemgetter
 
 from django.conf import settings
 from django.core.files.storage import default_storage
@@ -11,6 +9,10 @@ from django.utils import timezone
 from PIL import Image
 from rest_framework.views import exception_handler
 
+from experchat.availability import (
+    AvailabilityCache, expand_calendars, merge_windows, split_intervals, subtract_booked, to_free_intervals,
+    window_from_slot, window_to_slot
+)
 from experchat.data_uri import DataURI
 from experchat.enumerations import CallStatus
 from experchat.messages import get_message
@@ -142,71 +144,10 @@ def process_and_merge_slots(slots, today=None):
     if today is None:
         today = timezone.now().date()
 
-    def get_next_date(day, cur_week):
-        daydiff = day - today.weekday() - 1
-
-        if daydiff < 0:
-            daydiff += 7
-
-        date = today + timezone.timedelta(days=(daydiff + cur_week * 7))
-        return date
-
-    def merge_final_slots(combined_slots):
-        counter = 0
-        merged_slots = []
-
-        if not combined_slots:
-            return merged_slots
-
-        while counter < len(combined_slots) - 1:
-            is_mergable = (
-                combined_slots[counter]['start_time'] <= combined_slots[counter + 1]['start_time'] <=
-                combined_slots[counter]['end_time'] and combined_slots[counter]['day'] ==
-                combined_slots[counter + 1]['day']
-            )
-            if not is_mergable:
-                merged_slots.append(combined_slots[counter])
-                counter += 1
-                continue
-
-            if is_mergable and combined_slots[counter + 1]['end_time'] > combined_slots[counter]['end_time']:
-                combined_slots[counter + 1]['start_time'] = combined_slots[counter]['start_time']
-
-            else:
-                combined_slots[counter + 1] = combined_slots[counter]
-
-            counter += 1
-
-        merged_slots.append(combined_slots[-1])
-        return merged_slots
-
     # this needs to be make configurable update the key
-    final_slots = []
-    count = 0
     num_weeks = getattr(settings, 'NEXT_SLOTS_LIMIT_WEEKS', 2)
-    while len(slots) > count:
-        slots_days = [day.day for day in slots[count].week_days.all()]
-        slot = slots[count]
-        # making timezone aware for start_time and end_time
-        for day in slots_days:
-            cur_week = 0
-            while cur_week < num_weeks:
-                date = get_next_date(day, cur_week)
-                startDateTime = get_slot_datetime(date, slot.start_time, slot.timezone)
-                endDateTime = get_slot_datetime(date, slot.end_time, slot.timezone)
-                final_slots.append({
-                    'start_time': startDateTime,
-                    'end_time': endDateTime,
-                    'day': day,
-                    'date_string': startDateTime.date()
-                })
-                cur_week += 1
-
-        count += 1
-
-    final_sorted_slots = sorted(final_slots, key=itemgetter('start_time', 'day'))
-    final_merge_slots = merge_final_slots(final_sorted_slots)
-    return final_merge_slots
+    windows = expand_calendars(slots, today, num_weeks)
+    return [window_to_slot(window) for window in merge_windows(windows)]
 
 
 def filter_slots(available_slots, booked_slots):
@@ -235,65 +176,11 @@ def filter_slots(available_slots, booked_slots):
     merged_slots = process_and_merge_slots(available_slots)
     if not booked_slots:
         return merged_slots
-    filtered_slots = []
-    for booked_slot in booked_slots:
-        count = 0
-        if len(merged_slots) == 0:
-            return filtered_slots
-
-        # since both slots are sorted with start time, then if the current booked slots start_time is greater then
-        # merged slot end_time then that slot is available, so for that append that slot in the filtred slot and
-        # remove the slot from the list
-
-        if booked_slot['start_time'] > merged_slots[count]['end_time']:
-            while merged_slots and booked_slot['start_time'] > merged_slots[count]['end_time']:
-                filtered_slots.append(merged_slots[count])
-                merged_slots.pop(count)
-
-        # if in any case current booked_slot start time is less than merged slot start_time
-        # then in that case we will not do any thing just go for next booked slot
-        if not merged_slots or booked_slot['start_time'] < merged_slots[count]['start_time']:
-            continue
-        # equal condition or in middle
-        if (merged_slots[count]['start_time'] <= booked_slot['start_time'] <= merged_slots[count]['end_time']
-            and merged_slots[count]['start_time'] <= booked_slot['end_time'] <= merged_slots[count]['end_time']
-        ):
-            start_time_diff = booked_slot['start_time'] - merged_slots[count]['start_time']
-            end_time_diff = merged_slots[count]['end_time'] - booked_slot['end_time']
-            # if booked slots in middle and available slots are splitted into two slots
-            # then first update the existing slot with the left splitted slot and then for right
-            # make the deepcopy and update for the next and insert to next index
-            if start_time_diff.seconds >= (60 * 20) and end_time_diff.seconds >= (60 * 20):
-                slot_copy = deepcopy(merged_slots[count])
-                merged_slots[count]['end_time'] = booked_slot['start_time']
-                filtered_slots.append(merged_slots[count])
-                merged_slots.pop(count)
-                slot_copy['start_time'] = booked_slot['end_time']
-                merged_slots.insert(count, slot_copy)
-
-            # if can be splitted from left then update the slot and pop that slot
-            elif start_time_diff.seconds >= (60 * 20):
-                merged_slots[count]['end_time'] = booked_slot['start_time']
-                filtered_slots.append(merged_slots[count])
-                merged_slots.pop(count)
-            # if can be splitted from right then update the slot only
-            elif end_time_diff.seconds >= (60 * 20):
-                merged_slots[count]['start_time'] = booked_slot['end_time']
-            # if there is exact map then remove that slot
-            elif end_time_diff.seconds == 0:
-                merged_slots.pop(count)
-
-        else:
-            # we need to pop here because slots are in sorted order and if that is not matching with first occurence
-            # then that needs to be removed becasue you can not book invalid slots
-            filtered_slots.append(merged_slots[count])
-            merged_slots.pop(count)
-
-    # if we have consume all booked slots and therer are already remaining slots in available slots then add allthose
-    # into the filtered slots
-    if merged_slots:
-        filtered_slots.extend(merged_slots)
-    return filtered_slots
+
+    # since both slots are sorted with start time, the booked slots are carved out of the merged slots in one pass
+    windows = [window_from_slot(slot) for slot in merged_slots]
+    booked = [(booked_slot['start_time'], booked_slot['end_time']) for booked_slot in booked_slots]
+    return [window_to_slot(window) for window in subtract_booked(windows, booked)]
 
 
 def split_in_duration(filterd_slots, duration, time_zone=None, price=None, current_time=None):
@@ -348,69 +235,18 @@ def split_in_duration(filterd_slots, duration, time_zone=None, price=None, curre
             }
         }
     """
-    def _get_next_starting_time(time, duration):
-        # this method will give the starting point from where filterig will start
-        # here increasing by 5 minutes to get the exact first start time
-        if time.minute % duration == 0:
-            return time
-
-        min_diff = duration - (time.minute % duration)
-        return time + timezone.timedelta(minutes=min_diff)
-
     if not filterd_slots:
         return []
 
     if current_time is None:
         current_time = timezone.now()
 
-    # convert the current_time into same format as the Calendar format
-    current_time = timezone.datetime.strptime(current_time.strftime('%Y-%m-%d %H:%M'), '%Y-%m-%d %H:%M')
-    current_time = get_slot_datetime(current_time.date(), current_time.time(), timezone.pytz.UTC)
-
-    # Convert the filtered slots with the time_zone if timezone is otherthan UTC
     if time_zone is None:
         time_zone = 'UTC'
 
-    if time_zone != 'UTC':
-        for slots in filterd_slots:
-            slots['start_time'] = slots['start_time'].astimezone(timezone.pytz.timezone(time_zone))
-            slots['end_time'] = slots['end_time'].astimezone(timezone.pytz.timezone(time_zone))
-
-        current_time = current_time.astimezone(timezone.pytz.timezone(time_zone))
-
-    splited_slots_in_duration = []
-
-    slot_dict = {duration: {}}
-    # this needs to done because in the workflow we are updating the slots
-    filterd_slots_new = deepcopy(filterd_slots)
-
-    for slot in filterd_slots_new:
-        local_slots = []
-
-        time_diff = slot['end_time'] - slot['start_time']
-        # if the time diff is less than the allocatable then don't return that slot
-        # Or if the slot is a past session slot and start_time and end time is less than current time then don't return
-        # otherwise make the slot start_time to current_time if start_time is less than the current_time
-        if time_diff.seconds < 60 * duration or (slot['start_time'] < current_time and slot['end_time'] <= current_time):
-            continue
-        elif slot['start_time'] < current_time:
-            slot['start_time'] = current_time
-
-        slot['start_time'] = _get_next_starting_time(slot['start_time'], duration)
-        end_time = slot['start_time'] + timezone.timedelta(minutes=duration)
-        while end_time <= slot['end_time']:
-            slot_date = slot['start_time'].date().strftime("%Y-%m-%d")
-            if slot_dict[duration].get(slot_date) is None:
-                slot_dict[duration].update({slot_date: []})
-
-            slot_dict[duration][slot_date].append({'start_time': slot['start_time'].strftime("%H:%M")})
-            slot['start_time'] = end_time
-            end_time = end_time + timezone.timedelta(minutes=duration)
-
-        # TODO MAKE the slots configurable to return max 10 result for Now for the given duration
-        splited_slots_in_duration.extend(local_slots)
-
-    return slot_dict
+    intervals = to_free_intervals(filterd_slots, time_zone, current_time)
+    # TODO MAKE the slots configurable to return max 10 result for Now for the given duration
+    return {duration: split_intervals(intervals, duration)}
 
 
 def split_and_update_price(final_slots, time_zone=None, current_time=None):
@@ -434,15 +270,34 @@ def split_and_update_price(final_slots, time_zone=None, current_time=None):
     if not is_valid_timezone:
         time_zone = 'UTC'
 
+    # the slots are prepared once and split for every session length
+    intervals = to_free_intervals(final_slots, time_zone, current_time)
     ec_pricing_obj = SessionPricing.objects.all()
     for session_p_data in ec_pricing_obj:
-        splited_slots = split_in_duration(final_slots, session_p_data.session_length, time_zone, session_p_data.price,
-                                          current_time=current_time)
-        slots_based_on_length.append(splited_slots)
+        duration = session_p_data.session_length
+        slots_based_on_length.append({duration: split_intervals(intervals, duration)})
 
     return slots_based_on_length
 
 
+def get_booked_slot(scheduled_datetime, scheduled_duration):
+    """
+    Make the booked slot of a scheduled session
+    Args:
+        scheduled_datetime (obj): scheduled datetime of the session
+        scheduled_duration (int): scheduled duration of the session in minutes
+    return:
+        booked slot (dict)
+    """
+    start_time = scheduled_datetime
+    end_time = start_time + timezone.timedelta(minutes=scheduled_duration)
+    return {
+        'start_time': get_slot_datetime(start_time.date(), start_time.time(), start_time.tzinfo),
+        'end_time': get_slot_datetime(end_time.date(), end_time.time(), end_time.tzinfo),
+        'date_string': scheduled_datetime.date()
+    }
+
+
 def get_booked_and_available_slots(expert_id):
     """
     Get the booked and available slots for the given expert_id
@@ -457,20 +312,85 @@ def get_booked_and_available_slots(expert_id):
         is_deleted=False
     ).order_by('scheduled_datetime')
 
-    booked_slots = []
-    for session in ec_session:
-        start_datetime = session.scheduled_datetime
-        end_time = start_datetime + timezone.timedelta(minutes=session.scheduled_duration)
-        booked_slots.append({
-            'start_time': get_slot_datetime(start_datetime.date(), start_datetime.time(), start_datetime.tzinfo),
-            'end_time': get_slot_datetime(end_time.date(), end_time.time(), end_time.tzinfo),
-            'date_string': session.scheduled_datetime.date()
-        })
+    booked_slots = [get_booked_slot(session.scheduled_datetime, session.scheduled_duration) for session in ec_session]
 
     available_slots = Calendar.objects.filter(expert__userbase=expert_id).order_by('start_time')
     return available_slots, booked_slots
 
 
+def get_available_slots(expert_id):
+    """
+    Get the filtered slots (available slots excluding the booked slots) for the given expert_id, the slots are
+    served from the availability cache and calculated only when the expert's availability has changed
+    Args:
+        expert_id (int): Expert id
+    return:
+        filtered_slots (list): list of dict of slots
+    """
+    today = timezone.now().date()
+    num_weeks = getattr(settings, 'NEXT_SLOTS_LIMIT_WEEKS', 2)
+    availability_cache = AvailabilityCache(expert_id)
+    # read the version before calculating, so slots calculated from stale data are never stored on a newer version
+    version = availability_cache.get_version()
+
+    filtered_slots = availability_cache.get_slots(version, today, num_weeks)
+    if filtered_slots is None:
+        available_slots, booked_slots = get_booked_and_available_slots(expert_id)
+        filtered_slots = filter_slots(available_slots, booked_slots)
+        availability_cache.cache_slots(filtered_slots, version, today, num_weeks)
+
+    return filtered_slots
+
+
+def get_available_slots_bulk(expert_ids):
+    """
+    Get the filtered slots for many experts at once, used by list APIs to avoid calculating the slots row by row.
+    Cached slots are read with one cache round trip and the slots of the remaining experts are calculated from one
+    query on calendars (with week days) and one query on sessions
+    Args:
+        expert_ids (iterable): Expert ids
+    return:
+        filtered_slots (dict): list of dict of slots for each expert id
+    """
+    expert_ids = set(expert_ids)
+    if not expert_ids:
+        return {}
+
+    today = timezone.now().date()
+    num_weeks = getattr(settings, 'NEXT_SLOTS_LIMIT_WEEKS', 2)
+    # read the versions before calculating, so slots calculated from stale data are never stored on a newer version
+    versions = AvailabilityCache.get_many_versions(expert_ids)
+    filtered_slots = AvailabilityCache.get_many_slots(versions, today, num_weeks)
+
+    missing_expert_ids = expert_ids - set(filtered_slots)
+    if not missing_expert_ids:
+        return filtered_slots
+
+    available_slots = {expert_id: [] for expert_id in missing_expert_ids}
+    calendars = Calendar.objects.filter(
+        expert__in=missing_expert_ids
+    ).order_by('start_time').prefetch_related('week_days')
+    for calendar in calendars:
+        available_slots[calendar.expert_id].append(calendar)
+
+    booked_slots = {expert_id: [] for expert_id in missing_expert_ids}
+    ec_sessions = EcSession.objects.filter(
+        expert__in=missing_expert_ids,
+        is_deleted=False
+    ).order_by('scheduled_datetime').values_list('expert_id', 'scheduled_datetime', 'scheduled_duration')
+    for expert_id, scheduled_datetime, scheduled_duration in ec_sessions:
+        booked_slots[expert_id].append(get_booked_slot(scheduled_datetime, scheduled_duration))
+
+    calculated_slots = {
+        expert_id: filter_slots(available_slots[expert_id], booked_slots[expert_id])
+        for expert_id in missing_expert_ids
+    }
+    AvailabilityCache.cache_many_slots(calculated_slots, versions, today, num_weeks)
+
+    filtered_slots.update(calculated_slots)
+    return filtered_slots
+
+
 def combine_slots(slots_in_duration, only_till_next_day=False, today=None):
     """
     This util method will convert duration slots into the date time object and return one list
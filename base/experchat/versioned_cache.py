@@ -0,0 +1,63 @@
+import time
+
+from django.core.cache import cache as default_cache
+
+
+class CacheVersion(object):
+    """
+    Version of a cached object, which is part of the keys of its cached data. Every write of the object bumps the
+    version, so data cached under an older version is never read again and simply expires.
+
+    The version key itself expires `timeout` seconds after it is seeded, which has to be longer than the data cached
+    under it, so a version key is never left in the cache for good.
+    """
+    def __init__(self, key, timeout, cache=None):
+        """
+        Args:
+            key (str): cache key of the version
+            timeout (int): seconds the version key is kept
+            cache (obj): cache backend, the default one if not given
+        """
+        self.key = key
+        self.timeout = timeout
+        self.cache = cache or default_cache
+
+    @staticmethod
+    def get_many(cache_versions):
+        """
+        Get many versions with one cache round trip, only the missing ones are seeded
+        Args:
+            cache_versions (dict): CacheVersion of each id, all of them on the same cache backend
+        return:
+            versions (dict): version of each id
+        """
+        if not cache_versions:
+            return {}
+
+        cache = next(iter(cache_versions.values())).cache
+        cached_versions = cache.get_many([cache_version.key for cache_version in cache_versions.values()])
+        versions = {}
+        for object_id, cache_version in cache_versions.items():
+            version = cached_versions.get(cache_version.key)
+            versions[object_id] = version if version is not None else cache_version.seed()
+        return versions
+
+    def get(self):
+        version = self.cache.get(self.key)
+        return version if version is not None else self.seed()
+
+    def seed(self):
+        # seeded with the current time, so a version key which expired never starts again from a value already used
+        version = int(time.time() * 1000)
+        if self.cache.add(self.key, version, self.timeout):
+            return version
+        # seeded by another worker meanwhile
+        return self.cache.get(self.key)
+
+    def invalidate(self):
+        try:
+            # the expiry of the version key is kept
+            self.cache.incr(self.key)
+        except ValueError:
+            # the version key expired, data cached under the old version can't be read anymore either
+            self.seed()
@@ -34,6 +34,8 @@ INSTAGRAM_REDIRECT_URL = "http://web.qa.experchat.com/redirects/instagram/"
 YOUTUBE_REDIRECT_URL = "http://web.qa.experchat.com/redirects/youtube/"
 
 FEEDS_OFFSET_LIMIT = 10
+FEEDS_FILTER_INDEX_TTL = 24 * 60 * 60  # (in seconds) Cache time of the ignored and published content ids of an expert.
+FEEDS_FILTER_INDEX_VERSION_TTL = 7 * 24 * 60 * 60  # (in seconds) Longer than FEEDS_FILTER_INDEX_TTL.
 FEED_CACHE_KEY_PREFIX = 'FEEDS'
 SOCIAL_KEY_MAPPING = {
     'FACEBOOK': 'fb_',
@@ -45,6 +47,42 @@ SOCIAL_KEY_MAPPING = {
 }
 USER_FEED_TYPE = 1
 
+# Concurrent fetching of the feeds of all the social links of an expert
+FEEDS_FETCH_MAX_WORKERS = 8  # Threads fetching the social links at the same time.
+FEEDS_FETCH_DEADLINE = 10  # (in seconds) Links not fetched by then are left out and the feeds are partial.
+FEEDS_FETCH_PROVIDER_LIMITS = {'YOUTUBE': 4}  # Max. concurrent fetches per provider, unlisted ones are not limited.
+YOUTUBE_STATISTICS_CACHE_TTL = 10 * 60  # (in seconds) Likes and comments of a video reused by the following fetches.
+FEEDS_BUILD_LOCK_TIMEOUT = 30  # (in seconds) Max. time of a build, the lock expires after that.
+FEEDS_BUILD_LOCK_WAIT = 3  # (in seconds) Other requests of the expert wait up to that, then the feeds are partial.
+
+# Likes of the contents, buffered in the cache and saved in batches
+FEEDS_LIKES_FLUSH_DELAY = 10  # (in seconds) Likes of a content are saved at most once per this time.
+FEEDS_LIKES_BUFFER_TTL = 24 * 60 * 60  # (in seconds) Buffered likes are kept up to that if their flush is late.
+
+# Background refresh of the feeds
+FEEDS_PREFETCH_TASK_SCHEDULE = crontab(minute='*/5')  # Look for the stale social links every 5 minutes.
+FEEDS_PREFETCH_INTERVAL = 15 * 60  # (in seconds) Social links fetched before that are refreshed.
+FEEDS_PREFETCH_JITTER = 4 * 60  # (in seconds) Refreshes are delayed randomly by up to this much.
+
+# Background renewal of the provider access tokens, keep the schedule shorter than the margin
+FEEDS_TOKEN_REFRESH_TASK_SCHEDULE = crontab(minute='*/5')  # Look for the expiring access tokens every 5 minutes.
+FEEDS_TOKEN_REFRESH_MARGIN = 10 * 60  # (in seconds) Access tokens expiring within that are renewed.
+FEEDS_TOKEN_REFRESH_LOCK_TIMEOUT = 5 * 60  # (in seconds) A renewal queued for longer can be queued again.
+
+# Feeds cached per social link
+FEEDS_LINK_STORE_TTL = 7 * 24 * 60 * 60  # (in seconds)
+FEEDS_LINK_STORE_MAX_AGE = 20 * 60  # (in seconds) Newer feeds are fetched when a store is behind the request by more.
+FEEDS_LINK_STORE_MAX_ITEMS = 500  # Older feeds are dropped from the store.
+FEEDS_ITEM_TTL = 10 * 24 * 60 * 60  # (in seconds) Cache time of each feed, keep it >= the store TTL.
+
+# HTTP client shared by the feed providers
+FEEDS_HTTP_CONNECT_TIMEOUT = 3.05  # (in seconds)
+FEEDS_HTTP_READ_TIMEOUT = 10  # (in seconds)
+FEEDS_HTTP_MAX_RETRIES = 2  # Retries of the GET requests on connection errors and 5xx responses.
+FEEDS_HTTP_BACKOFF_FACTOR = 0.3  # Sleep between the retries is {backoff factor} * (2 ^ ({retry number} - 1)).
+FEEDS_HTTP_POOL_MAXSIZE = 10  # Connections kept alive per host.
+FEEDS_HTTP_RESPONSE_HOOKS = []  # Dotted paths of the hooks called with every response, e.g. for metrics.
+
 MAX_TAGS_COUNT = 20
 MAX_EXPERIENCE_CHAR = 1000
 MAX_EDU_BACK_CHAR = 1000
@@ -64,6 +102,22 @@ STREAM_READ_LIMIT = 50
 STREAM_STATIC_GLOBAL_FEED = 'global'
 STREAM_STATIC_SUPERADMIN_FEED = 'superadmin'
 USER_AGGREGATED_TIMELINE_FEED = 'user_aggregated'
+STREAM_ACTIVITY_COPY_LIMIT = 1000  # Activities of a feed copied to the timeline of a new follower.
+STREAM_MAX_WORKERS = 8  # Threads sending the Getstream requests which have no batch endpoint.
+STREAM_LOCAL_DATABASE = None  # SQLite file (or ':memory:') of the local feed engine replacing Getstream in load tests.
+STREAM_LOCAL_AGGREGATED_FEEDS = [USER_AGGREGATED_TIMELINE_FEED]  # Feed groups the local feed engine reads aggregated.
+
+# Getstream writes saved with the database changes and sent by a Celery task
+STREAM_OUTBOX_TASK_SCHEDULE = crontab()  # Retry the failed writes every minute.
+STREAM_OUTBOX_BATCH_SIZE = 100  # Writes loaded at once.
+STREAM_OUTBOX_MAX_ATTEMPTS = 8  # Writes failing more often are left in the table.
+STREAM_OUTBOX_RETRY_DELAY = 30  # (in seconds) Delay before the first retry, doubled for each following one.
+STREAM_OUTBOX_LOCK_TIMEOUT = 5 * 60  # (in seconds) Another drainer may start after this if one was killed.
+
+# Contents of the stream timelines cached without the fields of the current user
+CONTENT_CACHE_KEY_PREFIX = 'CONTENT'
+CONTENT_CACHE_TTL = 60 * 60  # (in seconds) Changes of the owners and the tag names show up within this time.
+CONTENT_CACHE_VERSION_TTL = 24 * 60 * 60  # (in seconds) Longer than CONTENT_CACHE_TTL, versions outlive their data.
 
 # Length of Suffix to be added in Expert UID
 EXPERT_UID_SUFFIX_LEN = 3
@@ -1,10 +1,184 @@
+import heapq
+import json
+import time
+import zlib
+
 from django.conf import settings
 from django.core.cache import cache
-from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import dateparse, timezone
+
+from experchat.single_flight import SingleFlight
+from feeds.models import SocialLink
+from feeds.providers import fetch_feeds_data, get_social_link_provider, sort_feeds_data
+
+FEEDS_LINK_STORE_TTL = getattr(settings, 'FEEDS_LINK_STORE_TTL', 60 * 60 * 24 * 7)
+FEEDS_LINK_STORE_MAX_AGE = getattr(settings, 'FEEDS_LINK_STORE_MAX_AGE', 60 * 20)
+FEEDS_LINK_STORE_MAX_ITEMS = getattr(settings, 'FEEDS_LINK_STORE_MAX_ITEMS', 500)
+# max. seconds of the fetch of the feeds of an expert, the lock expires after that in case the request died
+FEEDS_BUILD_LOCK_TIMEOUT = getattr(settings, 'FEEDS_BUILD_LOCK_TIMEOUT', 30)
+# seconds the other requests of the expert wait for that fetch, the links without store are partial after that
+FEEDS_BUILD_LOCK_WAIT = getattr(settings, 'FEEDS_BUILD_LOCK_WAIT', 3)
+# the stores only refer to the feeds by id, so the feeds must outlive them. The feeds a store refers to are
+# re-written when the store is saved once the difference of the two TTLs has passed since they last were
+FEEDS_ITEM_TTL = getattr(settings, 'FEEDS_ITEM_TTL', FEEDS_LINK_STORE_TTL + 60 * 60 * 24 * 3)
+
+
+def encode_feed(feed):
+    """
+    Serialize a feed as zlib compressed JSON, which is a fraction of the size of the pickled provider payload
+    Args:
+        feed (dict): unified feed dict
+    Returns:
+        compressed bytes
+    """
+    return zlib.compress(json.dumps(feed, cls=DjangoJSONEncoder, separators=(',', ':')).encode('utf-8'))
+
+
+def decode_feed(data):
+    """
+    Deserialize a feed encoded with encode_feed
+    Args:
+        data (bytes): compressed feed
+    Returns:
+        feed (dict): unified feed dict
+    """
+    if isinstance(data, dict):
+        # cached before the compact format
+        return data
+    feed = json.loads(zlib.decompress(data).decode('utf-8'))
+    if feed.get('timestamp'):
+        feed['timestamp'] = dateparse.parse_datetime(feed['timestamp'])
+    return feed
+
+
+def cache_feed_items(feeds, extra=None):
+    """
+    Cache the feeds under their ids with one cache round trip
+    Args:
+        feeds (list): list of feed dict
+        extra (dict): other keys and values to write in the same round trip, with the same timeout, e.g. the feeds
+            which are encoded already
+    """
+    data = {feed['id']: encode_feed(feed) for feed in feeds}
+    data.update(extra or {})
+    if data:
+        cache.set_many(data, FEEDS_ITEM_TTL)
+
+
+def merge_feed_refs(link_refs):
+    """
+    Lazily merge the feeds of the social links, which are each sorted newest first, with a heap
+    Args:
+        link_refs (list): list of (feed id, unix timestamp) refs for each social link, sorted newest first
+    Returns:
+        iterator of the feed ids, newest first
+    """
+    return (feed_id for feed_id, _ in heapq.merge(*link_refs, key=lambda ref: ref[1], reverse=True))
+
+
+def get_feed_items(feed_ids):
+    """
+    Get the cached feeds with one cache round trip
+    Args:
+        feed_ids (list): ids of the feeds
+    Returns:
+        feeds (list): feeds in the order of the ids, the feeds which are not cached are left out
+    """
+    cached_feeds = cache.get_many(feed_ids) if feed_ids else {}
+    return [decode_feed(cached_feeds[feed_id]) for feed_id in feed_ids if feed_id in cached_feeds]
+
+
+class SocialLinkFeedStore(object):
+    """
+    Feeds of one social link, cached as a list of (feed id, unix timestamp) ordered on timestamp (newest first).
+
+    The store holds every feed published between `floor` and `until` (unix timestamps), so any request timestamp in
+    that range is answered by slicing it. Newer feeds are fetched incrementally, since the newest stored feed. The
+    feeds themselves are cached once, under their ids, and `touched` is the unix time they were last written.
+    """
+    def __init__(self, social_link_id, until=0, floor=0, refs=None, touched=0):
+        self.social_link_id = social_link_id
+        self.until = until
+        self.floor = floor
+        self.refs = refs or []
+        self.touched = touched
+
+    @staticmethod
+    def key(social_link_id):
+        return settings.FEED_CACHE_KEY_PREFIX + "_LINK_{}".format(social_link_id)
+
+    @classmethod
+    def get_many(cls, social_link_ids):
+        """
+        Get the stores of many social links with one cache round trip
+        Args:
+            social_link_ids (list): ids of the social links
+        Returns:
+            stores (dict): store of each social link id, the links without store are left out
+        """
+        keys = {cls.key(social_link_id): social_link_id for social_link_id in social_link_ids}
+        cached_stores = cache.get_many(list(keys)) if keys else {}
+        return {keys[key]: cls(keys[key], **data) for key, data in cached_stores.items()}
+
+    def to_cache(self):
+        """
+        Get the key and the value to cache the store
+        """
+        return self.key(self.social_link_id), {
+            'until': self.until, 'floor': self.floor, 'refs': self.refs, 'touched': self.touched
+        }
+
+    @property
+    def since(self):
+        """
+        High-water mark of the store, the unix timestamp of the newest feed
+        """
+        return self.refs[0][1] if self.refs else self.floor
+
+    def covers(self, timestamp, max_age=FEEDS_LINK_STORE_MAX_AGE):
+        """
+        Check if the store can answer the timestamp, the feeds published up to max_age seconds after the store was
+        fetched may be missing from it
+        """
+        return self.floor <= timestamp <= self.until + max_age
+
+    def slice_refs(self, timestamp):
+        """
+        Get the (feed id, unix timestamp) refs of the stored feeds published before the timestamp
+        """
+        return [ref for ref in self.refs if ref[1] <= timestamp]
 
-from feeds.providers import build_feeds_data
+    def slice(self, timestamp):
+        """
+        Get the ids of the stored feeds published before the timestamp
+        """
+        return [feed_id for feed_id, _ in self.slice_refs(timestamp)]
 
-CACHE_TTL = getattr(settings, 'CACHE_TTL', DEFAULT_TIMEOUT)
+    def update(self, feeds, timestamp, page_size, since=None):
+        """
+        Add the fetched feeds to the store
+        Args:
+            feeds (list): feeds of the social link published before the timestamp and after since
+            timestamp (int): Unix timestamp until which the feeds were fetched
+            page_size (int): max. feeds returned by the provider at once, None if it returns all of them
+            since (float): Unix timestamp after which the feeds were fetched, None for a full fetch
+        """
+        refs = [(feed['id'], feed['timestamp'].timestamp()) for feed in sort_feeds_data(feeds, timestamp)]
+        # a full page may have left out the feeds between the oldest returned one and since
+        is_complete = page_size is None or len(refs) < page_size
+        if since is not None and is_complete:
+            # an updated feed is fetched again with its new timestamp, its old ref is replaced
+            fetched_ids = {feed_id for feed_id, _ in refs}
+            self.refs = refs + [ref for ref in self.refs if ref[0] not in fetched_ids]
+        else:
+            self.refs = refs
+            self.floor = refs[-1][1] if refs and not is_complete else 0
+        self.until = timestamp
+
+        if len(self.refs) > FEEDS_LINK_STORE_MAX_ITEMS:
+            self.refs = self.refs[:FEEDS_LINK_STORE_MAX_ITEMS]
+            self.floor = self.refs[-1][1]
 
 
 class CacheFeedData(object):
@@ -14,43 +188,183 @@ class CacheFeedData(object):
     def __init__(self, expert_id):
         self.expert_id = expert_id
 
-    def feeds_key(self, timestamp):
+    def build_lock_key(self):
+        return settings.FEED_CACHE_KEY_PREFIX + "_BUILD_{}".format(self.expert_id)
+
+    def build_link_refs(self, social_links, timestamp, max_age=FEEDS_LINK_STORE_MAX_AGE):
+        """
+        Get the feeds of the social links from their stores, fetching only what the stores don't have
+        Args:
+            social_links (obj) : Social Link
+            timestamp (int): Unix timestamp
+            max_age (int): seconds by which a store may be behind the timestamp without fetching the newer feeds
+        Returns:
+            FeedsFetchResult of the social links which were fetched, the fetched feeds by id and the
+            (feed id, unix timestamp) refs of each social link sorted newest first
+        """
+        social_links = list(social_links)
+        timestamp = int(float(timestamp))
+        stores = SocialLinkFeedStore.get_many([social_link.id for social_link in social_links])
+        links_to_fetch, since = self.get_links_to_fetch(social_links, stores, timestamp, max_age)
+        if not links_to_fetch:
+            return self.update_link_stores(social_links, stores, [], since, timestamp)
+
+        # the request which takes the lock fetches the links, the other ones serve the stale stores meanwhile and
+        # wait a few seconds for the links without store
+        single_flight = SingleFlight(self.build_lock_key(), FEEDS_BUILD_LOCK_TIMEOUT, FEEDS_BUILD_LOCK_WAIT, cache)
+        served = single_flight.run(
+            lambda: self.update_link_stores(social_links, stores, links_to_fetch, since, timestamp),
+            lambda: self.serve_link_stores(social_links, timestamp)
+        )
+        if served is None:
+            # the links without store are still being fetched
+            return self.serve_link_stores(social_links, timestamp, partial=True)
+        return served
+
+    def serve_link_stores(self, social_links, timestamp, partial=False):
+        """
+        Get the feeds of the social links from their stores without fetching them, see build_link_refs
+        Args:
+            social_links (list): Social Links
+            timestamp (int): Unix timestamp
+            partial (bool): the links without store are returned as partial, otherwise None is returned then
+        """
+        stores = SocialLinkFeedStore.get_many([social_link.id for social_link in social_links])
+        missing_link_ids = [social_link.id for social_link in social_links if social_link.id not in stores]
+        if missing_link_ids and not partial:
+            return None
+        result, fetched_feeds, link_refs = self.update_link_stores(social_links, stores, [], {}, timestamp)
+        return result._replace(partial_link_ids=missing_link_ids), fetched_feeds, link_refs
+
+    def get_links_to_fetch(self, social_links, stores, timestamp, max_age):
         """
-        make the key for caching
+        Get the social links whose stores can't answer the timestamp
         Args:
+            social_links (list): Social Links
+            stores (dict): store of each social link id
             timestamp (int): Unix timestamp
-        return:
-            key which needs to be cached
+            max_age (int): seconds by which a store may be behind the timestamp without fetching the newer feeds
+        Returns:
+            the social links to fetch and the unix timestamp after which they are fetched, for each social link id
+        """
+        links_to_fetch = []
+        since = {}
+        for social_link in social_links:
+            store = stores.get(social_link.id)
+            if store is not None and store.covers(timestamp, max_age):
+                continue
+            links_to_fetch.append(social_link)
+            if store is not None and timestamp > store.until:
+                since[social_link.id] = store.since
+        return links_to_fetch, since
+
+    def update_link_stores(self, social_links, stores, links_to_fetch, since, timestamp):
+        """
+        Fetch the social links and add their feeds to the stores, see build_link_refs
+        """
+        result = fetch_feeds_data(links_to_fetch, timestamp, since)
+
+        fetched_feeds = {}
+        link_refs = []
+        changed_stores = []
+        for social_link in social_links:
+            store = stores.get(social_link.id)
+            feeds = result.link_feeds.get(social_link.id)
+            if feeds is None:
+                # not fetched, failed or missed the deadline, the store is used even if it is stale
+                link_refs.append(store.slice_refs(timestamp) if store else [])
+                continue
+
+            fetched_feeds.update((feed['id'], feed) for feed in feeds)
+            if store is not None and store.floor > timestamp:
+                # older than the stored feeds, served as it is
+                link_refs.append([
+                    (feed['id'], feed['timestamp'].timestamp()) for feed in sort_feeds_data(feeds, timestamp)
+                ])
+                continue
+
+            if store is None:
+                store = SocialLinkFeedStore(social_link.id)
+            store.update(feeds, timestamp, get_social_link_provider(social_link)[1].feeds_page_size,
+                         since.get(social_link.id))
+            changed_stores.append(store)
+            # sliced once the store is saved
+            link_refs.append(store)
+
+        self.save_link_stores(changed_stores, fetched_feeds)
+        link_refs = [
+            refs.slice_refs(timestamp) if isinstance(refs, SocialLinkFeedStore) else refs for refs in link_refs
+        ]
+        return result, fetched_feeds, link_refs
+
+    def save_link_stores(self, stores, fetched_feeds):
+        """
+        Cache the stores and the feeds they refer to. The stored feeds which were not fetched again are re-written
+        once in a while, so they always outlive the stores
+        Args:
+            stores (list): changed SocialLinkFeedStore
+            fetched_feeds (dict): fetched feeds by id
         """
-        return settings.FEED_CACHE_KEY_PREFIX + "_{}_{}".format(self.expert_id, timestamp)
+        now = int(time.time())
+        stores_to_touch = [store for store in stores if now - store.touched >= FEEDS_ITEM_TTL - FEEDS_LINK_STORE_TTL]
+        feed_ids = {
+            feed_id for store in stores_to_touch for feed_id, _ in store.refs if feed_id not in fetched_feeds
+        }
+        cached_feeds = cache.get_many(list(feed_ids)) if feed_ids else {}
+        for store in stores_to_touch:
+            # the feeds evicted from the cache can't be served anymore
+            store.refs = [ref for ref in store.refs if ref[0] in fetched_feeds or ref[0] in cached_feeds]
+            store.touched = now
+
+        cache_feed_items(list(fetched_feeds.values()), cached_feeds)
+        if stores:
+            cache.set_many(dict(store.to_cache() for store in stores), FEEDS_LINK_STORE_TTL)
 
-    def cache_feeds(self, feed_data, timestamp):
+    def build_link_feeds(self, social_links, timestamp, max_age=FEEDS_LINK_STORE_MAX_AGE):
         """
-        This will cache the feed data in redis cache
+        Build the feeds from the stores of the social links, fetching only what the stores don't have
         Args:
-            feed_data (list): List of dict
+            social_links (obj) : Social Link
             timestamp (int): Unix timestamp
-        Return:
-            filtered data for the given request if a valid request
+            max_age (int): seconds by which a store may be behind the timestamp without fetching the newer feeds
+        Returns:
+            FeedsFetchResult of the social links which were fetched and the sorted list of all the feeds
         """
-        cache.set(self.feeds_key(timestamp), feed_data, CACHE_TTL)
-        for feed in feed_data:
-            cache.set(feed['id'], feed, CACHE_TTL)
+        result, feeds, link_refs = self.build_link_refs(social_links, timestamp, max_age)
+        feed_ids = list(merge_feed_refs(link_refs))
+        feeds.update((feed['id'], feed) for feed in get_feed_items([
+            feed_id for feed_id in feed_ids if feed_id not in feeds
+        ]))
+        return result, [feeds[feed_id] for feed_id in feed_ids if feed_id in feeds]
 
-    def get_cache_feeds(self, timestamp, social_links):
+    def iter_feed_ids(self, timestamp, social_links):
         """
-        Get the list of all feeds with the specified timestamp
+        Get the ids of the feeds published before the timestamp lazily, the sorted feeds of the social links are
+        merged as the ids are consumed, so reading a page stops once the page is complete
         Args:
             timestamp (int): Unix timestamp
             social_links (obj) : Social Link
         Returns:
-            all the list of feeds which are filtered
+            iterator of the feed ids newest first, and the number of the feeds
+        """
+        _, _, link_refs = self.build_link_refs(social_links, timestamp)
+        return merge_feed_refs(link_refs), sum(len(refs) for refs in link_refs)
+
+    def refresh_link_feeds(self, social_links):
         """
-        feeds_data = cache.get(self.feeds_key(timestamp))
-        if feeds_data:
-            return feeds_data
-        feeds = build_feeds_data(social_links, timestamp)
-        self.cache_feeds(feeds, timestamp)
+        Fetch the new feeds of the social links ahead of the requests and record when each social link was fetched
+        Args:
+            social_links (obj) : Social Link
+        Returns:
+            the list of current feeds
+        """
+        social_links = list(social_links)
+        result, feeds = self.build_link_feeds(social_links, int(time.time()), max_age=0)
+
+        fetched_link_ids = [
+            social_link.id for social_link in social_links if result.link_feeds.get(social_link.id) is not None
+        ]
+        SocialLink.objects.filter(id__in=fetched_link_ids).update(feeds_fetched_timestamp=timezone.now())
         return feeds
 
     def get_feeds_by_content_id(self, content_id):
@@ -64,4 +378,4 @@ class CacheFeedData(object):
         feed = cache.get(content_id)
         if not feed:
             return
-        return feed
+        return decode_feed(feed)
@@ -0,0 +1,88 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+
+from feeds.models import ContentStats
+from streamfeeds.cache import ContentCache
+
+# the likes of a content are buffered in the cache and saved at most once per this many seconds
+FEEDS_LIKES_FLUSH_DELAY = getattr(settings, 'FEEDS_LIKES_FLUSH_DELAY', 10)
+# the buffered likes are kept well after their flush should have run, in case the queue is late
+FEEDS_LIKES_BUFFER_TTL = getattr(settings, 'FEEDS_LIKES_BUFFER_TTL', 60 * 60 * 24)
+
+
+def likes_key(content_id):
+    return settings.FEED_CACHE_KEY_PREFIX + "_LIKES_{}".format(content_id)
+
+
+def likes_flush_key(content_id):
+    return settings.FEED_CACHE_KEY_PREFIX + "_LIKES_FLUSH_{}".format(content_id)
+
+
+def add_content_likes(content_id, count):
+    """
+    Add likes to the buffered likes of the content with an atomic increment, and queue the flush of the buffer unless
+    it is queued already
+    Args:
+        content_id (id): Content id
+        count (int): likes added, negative for the removed likes
+    """
+    # imported here since the tasks import this module
+    from feeds.tasks import flush_content_likes
+
+    cache.add(likes_key(content_id), 0, FEEDS_LIKES_BUFFER_TTL)
+    cache.incr(likes_key(content_id), count)
+    if cache.add(likes_flush_key(content_id), True, FEEDS_LIKES_FLUSH_DELAY):
+        flush_content_likes.apply_async((content_id,), countdown=FEEDS_LIKES_FLUSH_DELAY)
+
+
+def get_buffered_likes(content_id):
+    """
+    Get the likes of the content which are not saved yet
+    Args:
+        content_id (id): Content id
+    return:
+        likes (int): buffered likes, negative if more likes were removed than added
+    """
+    return cache.get(likes_key(content_id)) or 0
+
+
+def get_many_buffered_likes(content_ids):
+    """
+    Get the likes which are not saved yet of many contents with one cache round trip
+    Args:
+        content_ids (list): Content ids
+    return:
+        likes (dict): buffered likes of each content id, the contents without any are left out
+    """
+    keys = {likes_key(content_id): content_id for content_id in content_ids}
+    buffered_likes = cache.get_many(list(keys)) if keys else {}
+    return {keys[key]: likes for key, likes in buffered_likes.items() if likes}
+
+
+def save_buffered_likes(content_id):
+    """
+    Save the buffered likes of the content with a single UPDATE, so concurrent likes never lock the stats row for
+    long nor overwrite each other
+    Args:
+        content_id (id): Content id
+    return:
+        likes (int): number of likes saved
+    """
+    # the likes buffered from now on queue a new flush
+    cache.delete(likes_flush_key(content_id))
+    count = get_buffered_likes(content_id)
+    if not count:
+        return 0
+
+    if not ContentStats.objects.filter(content_id=content_id).update(likes=F('likes') + count):
+        # liked for the first time, unless another flush created the stats meanwhile
+        _, created = ContentStats.objects.get_or_create(content_id=content_id, defaults={'likes': max(count, 0)})
+        if not created:
+            ContentStats.objects.filter(content_id=content_id).update(likes=F('likes') + count)
+    # once they are saved only, so a failed update leaves them to the next flush. Decremented by what is saved, not
+    # reset, so the likes added meanwhile stay in the buffer
+    cache.decr(likes_key(content_id), count)
+    # the update doesn't send post_save
+    ContentCache(content_id).invalidate()
+    return count
@@ -0,0 +1,103 @@
+import logging
+import threading
+from http import cookiejar
+
+import requests
+from django.conf import settings
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+FEEDS_HTTP_CONNECT_TIMEOUT = getattr(settings, 'FEEDS_HTTP_CONNECT_TIMEOUT', 3.05)
+FEEDS_HTTP_READ_TIMEOUT = getattr(settings, 'FEEDS_HTTP_READ_TIMEOUT', 10)
+FEEDS_HTTP_MAX_RETRIES = getattr(settings, 'FEEDS_HTTP_MAX_RETRIES', 2)
+FEEDS_HTTP_BACKOFF_FACTOR = getattr(settings, 'FEEDS_HTTP_BACKOFF_FACTOR', 0.3)
+FEEDS_HTTP_POOL_MAXSIZE = getattr(settings, 'FEEDS_HTTP_POOL_MAXSIZE', 10)
+FEEDS_HTTP_RESPONSE_HOOKS = getattr(settings, 'FEEDS_HTTP_RESPONSE_HOOKS', [])
+
+# only idempotent requests are retried, the OAuth token exchanges are POSTs and must not be sent twice
+RETRY_METHODS = frozenset(['GET', 'HEAD'])
+RETRY_STATUSES = frozenset([500, 502, 503, 504])
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class BlockAllCookies(cookiejar.CookiePolicy):
+    """
+    The session is shared by the requests of all the experts, so the cookies set by one response must never be sent
+    with the requests made for another account.
+    """
+    return_ok = set_ok = domain_return_ok = path_return_ok = lambda self, *args, **kwargs: False
+    netscape = True
+    rfc2965 = hide_cookie2 = False
+
+
+def log_response(response, *args, **kwargs):
+    """
+    Response hook logging the time taken by every provider call
+    """
+    logger.debug('%s %s %s %.3fs', response.request.method, response.url.split('?')[0],
+                 response.status_code, response.elapsed.total_seconds())
+
+
+def build_session():
+    """
+    Build the session with the pooled adapters, the retry policy and the response hooks
+    Return:
+        session (obj): requests Session
+    """
+    session = requests.Session()
+    session.cookies.set_policy(BlockAllCookies())
+    retry = Retry(
+        total=FEEDS_HTTP_MAX_RETRIES,
+        backoff_factor=FEEDS_HTTP_BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUSES,
+        method_whitelist=RETRY_METHODS,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_maxsize=FEEDS_HTTP_POOL_MAXSIZE, max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.hooks['response'] = [log_response] + [import_string(hook) for hook in FEEDS_HTTP_RESPONSE_HOOKS]
+    return session
+
+
+def get_session():
+    """
+    Get the session shared by all the provider calls of this process, it keeps the connections to each host alive
+    Return:
+        session (obj): requests Session
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = build_session()
+    return _session
+
+
+def request(method, url, **kwargs):
+    """
+    Make a request on the shared session, with the default connect and read timeouts
+    Args:
+        method (str): HTTP method
+        url (str): url to call
+        kwargs: other arguments of requests
+    Return:
+        response (obj): requests Response
+    Raise:
+        request exceptions like ConnectionError, Timeout etc
+    """
+    kwargs.setdefault('timeout', (FEEDS_HTTP_CONNECT_TIMEOUT, FEEDS_HTTP_READ_TIMEOUT))
+    return get_session().request(method, url, **kwargs)
+
+
+def get(url, **kwargs):
+    return request('GET', url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request('POST', url, **kwargs)
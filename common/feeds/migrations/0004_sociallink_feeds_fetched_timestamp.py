@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feeds', '0003_contentuseractivity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sociallink',
+            name='feeds_fetched_timestamp',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='feeds fetched time'),
+        ),
+    ]
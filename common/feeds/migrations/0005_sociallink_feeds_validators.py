@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feeds', '0004_sociallink_feeds_fetched_timestamp'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sociallink',
+            name='feeds_etag',
+            field=models.CharField(blank=True, default='', max_length=252, verbose_name='feeds ETag'),
+        ),
+        migrations.AddField(
+            model_name='sociallink',
+            name='feeds_last_modified',
+            field=models.CharField(blank=True, default='', max_length=64, verbose_name='feeds Last-Modified'),
+        ),
+    ]
@@ -75,6 +75,10 @@ class SocialLink(ExperChatBaseModel):
     detail = models.CharField(_('Page/channel/User Id'), max_length=252)
     display_name = models.CharField(_('display name'), max_length=252)
     is_deleted = models.BooleanField(_('is deleted'), default=False)
+    feeds_fetched_timestamp = models.DateTimeField(_('feeds fetched time'), blank=True, null=True)
+    # validators of the last response of the RSS feed, sent back to get a 304 when the feed did not change
+    feeds_etag = models.CharField(_('feeds ETag'), max_length=252, blank=True, default='')
+    feeds_last_modified = models.CharField(_('feeds Last-Modified'), max_length=64, blank=True, default='')
 
     def __str__(self):
         return "{id} :{feed_type}".format(
@@ -163,11 +167,25 @@ class Content(ExperChatBaseModel):
             sender=self.__class__, instance=self, using=kwargs.get('using', None)
         )
 
+    @property
+    def saved_likes(self):
+        return self.stats.likes if hasattr(self, 'stats') else 0
+
     @cached_property
     def likes(self):
-        if hasattr(self, 'stats'):
-            return self.stats.likes
-        return 0
+        # imported here since the counters import the models
+        from feeds.counters import get_buffered_likes
+
+        # with the likes which are not saved yet
+        return self.get_likes(get_buffered_likes(self.id))
+
+    def get_likes(self, buffered_likes):
+        """
+        Get the likes of the content with its buffered likes, when they are loaded for many contents at once
+        Args:
+            buffered_likes (int): likes which are not saved yet
+        """
+        return max(self.saved_likes + buffered_likes, 0)
 
     def activate(self):
         self.is_deleted = False
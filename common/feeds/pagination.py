@@ -1,16 +1,22 @@
 from collections import OrderedDict
+from itertools import islice
 
 from django.conf import settings
 
 
-def paginate_content_results(request, data):
+def paginate_content_results(request, data, load_page=None, max_count=None):
     """
-    Util method to make the pagination data
+    Util method to make the pagination data. The data may be a lazy iterator, only the items up to the end of the
+    page are consumed then.
     Args:
         request (obj): Requests
-        data (dict): Data which needs to be rendered in Response
+        data (list or iterator): Data which needs to be rendered in Response
+        load_page (function): called with the items of the page to get the data rendered, e.g. the feeds of ids. The
+            items it leaves out, e.g. the feeds evicted from the cache, are replaced by the next ones
+        max_count (int): upper bound of the number of items of an iterator, which is not counted
     Returns:
-        dict with next, previous link and data count
+        dict with next, previous link and data count. The count of an iterator is max_count, and is_count_approximate
+        is True then
     """
     try:
         offset = int(request.query_params.get('offset', 0))
@@ -33,9 +39,10 @@ def paginate_content_results(request, data):
         url = "{}://{}{}".format(http_path, request.META['HTTP_HOST'], request.path)
         return url
 
-    def _get_next_link(offset, limit):
+    def _get_next_link(next_offset, limit, has_next):
+        if not has_next:
+            return None
         url = _make_url(request)
-        next_offset = limit + offset
         return url + "?offset={}&limit={}".format(next_offset, limit)
 
     def _get_previous_link(offset, limit):
@@ -47,11 +54,27 @@ def paginate_content_results(request, data):
             previous_offset = 0
         return url + "?offset={}&limit={}".format(previous_offset, limit)
 
-    resulted_data = data[offset: offset + limit]
+    data_iterator = iter(data)
+    page_items = list(islice(data_iterator, offset, offset + limit))
+    next_offset = offset + len(page_items)
+    resulted_data = page_items if load_page is None else load_page(page_items)
+    while load_page is not None and len(resulted_data) < limit:
+        # some items are gone, the page is refilled with the next ones
+        page_items = list(islice(data_iterator, limit - len(resulted_data)))
+        if not page_items:
+            break
+        next_offset += len(page_items)
+        resulted_data += load_page(page_items)
+
+    # one more item tells if there is a next page
+    end = object()
+    has_next = next(data_iterator, end) is not end
+    is_count_approximate = not hasattr(data, '__len__')
     return OrderedDict([
         ('metadata', OrderedDict([
-            ('count', len(data)),
-            ('next', _get_next_link(offset, limit)),
+            ('count', max_count if is_count_approximate else len(data)),
+            ('is_count_approximate', is_count_approximate),
+            ('next', _get_next_link(next_offset, limit, has_next)),
             ('previous', _get_previous_link(offset, limit)),
             ('timestamp', timestamp),
             ('offset', offset)
@@ -1,18 +1,75 @@
-import json
-from collections import OrderedDict
+import logging
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
 from urllib.parse import quote
 
-import requests
+import ujson
 from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
 from django.utils import dateparse, timezone
 from requests.exceptions import ConnectionError, HTTPError, Timeout
 from rest_framework import serializers, status
 from rest_framework.exceptions import APIException, ValidationError
 from rest_framework.settings import api_settings
 
+from feeds import http_client
 from feeds.choices import FeedProviders
-from feeds.utils import validate_access_token, validate_feed_data
-from feeds.validators import is_valid_feed_url
+from feeds.models import SocialLink
+from feeds.tokens import get_access_token
+from feeds.utils import validate_feed_data
+from feeds.validators import get_feed_url_response, is_valid_rss_feed_data
+
+logger = logging.getLogger(__name__)
+
+FEEDS_FETCH_MAX_WORKERS = getattr(settings, 'FEEDS_FETCH_MAX_WORKERS', 8)
+FEEDS_FETCH_DEADLINE = getattr(settings, 'FEEDS_FETCH_DEADLINE', 10)
+FEEDS_FETCH_PROVIDER_LIMITS = getattr(settings, 'FEEDS_FETCH_PROVIDER_LIMITS', {})
+YOUTUBE_STATISTICS_CACHE_TTL = getattr(settings, 'YOUTUBE_STATISTICS_CACHE_TTL', 10 * 60)
+# max. ids of one call of the Videos API
+YOUTUBE_STATISTICS_BATCH_SIZE = 50
+
+
+def load_json(content):
+    """
+    Decode a JSON response body straight from its bytes, without decoding it to a string first
+    Args:
+        content (bytes): body of the response
+    return:
+        decoded data
+    """
+    return ujson.loads(content)
+
+
+def project_fields(data, fields):
+    """
+    Keep only the declared fields of the provider data, the lists are projected item by item
+    Args:
+        data (dict or list): provider data
+        fields (dict): names of the kept fields, with the projection of their value or None to keep it whole.
+            None keeps all the fields
+    return:
+        projected data
+    """
+    if fields is None:
+        return data
+    if isinstance(data, list):
+        return [project_fields(item, fields) for item in data]
+    if not isinstance(data, dict):
+        return data
+    return {name: project_fields(data[name], value_fields) for name, value_fields in fields.items() if name in data}
+
+
+class FeedsFetchResult(namedtuple('FeedsFetchResult', ['link_feeds', 'partial_link_ids'])):
+    """
+    Feeds fetched for each social link id, None for the links which could not be fetched
+    """
+    __slots__ = ()
+
+    @property
+    def feeds(self):
+        return [feed for feeds in self.link_feeds.values() if feeds for feed in feeds]
 
 
 class ProviderError(APIException):
@@ -27,6 +84,10 @@ class BaseFeedProvider(object):
     """
     def __init__(self, provider):
         self.provider = provider
+        # max. number of feeds returned by one feeds call, None if the provider returns all of them
+        self.feeds_page_size = None
+        # fields of the provider feed kept in the content of the unified feed, see project_fields
+        self.content_fields = None
 
     def build_provider_uri(self):
         raise NotImplementedError('.build_provider_uri() must be implemented')
@@ -41,7 +102,17 @@ class BaseFeedProvider(object):
         return key_id + "{}_".format(social_link.id) + feed_id + "_{}".format(social_link.account.expert.id)
 
     def get_valid_access_token(self, social_link):
-        raise NotImplementedError('.get_valid_access_token() is not implemented')
+        """
+        Get the access_token of the social link, the tokens about to expire are renewed in the background
+        Args:
+            social_link (obj): Social Link obj
+        return:
+            access_token, None if it expired and waits for its renewal
+        """
+        return get_access_token(social_link.account)
+
+    def refresh_access_token(self, account):
+        raise NotImplementedError('.refresh_access_token() is not implemented')
 
     def process_response_data(self, response):
         """
@@ -51,7 +122,7 @@ class BaseFeedProvider(object):
         return:
             processed data
         """
-        access_data = json.loads(response.content.decode('utf-8'))
+        access_data = load_json(response.content)
         if response.status_code != status.HTTP_200_OK:
             raise ProviderError
         return access_data
@@ -65,7 +136,7 @@ class BaseFeedProvider(object):
         return:
             processed data
         """
-        access_data = json.loads(response.content.decode('utf-8'))
+        access_data = load_json(response.content)
         if response.status_code != status.HTTP_200_OK:
             self.remove_or_log_error(access_data, social_link)
             access_data = None
@@ -80,6 +151,13 @@ class FaceBookProvider(BaseFeedProvider):
         self.provider = provider
         self.page_type = 'page'
         self.version = "v2.8"
+        self.feeds_page_size = 25
+        # the fields are chosen in the feeds call already, only the sample of the comments and likes is dropped
+        self.content_fields = {
+            'id': None, 'description': None, 'created_time': None, 'message': None, 'picture': None,
+            'updated_time': None, 'attachments': None, 'story': None, 'properties': None, 'link': None,
+            'object_id': None, 'comments': {'summary': None}, 'likes': {'summary': None},
+        }
         self.api_url = "https://www.facebook.com/"
         self.token_expiration_error = ['GraphMethodException', 'OAuthException']
         self.login_url = self.api_url + "{}/dialog/oauth?scope=user_posts,manage_pages&client_id={}&redirect_uri={}"
@@ -122,7 +200,7 @@ class FaceBookProvider(BaseFeedProvider):
             app_code
         )
         try:
-            response = requests.get(url)
+            response = http_client.get(url)
         except (ConnectionError, HTTPError, Timeout):
             raise ProviderError
 
@@ -142,7 +220,7 @@ class FaceBookProvider(BaseFeedProvider):
             access_token
         )
         try:
-            response = requests.get(url)
+            response = http_client.get(url)
         except (ConnectionError, HTTPError, Timeout):
             raise ProviderError
         return self.process_response_data(response)
@@ -159,7 +237,7 @@ class FaceBookProvider(BaseFeedProvider):
             self.version, token
         )
         try:
-            response = requests.get(get_user_api_url)
+            response = http_client.get(get_user_api_url)
         except (ConnectionError, HTTPError, Timeout):
             raise ProviderError
         return self.process_response_data(response)
@@ -182,7 +260,7 @@ class FaceBookProvider(BaseFeedProvider):
                 self.version, page_id, token
             )
         try:
-            response = requests.get(get_page_info_api_url)
+            response = http_client.get(get_page_info_api_url)
         except (ConnectionError, HTTPError, Timeout):
             raise ProviderError
         return self.process_response_data(response)
@@ -210,21 +288,24 @@ class FaceBookProvider(BaseFeedProvider):
         """
         return {'id': user_data['id'], 'type': 'user', 'name': user_data['name']}
 
-    def get_feeds_response_data(self, token, social_link, timestamp):
+    def get_feeds_response_data(self, token, social_link, timestamp, since=None):
         """
         function to get and return the access_token api response
         Args:
             token (str): access_token which is used to exchange the information
             social_link (obj): SocialLink
             timestamp (time): In Unix format
+            since (float): In Unix format, only the feeds published after it are needed
         Raises:
             ProviderError
         """
         feeds_url = self.feed_api_url.format(
             self.version, social_link.detail, token, timestamp
         )
+        if since is not None:
+            feeds_url += "&since={}".format(int(since))
         try:
-            response = requests.get(feeds_url)
+            response = http_client.get(feeds_url)
         except (ConnectionError, HTTPError, Timeout):
             raise ProviderError
         return self.process_feeds_response_data(response, social_link)
@@ -267,20 +348,10 @@ class FaceBookProvider(BaseFeedProvider):
                 'image': feed.get('picture'),
                 'description': feed.get('message', feed.get('story')),
                 'timestamp': dateparse.parse_datetime(feed['created_time']),
-                'content': feed
+                'content': project_fields(feed, self.content_fields)
             })
         return facebook_unify_feeds
 
-    def get_valid_access_token(self, social_link):
-        """
-        Validate the access_token
-        Args:
-            social_link (obj): Social Link obj
-        return:
-            access_token without any processing
-        """
-        return social_link.account.access_token
-
 
 class InstaGramProvider(BaseFeedProvider):
     """
@@ -289,7 +360,14 @@ class InstaGramProvider(BaseFeedProvider):
     def __init__(self, provider):
         self.provider = provider
         self.token_expiration_error = 'OAuthAccessTokenException'
+        self.content_fields = {
+            'id': None, 'type': None, 'link': None, 'created_time': None, 'caption': {'text': None},
+            'images': {'standard_resolution': None, 'thumbnail': None}, 'videos': {'standard_resolution': None},
+            'likes': None, 'comments': None, 'tags': None, 'location': None,
+            'user': {'id': None, 'username': None, 'full_name': None, 'profile_picture': None},
+        }
         self.version = "v1"
+        self.feeds_page_size = 20
         self.api_url = "https://api.instagram.com/"
         self.user_info_uri = self.api_url + '{}/users/self/?access_token={}'
         self.auth_url = self.api_url + "oauth/authorize/?client_id={}&redirect_uri={}&response_type=code"
@@ -326,7 +404,7 @@ class InstaGramProvider(BaseFeedProvider):
             'code': app_code
         }
         try:
-            response = requests.post(url=self.token_api_url, data=payload)
+            response = http_client.post(self.token_api_url, data=payload)
         except (ConnectionError, HTTPError, Timeout):
             raise ProviderError
         return self.process_response_data(response)
@@ -338,7 +416,7 @@ class InstaGramProvider(BaseFeedProvider):
         """
         url = self.user_info_uri.format(self.version, token)
         try:
-            response = requests.get(url)
+            response = http_client.get(url)
         except (ConnectionError, HTTPError, Timeout):
             raise ProviderError
         return self.process_response_data(response)
@@ -352,13 +430,14 @@ class InstaGramProvider(BaseFeedProvider):
         return {'id': user_data.get('data', {}).get('id'), 'type': 'user',
                 'name': user_data.get('data', {}).get('username')}
 
-    def get_feeds_response_data(self, token, social_link, timestamp):
+    def get_feeds_response_data(self, token, social_link, timestamp, since=None):
         """
         function to get and return the access_token api response
         Args:
             token (str): access_token which is used to exchange the information
             social_link (obj): SocialLink
             timestamp (time): In Unix format
+            since (float): In Unix format, only the feeds published after it are needed
         Raises:
             ProviderError
         """
@@ -366,7 +445,7 @@ class InstaGramProvider(BaseFeedProvider):
             self.version, social_link.detail, token
         )
         try:
-            response = requests.get(get_user_feeds_url)
+            response = http_client.get(get_user_feeds_url)
         except (ConnectionError, HTTPError, Timeout):
             raise ProviderError
         return self.process_feeds_response_data(response, social_link)
@@ -401,7 +480,7 @@ class InstaGramProvider(BaseFeedProvider):
         """
         instagram_unify_feeds = []
         for feed in feeds['data']:
-            if timestamp >= feed['created_time']:
+            if float(feed['created_time']) <= float(timestamp):
                 if feed.get('type') == 'image':
                     url = feed.get('images', {}).get('standard_resolution', {}).get('url')
                 else:
@@ -415,20 +494,10 @@ class InstaGramProvider(BaseFeedProvider):
                     'image': url,
                     'description': title,
                     'timestamp': timezone.datetime.fromtimestamp(float(feed['created_time']), dateparse.utc),
-                    'content': feed
+                    'content': project_fields(feed, self.content_fields)
                 })
         return instagram_unify_feeds
 
-    def get_valid_access_token(self, social_link):
-        """
-        Validate the access_token
-        Args:
-            social_link (obj): Social Link obj
-        return:
-            access_token without any processing
-        """
-        return social_link.account.access_token
-
 
 class YoutubeProvider(BaseFeedProvider):
     """
@@ -438,7 +507,16 @@ class YoutubeProvider(BaseFeedProvider):
         self.provider = provider
         self.page_type = 'channel'
         self.version = "v3"
+        self.feeds_page_size = 50
         self.token_expiration_error = 'Invalid Credentials'
+        # the statistics are added to the content after the projection
+        self.content_fields = {
+            'id': {'videoId': None},
+            'snippet': {
+                'publishedAt': None, 'channelId': None, 'channelTitle': None, 'title': None, 'description': None,
+                'thumbnails': None, 'liveBroadcastContent': None,
+            },
+        }
         self.default_expire_time = 3600
         self.api_user_info = "https://www.googleapis.com/oauth2/{}/userinfo?access_token={}"
         self.api_scope_url = "https://www.googleapis.com/auth/youtube https://www.googleapis.com/auth/userinfo.profile"
@@ -453,7 +531,7 @@ class YoutubeProvider(BaseFeedProvider):
             "{}/search/?publishedBefore={}&part=snippet&miken={}&access_token={}&key={}&type=video&maxResults=50"
         self.channel_api_url = self.search_list_url + "{}/channels?access_token={}&part=snippet&mine=true"
         self.videos_statistics_api_url = "https://www.googleapis.com/youtube/v3/videos/?" \
-                                         "part=statistics&id={}&access_token={}"
+                                         "part=statistics&id={}&key={}"
 
     @property
     def build_provider_uri(self):
@@ -493,10 +571,10 @@ class YoutubeProvider(BaseFeedProvider):
             'grant_type': 'refresh_token',
         }
         try:
-            response = requests.post(url=self.token_api_url, data=payload)
+            response = http_client.post(self.token_api_url, data=payload)
         except (ConnectionError, HTTPError, Timeout):
             raise ProviderError
-        response_data = json.loads(response.content.decode('utf-8'))
+        response_data = load_json(response.content)
         if response.status_code != status.HTTP_200_OK:
             return []
         return response_data
@@ -517,7 +595,7 @@ class YoutubeProvider(BaseFeedProvider):
             'code': app_code
         }
         try:
-            response = requests.post(url=self.token_api_url, data=payload)
+            response = http_client.post(self.token_api_url, data=payload)
         except (ConnectionError, HTTPError, Timeout):
             raise ProviderError
         return self.process_response_data(response)
@@ -529,7 +607,7 @@ class YoutubeProvider(BaseFeedProvider):
         """
         url = self.api_user_info.format(self.version, token)
         try:
-            response = requests.get(url)
+            response = http_client.get(url)
         except (ConnectionError, HTTPError, Timeout):
             raise ProviderError
         return self.process_response_data(response)
@@ -567,18 +645,19 @@ class YoutubeProvider(BaseFeedProvider):
                 self.version, page_id, token
             )
         try:
-            response = requests.get(get_page_info)
+            response = http_client.get(get_page_info)
         except (ConnectionError, HTTPError, Timeout):
             raise ProviderError
         return self.process_response_data(response)
 
-    def get_feeds_response_data(self, token, social_link, timestamp):
+    def get_feeds_response_data(self, token, social_link, timestamp, since=None):
         """
         function to get and return the access_token api response
         Args:
             token (str): access_token which is used to exchange the information
             social_link (obj): SocialLink
             timestamp (time): In Unix format
+            since (float): In Unix format, only the feeds published after it are needed
         Raises:
             ProviderError
         """
@@ -594,8 +673,13 @@ class YoutubeProvider(BaseFeedProvider):
                 self.version, formated_timestamp,
                 token, settings.GOOGLE_APP_API_KEY, social_link.detail
             )
+        if since is not None:
+            published_after = timezone.datetime.fromtimestamp(float(since), dateparse.utc)
+            youtube_serach_list_url += "&publishedAfter={}".format(
+                serializers.DateTimeField().to_representation(published_after)
+            )
         try:
-            response = requests.get(youtube_serach_list_url)
+            response = http_client.get(youtube_serach_list_url)
         except (ConnectionError, HTTPError, Timeout):
             raise ProviderError
         return self.process_feeds_response_data(response, social_link)
@@ -616,32 +700,61 @@ class YoutubeProvider(BaseFeedProvider):
             # TODO log the error
             pass
 
-    def get_statistics_data(self, access_token, feed_ids, feeds):
+    def statistics_key(self, video_id):
+        return settings.FEED_CACHE_KEY_PREFIX + "_YT_STATISTICS_{}".format(video_id)
+
+    def get_statistics_data(self, video_ids):
         """
-        Get the likes and comment statistics
+        Get the likes and comment statistics of up to 50 videos with one call
         Args:
-            access_token (str): token
-            feed_ids (list): list if feed ids
-            feeds (list): list of feeds
+            video_ids (list): ids of the videos
         returns:
-            feeds (list): updated list with key as statistics in the content
+            statistics (dict): statistics of each video id, an empty dict for the videos which were not returned.
+            Empty if the call failed
         """
-        # call the Videos API to get the likes and comments
+        # call the Videos API to get the likes and comments, they are public so any token of the app can read them
         try:
-            stats_response = requests.get(self.videos_statistics_api_url.format(','.join(feed_ids), access_token))
+            stats_response = http_client.get(
+                self.videos_statistics_api_url.format(','.join(video_ids), settings.GOOGLE_APP_API_KEY)
+            )
         except (ConnectionError, HTTPError, Timeout):
-            raise ProviderError
+            logger.warning('Statistics of the videos %s could not be fetched', video_ids)
+            return {}
         if stats_response.status_code != status.HTTP_200_OK:
-            # TODO log the error message
-            return feeds
-        statistics = OrderedDict()
-        response_data = json.loads(stats_response.content.decode('utf-8'))
-        for item in response_data['items']:
-            statistics.update({
-                item['id']: item['statistics']
-            })
+            logger.warning('Statistics of the videos %s could not be fetched: %s', video_ids,
+                           stats_response.status_code)
+            return {}
+        response_data = load_json(stats_response.content)
+        statistics = {video_id: {} for video_id in video_ids}
+        statistics.update((item['id'], item['statistics']) for item in response_data['items'])
+        return statistics
+
+    def add_statistics(self, feeds):
+        """
+        Add the likes and comment statistics to the content of the feeds. The statistics are cached per video for
+        YOUTUBE_STATISTICS_CACHE_TTL seconds, the other ones are fetched 50 videos at a time
+        Args:
+            feeds (list): list of feeds, of any number of social links
+        returns:
+            feeds (list): updated list with key as statistics in the content
+        """
+        video_ids = list(OrderedDict.fromkeys(feed['content']['id']['videoId'] for feed in feeds))
+        keys = {self.statistics_key(video_id): video_id for video_id in video_ids}
+        statistics = {keys[key]: data for key, data in cache.get_many(list(keys)).items()} if keys else {}
+
+        missing_ids = [video_id for video_id in video_ids if video_id not in statistics]
+        fetched_statistics = {}
+        for start in range(0, len(missing_ids), YOUTUBE_STATISTICS_BATCH_SIZE):
+            batch = missing_ids[start:start + YOUTUBE_STATISTICS_BATCH_SIZE]
+            fetched_statistics.update(self.get_statistics_data(batch))
+        if fetched_statistics:
+            cache.set_many({
+                self.statistics_key(video_id): data for video_id, data in fetched_statistics.items()
+            }, YOUTUBE_STATISTICS_CACHE_TTL)
+        statistics.update(fetched_statistics)
+
         for feed in feeds:
-            feed['content'].update({'statistics': statistics.get(feed['content']['id'].get('videoId'))})
+            feed['content']['statistics'] = statistics.get(feed['content']['id']['videoId']) or None
         return feeds
 
     def parse_feed_data(self, access_token, feeds, key_id, social_link, timestamp):
@@ -657,7 +770,6 @@ class YoutubeProvider(BaseFeedProvider):
             formatted dict
         """
         youtube_unify_feeds = []
-        feed_ids = []
         for feed in feeds['items']:
             feed_id = feed['id'].get('videoId')
             timestamp = dateparse.parse_datetime(feed['snippet']['publishedAt'])
@@ -665,7 +777,6 @@ class YoutubeProvider(BaseFeedProvider):
             title = feed.get('snippet', {}).get('title')
             image = feed.get('snippet', {}).get('thumbnails', {}).get('high', {}).get('url')
             if feed_id:
-                feed_ids.append(feed_id)
                 youtube_unify_feeds.append({
                     'id': self.get_uniquie_feed_id(key_id, feed_id, social_link),
                     'title': title,
@@ -674,31 +785,31 @@ class YoutubeProvider(BaseFeedProvider):
                     'image': image,
                     'description': description,
                     'timestamp': timestamp,
-                    'content': feed
+                    'content': project_fields(feed, self.content_fields)
                 })
 
-        return self.get_statistics_data(access_token, feed_ids, youtube_unify_feeds)
+        # the statistics are added by add_feeds_statistics, for the feeds of all the links at once
+        return youtube_unify_feeds
 
-    def get_valid_access_token(self, social_link):
+    def refresh_access_token(self, account):
         """
-        Validate the access_token
+        Renew the access_token of the account with its refresh_token and save it
         Args:
-            social_link (obj): Social Link obj
+            account (obj): SocialAccount
         return:
-            Updated access_token if refresh token is returned from Youtube else none
-        """
-        # check if access_token is expired
-        access_token = social_link.account.access_token
-        if social_link.account.refresh_token:
-            is_valid_access_token = validate_access_token(social_link.account.access_token_expiry_timestamp,
-                                                          self.default_expire_time)
-            if not is_valid_access_token:
-                token_response = self.get_refresh_token_response(social_link.account.refresh_token)
-                if token_response:
-                    access_token = token_response['access_token']
-                else:
-                    access_token = None
-        return access_token
+            Boolean True if the access_token was renewed
+        Raises:
+            ProviderError
+        """
+        token_response = self.get_refresh_token_response(account.refresh_token)
+        if not token_response:
+            return False
+        account.access_token = token_response['access_token']
+        account.access_token_expiry_timestamp = self.make_access_token_expiry_timestamp(
+            token_response.get('expires_in', self.default_expire_time)
+        )
+        account.save(update_fields=['access_token', 'access_token_expiry_timestamp', 'modified_timestamp'])
+        return True
 
 
 class RssFeedProvider(BaseFeedProvider):
@@ -707,18 +818,78 @@ class RssFeedProvider(BaseFeedProvider):
     """
     def __init__(self, provider):
         self.provider = provider
+        # the whole feed is returned every time
+        self.feeds_page_size = None
+        # the *_parsed fields and the *_detail fields of feedparser other than summary_detail are left out, content
+        # is the whole article
+        self.content_fields = {
+            'id': None, 'title': None, 'link': None, 'summary': None, 'summary_detail': None, 'content': None,
+            'published': None, 'updated': None, 'author': None, 'tags': {'term': None}, 'media_thumbnail': None,
+            'media_content': None,
+        }
 
-    def get_feeds_response_data(self, token, social_link, timestamp):
+    def get_feeds_response_data(self, token, social_link, timestamp, since=None):
         """
         function to get and return the access_token api response
         Args:
             token (str): access_token which is used to exchange the information
             social_link (obj): SocialLink
             timestamp (time): In Unix format
+            since (float): In Unix format, only the feeds published after it are needed
         Raises:
             ProviderError
         """
-        return is_valid_feed_url(token)
+        headers = {}
+        if since is not None:
+            # the feeds of the last response are stored already, so it is enough to know that nothing changed
+            if social_link.feeds_etag:
+                headers['If-None-Match'] = social_link.feeds_etag
+            if social_link.feeds_last_modified:
+                headers['If-Modified-Since'] = social_link.feeds_last_modified
+
+        response = get_feed_url_response(token, headers)
+        if response.status_code == status.HTTP_304_NOT_MODIFIED:
+            # not downloaded nor parsed again
+            return {'items': []}
+
+        feeds = is_valid_rss_feed_data(response.content)
+        until = timezone.datetime.fromtimestamp(float(timestamp), dateparse.utc)
+        if any(self.get_updated_at(feed) > until for feed in feeds['items'] if validate_feed_data(feed)):
+            # the validators describe the whole feed but its entries published after the timestamp are not stored,
+            # so the next fetch has to download it again
+            self.save_validators(social_link)
+        else:
+            self.save_validators(social_link, response)
+        return feeds
+
+    def save_validators(self, social_link, response=None):
+        """
+        Keep the ETag and Last-Modified of the response, for the conditional request of the next fetch
+        Args:
+            social_link (obj): SocialLink
+            response (obj): requests Response of the feed, the validators are cleared without it
+        """
+        headers = response.headers if response is not None else {}
+        etag = headers.get('ETag', '')
+        last_modified = headers.get('Last-Modified', '')
+        if len(etag) > SocialLink._meta.get_field('feeds_etag').max_length:
+            # can't be sent back as it is
+            etag = ''
+        if (etag, last_modified) == (social_link.feeds_etag, social_link.feeds_last_modified):
+            return
+        SocialLink.objects.filter(id=social_link.id).update(feeds_etag=etag, feeds_last_modified=last_modified)
+        social_link.feeds_etag, social_link.feeds_last_modified = etag, last_modified
+
+    def get_updated_at(self, feed):
+        """
+        Get the time a valid feed entry was last updated
+        Args:
+            feed (dict): feed entry
+        return:
+            aware datetime
+        """
+        updated_at = feed.get('updated_parsed') or feed.get('created_parsed') or feed.get('published_parsed')
+        return timezone.make_aware(timezone.datetime(*updated_at[:-3]), dateparse.utc)
 
     def parse_feed_data(self, access_token, feeds, key_id, social_link, timestamp):
         """
@@ -736,11 +907,7 @@ class RssFeedProvider(BaseFeedProvider):
         for feed in feeds['items']:
             if not validate_feed_data(feed):
                 continue
-            updated_at = feed.get('updated_parsed') or feed.get('created_parsed') or feed.get('published_parsed')
-            updated_at = timezone.make_aware(
-                timezone.datetime(*updated_at[:-3]),
-                dateparse.utc
-            )
+            updated_at = self.get_updated_at(feed)
             image_url = feed.get('media_thumbnail')[0].get('url', '') if feed.get('media_thumbnail') else ''
             if timezone.datetime.fromtimestamp(float(timestamp), dateparse.utc) >= updated_at:
                 rss_unify_feeds.append({
@@ -751,20 +918,10 @@ class RssFeedProvider(BaseFeedProvider):
                     'image': image_url,
                     'description': feed.get('summary'),
                     'timestamp': updated_at,
-                    'content': feed
+                    'content': project_fields(feed, self.content_fields)
                 })
         return rss_unify_feeds
 
-    def get_valid_access_token(self, social_link):
-        """
-        Validate the access_token
-        Args:
-            social_link (obj): Social Link obj
-        return:
-            access_token without any processing
-        """
-        return social_link.account.access_token
-
 
 def get_provider(provider):
     """
@@ -794,36 +951,147 @@ def sort_feeds_data(feeds, timestamp):
     return sorted(feeds, key=lambda k: k['timestamp'], reverse=True)
 
 
-def build_feeds_data(social_links, timestamp):
+def get_account_provider(account):
     """
-    Build the feeds_data by calling the APIS
+    function to return the provider of a social account
+    Args:
+        account (obj): SocialAccount
+    return:
+        provider name and provider object
+    """
+    provider = FeedProviders(int(account.provider)).name
+    return provider, get_provider(provider)
+
+
+def get_social_link_provider(social_link):
+    """
+    Get the provider of a social link
+    Args:
+        social_link (obj): Social Link Object
+    return:
+        provider name and provider object, None and None for the unknown feed types
+    """
+    providers = {provider.value: provider.name for provider in FeedProviders}
+    provider = providers.get(int(social_link.feed_type))
+    if not provider:
+        return None, None
+    return provider, get_provider(provider)
+
+
+def fetch_social_link_feeds(social_link, timestamp, since=None):
+    """
+    Fetch and parse the feeds of one social link
+    Args:
+        social_link (obj): Social Link Object
+        timestamp (time): time in unix timestamp
+        since (float): only the feeds published after this unix timestamp are returned
+    return:
+        feeds (list): list of unified feed dict, None if the link could not be fetched
+    """
+    provider, provider_object = get_social_link_provider(social_link)
+    if not provider:
+        return None
+    access_token = provider_object.get_valid_access_token(social_link)
+    if not access_token:
+        return None
+    try:
+        access_data = provider_object.get_feeds_response_data(
+            access_token, social_link, timestamp, since=since
+        )
+    except (HTTPError, Timeout, ConnectionError, ValidationError):
+        return None
+    if not access_data:
+        return None
+
+    feeds = provider_object.parse_feed_data(access_token, access_data,
+                                            settings.SOCIAL_KEY_MAPPING.get(provider),
+                                            social_link, timestamp)
+    if since is not None:
+        # not every provider can filter on the publish time, so the older feeds are dropped here as well
+        feeds = [feed for feed in feeds if feed['timestamp'].timestamp() > since]
+    return feeds
+
+
+def fetch_feeds_data(social_links, timestamp, since=None):
+    """
+    Fetch the feeds of all the social links concurrently on a bounded thread pool.
+
+    Every provider can be given its own concurrency limit with FEEDS_FETCH_PROVIDER_LIMITS, and the whole fetch is
+    bounded by FEEDS_FETCH_DEADLINE seconds. Links which did not finish in time are left out of the feeds and
+    returned as partial.
     Args:
         social_links (obj): Social Link Object
         timestamp (time): time in unix timestamp
+        since (dict): unix timestamp after which the feeds are fetched, for each social link id
     return:
-        all_feeds (list): merged list of feed dict
+        FeedsFetchResult with the feeds of each social link and the ids of the partial links
     """
-    providers = {provider.value: provider.name for provider in FeedProviders}
-    all_feeds = []
-    for social_link in social_links:
-        provider = providers.get(int(social_link.feed_type))
-        if not provider:
-            continue
-        provider_object = get_provider(provider)
-        access_token = provider_object.get_valid_access_token(social_link)
-        if not access_token:
-            continue
+    social_links = list(social_links)
+    since = since or {}
+    if not social_links:
+        return FeedsFetchResult(OrderedDict(), [])
+
+    semaphores = {
+        provider: threading.BoundedSemaphore(limit) for provider, limit in FEEDS_FETCH_PROVIDER_LIMITS.items()
+    }
+
+    def fetch(social_link):
+        semaphore = semaphores.get(get_social_link_provider(social_link)[0])
         try:
-            access_data = provider_object.get_feeds_response_data(
-                access_token, social_link, timestamp
-            )
-        except (HTTPError, Timeout, ConnectionError, ValidationError):
-            continue
-        if not access_data:
+            if semaphore is None:
+                return fetch_social_link_feeds(social_link, timestamp, since.get(social_link.id))
+            with semaphore:
+                return fetch_social_link_feeds(social_link, timestamp, since.get(social_link.id))
+        finally:
+            # the worker threads get their own database connection when a link is deleted or updated
+            connection.close()
+
+    executor = ThreadPoolExecutor(max_workers=min(FEEDS_FETCH_MAX_WORKERS, len(social_links)))
+    futures = [(executor.submit(fetch, social_link), social_link) for social_link in social_links]
+    wait([future for future, _ in futures], timeout=FEEDS_FETCH_DEADLINE)
+    # don't wait for the stuck providers, their threads finish in the background
+    executor.shutdown(wait=False)
+
+    link_feeds = OrderedDict()
+    partial_link_ids = []
+    for future, social_link in futures:
+        if not future.done():
+            future.cancel()
+            partial_link_ids.append(social_link.id)
             continue
+        link_feeds[social_link.id] = future.result()
 
-        all_feeds.extend(provider_object.parse_feed_data(access_token, access_data,
-                                                         settings.SOCIAL_KEY_MAPPING.get(provider),
-                                                         social_link, timestamp))
+    if partial_link_ids:
+        logger.warning('Feeds of social links %s were not fetched in %s seconds', partial_link_ids,
+                       FEEDS_FETCH_DEADLINE)
+    add_feeds_statistics(social_links, link_feeds)
+    return FeedsFetchResult(link_feeds, partial_link_ids)
 
-    return sort_feeds_data(all_feeds, timestamp)
+
+def add_feeds_statistics(social_links, link_feeds):
+    """
+    Add the statistics to the fetched feeds of all the social links at once, so the calls to the providers are
+    batched across the links
+    Args:
+        social_links (list): Social Link Objects
+        link_feeds (dict): fetched feeds of each social link id
+    """
+    youtube_feeds = []
+    for social_link in social_links:
+        if link_feeds.get(social_link.id) and \
+                get_social_link_provider(social_link)[0] in settings.YOUTUBE_FEED_PROVIDER:
+            youtube_feeds.extend(link_feeds[social_link.id])
+    if youtube_feeds:
+        get_provider(settings.YOUTUBE_FEED_PROVIDER[0]).add_statistics(youtube_feeds)
+
+
+def build_feeds_data(social_links, timestamp):
+    """
+    Build the feeds_data by calling the APIS
+    Args:
+        social_links (obj): Social Link Object
+        timestamp (time): time in unix timestamp
+    return:
+        all_feeds (list): merged list of feed dict
+    """
+    return sort_feeds_data(fetch_feeds_data(social_links, timestamp).feeds, timestamp)
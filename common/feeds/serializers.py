@@ -1,6 +1,7 @@
 import re
 
 from django.conf import settings
+from django.db import models, transaction
 from django.utils.html import strip_tags
 from rest_framework import serializers
 
@@ -8,6 +9,7 @@ from experchat.models.users import Expert
 from experchat.serializers import ExpertSerializer, TagSerializer
 from feeds.cache_feeds import CacheFeedData
 from feeds.choices import FeedProviders, FeedTypes
+from feeds.counters import get_many_buffered_likes
 from feeds.models import Content, ContentUserActivity, IgnoredContent, SocialAccount, SocialLink
 from feeds.providers import get_provider
 from feeds.utils import PushFeeds, PushSuperAdminFeeds, get_tag_ids_with_parent, update_content_tags_at_getsream
@@ -215,13 +217,47 @@ class RSSLinkSerializer(serializers.Serializer):
         return social_link
 
 
+def get_user_activities(request, content_ids):
+    """
+    Get the activities of the current user on the contents with one query
+    Args:
+        request (obj): Request
+        content_ids (list): Content ids
+    Return:
+        set of (content id, activity type), None if the current user is not a User
+    """
+    if not hasattr(request.user, 'user'):
+        return None
+    return set(
+        ContentUserActivity.objects.filter(
+            user=request.user.user, content__in=content_ids
+        ).values_list('content_id', 'activity_type')
+    )
+
+
+class ContentBulkListSerializer(serializers.ListSerializer):
+    """
+    Loads the activities of the current user and the buffered likes of all the listed contents at once and passes
+    them to each row in the context.
+    """
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.Manager) else data
+        contents = list(iterable)
+        content_ids = [content.id for content in contents]
+        user_activities = get_user_activities(self.context['request'], content_ids)
+        if user_activities is not None:
+            self.context['user_activities'] = user_activities
+        self.context['buffered_likes'] = get_many_buffered_likes(content_ids)
+        return super(ContentBulkListSerializer, self).to_representation(contents)
+
+
 class ContentSerializer(serializers.ModelSerializer):
     """
     Content model Serializer
     """
     owner = serializers.SerializerMethodField()
     tags = TagSerializer(many=True, read_only=True)
-    likes = serializers.ReadOnlyField()
+    likes = serializers.SerializerMethodField()
     liked_by_current_user = serializers.SerializerMethodField()
     saved_by_current_user = serializers.SerializerMethodField()
     description_text = serializers.SerializerMethodField()
@@ -239,18 +275,38 @@ class ContentSerializer(serializers.ModelSerializer):
                 "validators": []
             }
         }
+        list_serializer_class = ContentBulkListSerializer
 
-    def get_liked_by_current_user(self, obj):
+    def has_user_activity(self, obj, activity_type):
+        """
+        Check if the current user has the activity on the content
+        Args:
+            obj (obj): Content
+            activity_type (str): ContentUserActivity type
+        Return:
+            Boolean True or False
+        """
         request = self.context['request']
-        if hasattr(request.user, 'user'):
-            return obj.user_activity.filter(user=request.user.user, activity_type=ContentUserActivity.LIKE).exists()
-        return False
+        if not hasattr(request.user, 'user'):
+            return False
+        user_activities = self.context.get('user_activities')
+        if user_activities is not None:
+            # loaded for the whole list by ContentBulkListSerializer
+            return (obj.id, activity_type) in user_activities
+        return obj.user_activity.filter(user=request.user.user, activity_type=activity_type).exists()
+
+    def get_likes(self, obj):
+        buffered_likes = self.context.get('buffered_likes')
+        if buffered_likes is not None:
+            # loaded for the whole list by ContentBulkListSerializer
+            return obj.get_likes(buffered_likes.get(obj.id, 0))
+        return obj.likes
+
+    def get_liked_by_current_user(self, obj):
+        return self.has_user_activity(obj, ContentUserActivity.LIKE)
 
     def get_saved_by_current_user(self, obj):
-        request = self.context['request']
-        if hasattr(request.user, 'user'):
-            return obj.user_activity.filter(user=request.user.user, activity_type=ContentUserActivity.FAVORITE).exists()
-        return False
+        return self.has_user_activity(obj, ContentUserActivity.FAVORITE)
 
     def get_description_text(self, obj):
         if obj.description is None:
@@ -334,18 +390,38 @@ class ContentSerializer(serializers.ModelSerializer):
             Content Model instance
         """
         content_id = validated_data.pop('content_id')
-        instance, created = Content.objects.get_or_create(content_id=content_id, defaults=validated_data)
-        if not created:
-            instance.is_deleted = False
-            instance.save()
-
-        push_feeds = PushFeeds(instance.social_link)
-        tags = push_feeds.tag_objs()
-        instance.tags.add(*tags)
-        push_feeds.push_feeds_to_streamfeed(instance)
+        with transaction.atomic():
+            instance, created = Content.objects.get_or_create(content_id=content_id, defaults=validated_data)
+            if not created:
+                instance.is_deleted = False
+                instance.save()
+
+            push_feeds = PushFeeds(instance.social_link)
+            tags = push_feeds.tag_objs()
+            instance.tags.add(*tags)
+            push_feeds.push_feeds_to_streamfeed(instance)
         return instance
 
 
+class ContentCacheSerializer(ContentSerializer):
+    """
+    Serializes the fields of a content which are the same for every user, the Getstream timelines cache this data and
+    add the fields of the current user when responding
+    """
+    user_fields = ('liked_by_current_user', 'saved_by_current_user')
+    # the buffered likes change too often to be cached, they are added when responding
+    likes = serializers.ReadOnlyField(source='saved_likes')
+
+    class Meta(ContentSerializer.Meta):
+        list_serializer_class = serializers.ListSerializer
+
+    def get_fields(self):
+        fields = super(ContentCacheSerializer, self).get_fields()
+        for field_name in self.user_fields + tuple(self.context.get('excluded_fields', ())):
+            fields.pop(field_name)
+        return fields
+
+
 class IgnoredContentSerializers(serializers.ModelSerializer):
     """
     IgnoredContent model Serializer
@@ -1,8 +1,11 @@
-from django.db.models.signals import pre_delete
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
 from django.dispatch import receiver
 
-from feeds.models import Content
+from feeds.models import Content, ContentStats, IgnoredContent
 from feeds.tasks import delete_content_from_getstream
+from feeds.utils import FilteredContentIndex
+from streamfeeds.cache import ContentCache
 
 
 @receiver(pre_delete, sender=Content)
@@ -15,3 +18,51 @@ def remove_content_feeds_getstream(sender, **kwargs):
         owner_id=instance.owner_id,
         content_id=instance.id,
     )
+
+
+@receiver(post_save, sender=Content)
+@receiver(post_delete, sender=Content)
+def invalidate_content_cache(sender, **kwargs):
+    """
+    After saving or deleting Content, drop its cached timeline data.
+    """
+    ContentCache(kwargs['instance'].id).invalidate()
+
+
+@receiver(post_save, sender=ContentStats)
+def invalidate_content_stats_cache(sender, **kwargs):
+    """
+    After the likes of Content change, drop its cached timeline data.
+    """
+    ContentCache(kwargs['instance'].content_id).invalidate()
+
+
+@receiver(m2m_changed, sender=Content.tags.through)
+def invalidate_content_tags_cache(sender, **kwargs):
+    """
+    After the tags of Content change, drop its cached timeline data.
+    """
+    action, instance = kwargs['action'], kwargs['instance']
+    if not kwargs['reverse']:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            ContentCache(instance.id).invalidate()
+    elif action in ('post_add', 'post_remove'):
+        ContentCache.invalidate_many(kwargs['pk_set'])
+    elif action == 'pre_clear':
+        # the contents of the tag are not known anymore after clearing
+        ContentCache.invalidate_many(instance.contents.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Content)
+@receiver(post_delete, sender=Content)
+@receiver(post_save, sender=IgnoredContent)
+@receiver(post_delete, sender=IgnoredContent)
+def invalidate_filtered_content_index(sender, **kwargs):
+    """
+    After publishing or ignoring a content, drop the cached filtered content ids of the expert.
+    """
+    instance = kwargs['instance']
+    index = FilteredContentIndex(instance.expert_id if sender is IgnoredContent else instance.owner_id)
+    index.invalidate()
+    # once more after the commit, in case the index was rebuilt from the data before the commit in the meantime
+    transaction.on_commit(index.invalidate)
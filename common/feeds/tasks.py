@@ -1,6 +1,15 @@
+import random
+
 from celery import shared_task
+from celery.decorators import periodic_task
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
 
-from feeds.models import Content, ContentStats
+from feeds.counters import add_content_likes, save_buffered_likes
+from feeds.models import SocialAccount, SocialLink
+from feeds.tokens import FEEDS_TOKEN_REFRESH_MARGIN, renew_access_token, schedule_access_token_refresh
 from streamfeeds.utils import StreamHelper
 
 
@@ -25,8 +34,7 @@ def modify_tags_on_getstream(user_id, new_tag_ids, existing_tags_ids, content_id
 
     # Remove Feeds from Getstream
     tag_ids_remove_getstream = list(set(existing_tags_ids) - set(new_tag_ids))
-    for tag_id in tag_ids_remove_getstream:
-        streamhelper.remove_content_tag_feeds(content_id, tag_id)
+    streamhelper.remove_content_tags_feeds(content_id, tag_ids_remove_getstream)
 
 
 @shared_task
@@ -45,20 +53,92 @@ def delete_content_from_getstream(owner_id, content_id):
 @shared_task
 def like_or_unlike_content(content_id, user_activity):
     """
-    Celery task to increase and decrease the count of like for a content.
+    Celery task to increase and decrease the count of like for a content. The likes are buffered and saved in batches
+    by flush_content_likes.
     Args:
         content_id : Content object Id.
         user_activity : type of user activity(like or dislike)
     Return: None
     """
-    content = Content.objects.get(id=content_id)
-    try:
-        stats = content.stats
-    except Content.stats.RelatedObjectDoesNotExist:
-        # When the comment will be liked for the first time
-        stats = ContentStats.objects.create(content=content)
     if user_activity == 'like':
-        stats.likes += 1
+        add_content_likes(content_id, 1)
     if user_activity == 'dislike':
-        stats.likes -= 1
-    stats.save()
+        add_content_likes(content_id, -1)
+
+
+@shared_task
+def flush_content_likes(content_id):
+    """
+    Celery task to save the buffered likes of a content in ContentStats.
+    Args:
+        content_id : Content object Id.
+    Return: None
+    """
+    save_buffered_likes(content_id)
+
+
+@periodic_task(run_every=(settings.FEEDS_PREFETCH_TASK_SCHEDULE))
+def schedule_feeds_prefetch():
+    """
+    Periodic Celery task to refresh the feeds of the experts having social links which were not fetched for
+    FEEDS_PREFETCH_INTERVAL seconds. The refreshes are spread over FEEDS_PREFETCH_JITTER seconds, so the providers
+    are not called for all the experts at once.
+    Return: None
+    """
+    stale_timestamp = timezone.now() - timezone.timedelta(seconds=settings.FEEDS_PREFETCH_INTERVAL)
+    expert_ids = SocialLink.objects.filter(
+        Q(feeds_fetched_timestamp__isnull=True) | Q(feeds_fetched_timestamp__lt=stale_timestamp),
+        is_deleted=False
+    ).values_list('account__expert_id', flat=True).distinct()
+
+    for expert_id in expert_ids:
+        # skip the experts whose refresh is still waiting in the queue from the previous run
+        lock_key = settings.FEED_CACHE_KEY_PREFIX + "_PREFETCH_{}".format(expert_id)
+        if not cache.add(lock_key, True, settings.FEEDS_PREFETCH_JITTER + settings.FEEDS_FETCH_DEADLINE):
+            continue
+        prefetch_expert_feeds.apply_async((expert_id,), countdown=random.uniform(0, settings.FEEDS_PREFETCH_JITTER))
+
+
+@shared_task
+def prefetch_expert_feeds(expert_id):
+    """
+    Celery task to fetch and cache the feeds of all the social links of an expert.
+    Args:
+        expert_id (id): The id of Expert
+    Return: None
+    """
+    # feeds.cache_feeds imports the providers, which import feeds.utils, which imports this module
+    from feeds.cache_feeds import CacheFeedData
+
+    social_links = SocialLink.objects.filter(
+        account__expert_id=expert_id, is_deleted=False).select_related('account__expert')
+    CacheFeedData(expert_id).refresh_link_feeds(social_links)
+
+
+@periodic_task(run_every=(settings.FEEDS_TOKEN_REFRESH_TASK_SCHEDULE))
+def schedule_access_tokens_refresh():
+    """
+    Periodic Celery task to renew the access tokens of the social accounts with live links before they expire, so
+    the feeds fetches never wait for an OAuth call.
+    Return: None
+    """
+    expiring_timestamp = timezone.now() + timezone.timedelta(seconds=FEEDS_TOKEN_REFRESH_MARGIN)
+    account_ids = SocialAccount.objects.filter(
+        Q(access_token_expiry_timestamp__isnull=True) | Q(access_token_expiry_timestamp__lt=expiring_timestamp),
+        refresh_token__isnull=False,
+        social_accounts__is_deleted=False
+    ).exclude(refresh_token='').values_list('id', flat=True).distinct()
+
+    for account_id in account_ids:
+        schedule_access_token_refresh(account_id)
+
+
+@shared_task
+def refresh_access_token(account_id):
+    """
+    Celery task to renew the access token of a social account, one at a time per account.
+    Args:
+        account_id (id): The id of SocialAccount
+    Return: None
+    """
+    renew_access_token(account_id)
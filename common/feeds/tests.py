@@ -1,23 +1,40 @@
+import json
+import threading
+import time
+from collections import OrderedDict
 from datetime import timedelta
 from unittest import mock
 from unittest.mock import MagicMock
 
 import pytest
 from django.conf import settings
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
 from django.utils import timezone
 from rest_framework.exceptions import ValidationError
 
-from experchat.models.domains import Tag
+from experchat.enumerations import TagTypes
+from experchat.models.domains import Domain, Tag
 from experchat.models.users import Expert, ExpertProfile, User
-from feeds import test_data
-from feeds.cache_feeds import CacheFeedData
-from feeds.models import Content, SocialAccount, SocialLink
-from feeds.providers import get_provider, sort_feeds_data
-from feeds.tasks import modify_tags_on_getstream
-from feeds.utils import PushFeeds, PushSuperAdminFeeds, update_content_tags_at_getsream
+from experchat.single_flight import SingleFlightLock
+from feeds import http_client, test_data
+from feeds.cache_feeds import CacheFeedData, SocialLinkFeedStore, decode_feed, encode_feed, merge_feed_refs
+from feeds.choices import FeedProviders
+from feeds.counters import get_buffered_likes, save_buffered_likes
+from feeds.models import Content, ContentStats, ContentUserActivity, IgnoredContent, SocialAccount, SocialLink
+from feeds.pagination import paginate_content_results
+from feeds.providers import FeedsFetchResult, fetch_feeds_data, get_provider, sort_feeds_data
+from feeds.serializers import ContentSerializer
+from feeds.tasks import like_or_unlike_content, modify_tags_on_getstream, prefetch_expert_feeds
+from feeds.tokens import renew_access_token, schedule_access_token_refresh
+from feeds.utils import (
+    PushFeeds, PushSuperAdminFeeds, filter_contents, iter_filter_content_ids, update_content_tags_at_getsream
+)
 from feeds.validators import is_valid_rss_feed_data
-from streamfeeds.utils import StreamHelper
+from streamfeeds.utils import StreamHelper, read_content_feeds_getstream
+
+UserBase = get_user_model()
 
 
 class TestRssFeedData:
@@ -68,16 +85,16 @@ class TestPushFeeds(TestCase):
                                  ))
 
     @mock.patch('feeds.utils.get_tag_ids_with_parent')
-    @mock.patch.object(StreamHelper, 'expert_publish_content')
-    def test_push_feeds_to_streamfeed(self, mock_expert_publish_content, mock_parent_tags):
+    @mock.patch('feeds.utils.enqueue_stream_operation')
+    def test_push_feeds_to_streamfeed(self, mock_enqueue_stream_operation, mock_parent_tags):
         """
         test case for method push_feeds_to_streamfeed
         """
         # call the actual method
         mock_parent_tags.return_value = self.tag_ids
         self.push_feeds.push_feeds_to_streamfeed(self.content)
-        mock_expert_publish_content.assert_called_once_with(
-            1, self.content.id, expert_profile_ids=None, tag_ids=self.tag_ids
+        mock_enqueue_stream_operation.assert_called_once_with(
+            'expert_publish_content', 1, self.content.id, None, self.tag_ids
         )
 
     @mock.patch.object(Tag, 'objects')
@@ -117,21 +134,223 @@ class TestCacheFeedData(TestCase):
         self.timestamp = '1486731859'
         self.cache_feed = CacheFeedData(self.expert_id)
 
-    def test_feeds_key_valid(self):
+    @mock.patch('feeds.cache_feeds.fetch_feeds_data')
+    def test_build_link_refs_serves_stale_stores_during_a_build(self, mock_fetch_feeds_data):
+        """
+        test case for build_link_refs while another request fetches the links of the expert
+        """
+        cache.clear()
+        store = SocialLinkFeedStore(1, until=int(self.timestamp) - 60 * 60, refs=[('rs_1', 1486731000)])
+        cache.set(*store.to_cache())
+        social_links = [MagicMock(spec=SocialLink, id=1, feed_type=4), MagicMock(spec=SocialLink, id=2, feed_type=4)]
+        mock_fetch_feeds_data.return_value = FeedsFetchResult(OrderedDict(), [])
+
+        lock = SingleFlightLock(self.cache_feed.build_lock_key(), 30)
+        assert lock.acquire()
+        with mock.patch('feeds.cache_feeds.FEEDS_BUILD_LOCK_WAIT', 0.1):
+            result, _, link_refs = self.cache_feed.build_link_refs(social_links, self.timestamp)
+        # the link without store is left to the other request
+        assert link_refs == [[('rs_1', 1486731000)], []]
+        assert result.partial_link_ids == [2]
+        assert mock_fetch_feeds_data.call_args[0][0] == []
+
+        # the other request is done without having fetched it
+        lock.release()
+        self.cache_feed.build_link_refs(social_links, self.timestamp)
+        assert mock_fetch_feeds_data.call_args[0][0] == social_links
+
+    @mock.patch('feeds.cache_feeds.fetch_feeds_data')
+    def test_stored_feeds_are_written_again_with_the_store(self, mock_fetch_feeds_data):
         """
-        test case for feeds_key method with valid data
-        :return:
+        test case for the stored feeds kept in the cache as long as the store refers to them
         """
-        assert self.cache_feed.feeds_key(self.timestamp) == \
-            settings.FEED_CACHE_KEY_PREFIX + "_{}_{}".format(self.expert_id, self.timestamp)
+        cache.clear()
+        feed = {'id': 'rs_1', 'timestamp': timezone.datetime.fromtimestamp(1486731000, timezone.utc)}
+        new_feed = {'id': 'rs_3', 'timestamp': timezone.datetime.fromtimestamp(1486731500, timezone.utc)}
+        cache.set('rs_1', encode_feed(feed))
+        refs = [('rs_1', 1486731000), ('rs_2', 1486730000)]
+        store = SocialLinkFeedStore(1, until=int(self.timestamp) - 60 * 60, refs=refs)
+        cache.set(*store.to_cache())
+        social_link = MagicMock(spec=SocialLink, id=1, feed_type=4)
+        mock_fetch_feeds_data.return_value = FeedsFetchResult(OrderedDict([(1, [new_feed])]), [])
+
+        with mock.patch('feeds.cache_feeds.cache.set_many', wraps=cache.set_many) as mock_set_many:
+            _, _, link_refs = self.cache_feed.build_link_refs([social_link], self.timestamp)
+        assert set(mock_set_many.call_args_list[0][0][0]) == {'rs_1', 'rs_3'}
+        # the evicted feed is not referred to anymore
+        assert link_refs == [[('rs_3', 1486731500), ('rs_1', 1486731000)]]
+        assert SocialLinkFeedStore.get_many([1])[1].touched > 0
+
+        # written again once the difference of their TTLs has passed only
+        stores = list(SocialLinkFeedStore.get_many([1]).values())
+        with mock.patch('feeds.cache_feeds.cache.get_many', wraps=cache.get_many) as mock_get_many:
+            self.cache_feed.save_link_stores(stores, {})
+        mock_get_many.assert_not_called()
 
-    def test_feeds_key_invalid(self):
+    @mock.patch('feeds.cache_feeds.SocialLink.objects')
+    @mock.patch('feeds.cache_feeds.fetch_feeds_data')
+    @mock.patch('feeds.cache_feeds.cache')
+    def test_refresh_link_feeds(self, mock_cache, mock_fetch_feeds_data, mock_social_links):
         """
-        test case for feeds_key method with invalid data
-        :return:
+        test case for refresh_link_feeds, only the links fetched completely are marked as fresh
         """
-        assert self.cache_feed.feeds_key('6736736736') != \
-            settings.FEED_CACHE_KEY_PREFIX + "_{}_{}".format(self.expert_id, self.timestamp)
+        social_links = [MagicMock(spec=SocialLink, id=1, feed_type=4), MagicMock(spec=SocialLink, id=2, feed_type=4)]
+        mock_cache.get_many.return_value = {}
+        mock_fetch_feeds_data.return_value = FeedsFetchResult(OrderedDict([(1, [])]), [2])
+        self.cache_feed.refresh_link_feeds(social_links)
+        mock_social_links.filter.assert_called_once_with(id__in=[1])
+
+
+class TestInstagramFeeds(TestCase):
+    """
+    Test case for the Instagram feeds, whose created_time is a string, fetched with an int timestamp
+    """
+    def setUp(self):
+        cache.clear()
+        expert = Expert.objects.create(userbase=UserBase.objects.create(email='expert@example.com'))
+        self.expert_id = expert.id
+        account = SocialAccount.objects.create(
+            expert=expert, provider=FeedProviders.INSTAGRAM.value, access_token='token', user_id='4468395084'
+        )
+        self.social_link = SocialLink.objects.create(
+            account=account, feed_type=FeedProviders.INSTAGRAM.value, detail='4468395084', display_name='Atlogys'
+        )
+        self.timestamp = 1487339528
+
+    def test_parse_feed_data(self):
+        feeds = get_provider('INSTAGRAM').parse_feed_data(
+            'token', test_data.INSTAGRAM_USER_FEEDS_DATA, settings.SOCIAL_KEY_MAPPING.get('INSTAGRAM'),
+            self.social_link, self.timestamp
+        )
+        assert len(feeds) == len(test_data.INSTAGRAM_USER_FEEDS_DATA['data'])
+        assert not get_provider('INSTAGRAM').parse_feed_data(
+            'token', test_data.INSTAGRAM_USER_FEEDS_DATA, settings.SOCIAL_KEY_MAPPING.get('INSTAGRAM'),
+            self.social_link, 1484000000
+        )
+
+    @mock.patch('feeds.providers.InstaGramProvider.get_feeds_response_data')
+    def test_build_link_refs(self, mock_get_feeds_response_data):
+        mock_get_feeds_response_data.return_value = test_data.INSTAGRAM_USER_FEEDS_DATA
+        result, _, link_refs = CacheFeedData(self.expert_id).build_link_refs([self.social_link], self.timestamp)
+        assert not result.partial_link_ids
+        assert len(link_refs[0]) == len(test_data.INSTAGRAM_USER_FEEDS_DATA['data'])
+
+    @mock.patch('feeds.providers.InstaGramProvider.get_feeds_response_data')
+    def test_prefetch_expert_feeds(self, mock_get_feeds_response_data):
+        mock_get_feeds_response_data.return_value = test_data.INSTAGRAM_USER_FEEDS_DATA
+        prefetch_expert_feeds(self.expert_id)
+        self.social_link.refresh_from_db()
+        assert self.social_link.feeds_fetched_timestamp is not None
+        assert SocialLinkFeedStore.get_many([self.social_link.id])[self.social_link.id].refs
+
+
+class TestSocialLinkFeedStore:
+    """
+    Test cases for the feeds cached per social link
+    """
+    def make_feeds(self, *timestamps):
+        return [
+            {'id': 'fb_{}'.format(timestamp), 'timestamp': timezone.datetime.fromtimestamp(timestamp, timezone.utc)}
+            for timestamp in timestamps
+        ]
+
+    def test_slice(self):
+        store = SocialLinkFeedStore(1, until=1000, refs=[('fb_900', 900), ('fb_800', 800), ('fb_700', 700)])
+        assert store.slice(850) == ['fb_800', 'fb_700']
+        assert store.covers(850)
+        assert not store.covers(1000 + 60 * 60, max_age=60)
+
+    def test_incremental_update(self):
+        store = SocialLinkFeedStore(1, until=1000, refs=[('fb_900', 900), ('fb_800', 800)])
+        store.update(self.make_feeds(1500, 1200), 2000, page_size=25, since=store.since)
+        assert [feed_id for feed_id, _ in store.refs] == ['fb_1500', 'fb_1200', 'fb_900', 'fb_800']
+        assert store.until == 2000
+        assert store.floor == 0
+
+    def test_incremental_update_with_full_page(self):
+        store = SocialLinkFeedStore(1, until=1000, refs=[('fb_900', 900), ('fb_800', 800)])
+        store.update(self.make_feeds(1500, 1200), 2000, page_size=2, since=store.since)
+        # the feeds between 900 and 1200 may be missing, so the older feeds are dropped
+        assert [feed_id for feed_id, _ in store.refs] == ['fb_1500', 'fb_1200']
+        assert store.floor == 1200
+
+    def test_updated_rss_entry_is_stored_once(self):
+        provider = get_provider('RSS')
+        social_link = MagicMock(spec=SocialLink, id=1, feed_type=FeedProviders.RSS.value, account=MagicMock())
+        feeds = is_valid_rss_feed_data(test_data.VALID_RSS_FEED_DATA)
+        timestamp = int(timezone.now().timestamp())
+        store = SocialLinkFeedStore(1)
+        store.update(provider.parse_feed_data('', feeds, 'rs_', social_link, timestamp), timestamp,
+                     provider.feeds_page_size)
+
+        # the oldest entry is edited
+        entry = feeds['items'][-1]
+        entry['updated_parsed'] = time.gmtime(timestamp + 10)
+        since = store.since
+        store.update(provider.parse_feed_data('', {'items': [entry]}, 'rs_', social_link, timestamp + 60),
+                     timestamp + 60, provider.feeds_page_size, since)
+        feed_ids = [feed_id for feed_id, _ in store.refs]
+        assert len(feed_ids) == len(set(feed_ids)) == len(feeds['items'])
+        assert store.since == timestamp + 10
+
+    def test_encode_feed(self):
+        feed = self.make_feeds(1500)[0]
+        feed['content'] = {'message': 'Some test'}
+        assert decode_feed(encode_feed(feed)) == feed
+
+    def test_merge_feed_refs(self):
+        link_refs = [
+            [('fb_900', 900), ('fb_500', 500)],
+            [('yt_1000', 1000), ('yt_700', 700), ('yt_100', 100)],
+            [],
+        ]
+        assert list(merge_feed_refs(link_refs)) == ['yt_1000', 'fb_900', 'yt_700', 'fb_500', 'yt_100']
+
+
+class TestPaginateContentResults:
+    """
+    Test cases for the pagination of the lazily read feeds
+    """
+    def make_request(self, **query_params):
+        request = MagicMock(query_params=query_params, parser_context={'kwargs': {'timestamp': '1486731859'}},
+                            META={'HTTP_HOST': 'testserver'}, path='/feeds/1486731859/')
+        request._request.is_secure.return_value = False
+        return request
+
+    def test_stops_after_the_page(self):
+        consumed = []
+
+        def feed_ids():
+            for count in range(100):
+                consumed.append(count)
+                yield 'fb_{}'.format(count)
+
+        data = paginate_content_results(self.make_request(offset='10', limit='5'), feed_ids(),
+                                        load_page=lambda ids: [{'id': feed_id} for feed_id in ids], max_count=120)
+        assert data['results'] == [{'id': 'fb_{}'.format(count)} for count in range(10, 15)]
+        # the next item tells that there is a next page
+        assert len(consumed) == 16
+        assert data['metadata']['count'] == 120
+        assert data['metadata']['is_count_approximate']
+        assert data['metadata']['next'] == 'http://testserver/feeds/1486731859/?offset=15&limit=5'
+        assert data['metadata']['previous'] == 'http://testserver/feeds/1486731859/?offset=5&limit=5'
+
+    def test_missing_items_are_replaced(self):
+        # the feeds which are not cached anymore are left out by the loading
+        data = paginate_content_results(self.make_request(offset='0', limit='5'), iter(range(20)),
+                                        load_page=lambda items: [item for item in items if item % 3])
+        assert data['results'] == [1, 2, 4, 5, 7]
+        assert data['metadata']['next'] == 'http://testserver/feeds/1486731859/?offset=8&limit=5'
+
+    def test_last_page(self):
+        data = paginate_content_results(self.make_request(offset='5', limit='5'), iter(range(8)))
+        assert data['results'] == [5, 6, 7]
+        assert data['metadata']['next'] is None
+
+        data = paginate_content_results(self.make_request(offset='5', limit='5'), list(range(10)))
+        assert data['metadata']['count'] == 10
+        assert not data['metadata']['is_count_approximate']
+        assert data['metadata']['next'] is None
 
 
 class TestParseFeedData(TestCase):
@@ -374,6 +593,43 @@ class TestParseFeedData(TestCase):
             self.assertEqual(feed['social_link_id'], self.social_links_rss_feed.id)
             self.assertNotEqual(feed.keys(), self.expected_unified_keys_invalid.keys())
 
+    def test_parse_feed_data_projects_the_content(self):
+        """
+        Test case for parse_feed_data keeping only the declared fields of the provider feeds
+        """
+        provider = get_provider('RSS')
+        result = provider.parse_feed_data(
+            self.access_token,
+            self.rss_feed_data, settings.SOCIAL_KEY_MAPPING.get('RSS'),
+            self.social_links_rss_feed, timezone.now().timestamp()
+        )
+        assert result
+        for feed in result:
+            assert set(feed['content']) <= set(provider.content_fields)
+            assert 'title_detail' not in feed['content']
+            assert feed['content']['summary_detail']['type'] == 'text/html'
+            assert all(set(tag) == {'term'} for tag in feed['content'].get('tags', []))
+
+        result = provider.parse_feed_data(
+            self.access_token,
+            is_valid_rss_feed_data(test_data.VALID_RSS_FEED_DATA), settings.SOCIAL_KEY_MAPPING.get('RSS'),
+            self.social_links_rss_feed, timezone.now().timestamp()
+        )
+        # the whole article is kept
+        assert result[0]['content']['content'][0]['value']
+        assert 'updated_parsed' not in result[0]['content']
+
+        provider = get_provider(settings.YOUTUBE_FEED_PROVIDER[0])
+        result = provider.parse_feed_data(
+            self.access_token,
+            self.youtube_channel_data, settings.SOCIAL_KEY_MAPPING.get(settings.YOUTUBE_FEED_PROVIDER[0]),
+            self.social_links_youtube, self.timestamp
+        )
+        assert result
+        for feed in result:
+            assert set(feed['content']) == {'id', 'snippet'}
+            assert set(feed['content']['id']) == {'videoId'}
+
     def test_sort_feeds_data_valid(self):
         """
         Test case for sort_feeds_data
@@ -402,6 +658,151 @@ class TestParseFeedData(TestCase):
         self.assertNotEqual(result, expected_result)
 
 
+class TestFetchFeedsData(TestCase):
+    """
+    Test case for fetching the feeds of the social links concurrently
+    """
+    def setUp(self):
+        self.timestamp = '1487339528'
+        self.social_links = [MagicMock(spec=SocialLink, id=link_id, feed_type=4) for link_id in (1, 2, 3)]
+        self.release = threading.Event()
+
+    def tearDown(self):
+        self.release.set()
+
+    def fetch_social_link_feeds(self, social_link, timestamp, since=None):
+        if social_link.id == 2:
+            # stuck provider
+            self.release.wait(5)
+        return [{'id': 'rs_{}'.format(social_link.id), 'timestamp': timestamp}]
+
+    @mock.patch('feeds.providers.connection')
+    @mock.patch('feeds.providers.FEEDS_FETCH_DEADLINE', 0.2)
+    @mock.patch('feeds.providers.fetch_social_link_feeds')
+    def test_fetch_feeds_data_returns_partial_result(self, mock_fetch_social_link_feeds, mock_connection):
+        """
+        Links which don't finish before the deadline are left out and marked as partial
+        """
+        mock_fetch_social_link_feeds.side_effect = self.fetch_social_link_feeds
+        result = fetch_feeds_data(self.social_links, self.timestamp)
+        self.assertEqual([feed['id'] for feed in result.feeds], ['rs_1', 'rs_3'])
+        self.assertEqual(result.partial_link_ids, [2])
+
+    @mock.patch('feeds.providers.connection')
+    @mock.patch('feeds.providers.fetch_social_link_feeds')
+    def test_fetch_feeds_data_complete(self, mock_fetch_social_link_feeds, mock_connection):
+        """
+        All the links are fetched when they finish in time
+        """
+        self.release.set()
+        mock_fetch_social_link_feeds.side_effect = self.fetch_social_link_feeds
+        result = fetch_feeds_data(self.social_links, self.timestamp)
+        self.assertEqual([feed['id'] for feed in result.feeds], ['rs_1', 'rs_2', 'rs_3'])
+        self.assertEqual(result.partial_link_ids, [])
+
+
+class TestYoutubeStatistics(TestCase):
+    """
+    Test case for adding the statistics to the youtube feeds in batches
+    """
+    def setUp(self):
+        cache.clear()
+        self.provider = get_provider('YOUTUBE')
+
+    def make_feeds(self, count):
+        return [{'content': {'id': {'videoId': 'v{}'.format(number)}}} for number in range(count)]
+
+    def videos_response(self, url, **kwargs):
+        video_ids = url.split('&id=')[1].split('&')[0].split(',')
+        items = [{'id': video_id, 'statistics': {'likeCount': video_id[1:]}} for video_id in video_ids
+                 if video_id != 'v0']
+        return MagicMock(status_code=200, content=json.dumps({'items': items}).encode('utf-8'))
+
+    @override_settings(GOOGLE_APP_API_KEY='key')
+    @mock.patch('feeds.providers.http_client.get')
+    def test_add_statistics(self, mock_get):
+        mock_get.side_effect = self.videos_response
+        feeds = self.provider.add_statistics(self.make_feeds(120))
+        assert [len(call[0][0].split('&id=')[1].split('&')[0].split(',')) for call in mock_get.call_args_list] == [
+            50, 50, 20
+        ]
+        assert feeds[1]['content']['statistics'] == {'likeCount': '1'}
+        # not returned by the API
+        assert feeds[0]['content']['statistics'] is None
+
+        mock_get.reset_mock()
+        feeds = self.provider.add_statistics(self.make_feeds(121))
+        assert len(mock_get.call_args_list) == 1
+        assert feeds[120]['content']['statistics'] == {'likeCount': '120'}
+
+
+class TestRssConditionalFetch(TestCase):
+    """
+    Test case for fetching the rss feeds with conditional requests
+    """
+    def setUp(self):
+        self.provider = get_provider('RSS')
+        self.social_link = MagicMock(spec=SocialLink, id=1, feeds_etag='', feeds_last_modified='')
+
+    @mock.patch('feeds.providers.SocialLink.objects')
+    @mock.patch('feeds.validators.http_client.get')
+    def test_not_modified_feed_is_not_parsed(self, mock_get, mock_social_links):
+        mock_get.return_value = MagicMock(status_code=200, content=test_data.VALID_RSS_FEED_DATA,
+                                          headers={'ETag': '"v1"', 'Last-Modified': 'Wed, 01 Mar 2017 10:00:00 GMT'})
+        feeds = self.provider.get_feeds_response_data('https://example.com/rss', self.social_link, '1487339528')
+        assert feeds['items']
+        mock_get.assert_called_once_with('https://example.com/rss', headers={})
+        mock_social_links.filter.return_value.update.assert_called_once_with(
+            feeds_etag='"v1"', feeds_last_modified='Wed, 01 Mar 2017 10:00:00 GMT'
+        )
+
+        mock_get.return_value = MagicMock(status_code=304, content=b'', headers={})
+        feeds = self.provider.get_feeds_response_data('https://example.com/rss', self.social_link, '1487339528',
+                                                      since=1487339000)
+        assert feeds == {'items': []}
+        mock_get.assert_called_with('https://example.com/rss', headers={
+            'If-None-Match': '"v1"', 'If-Modified-Since': 'Wed, 01 Mar 2017 10:00:00 GMT'
+        })
+
+    @mock.patch('feeds.providers.SocialLink.objects')
+    @mock.patch('feeds.validators.http_client.get')
+    def test_feed_newer_than_the_timestamp_is_fetched_again(self, mock_get, mock_social_links):
+        self.social_link.feeds_etag = '"v1"'
+        mock_get.return_value = MagicMock(status_code=200, content=test_data.VALID_RSS_FEED_DATA,
+                                          headers={'ETag': '"v2"'})
+        # older than the newest entries of the feed, which are not stored
+        self.provider.get_feeds_response_data('https://example.com/rss', self.social_link, '1420070400',
+                                              since=1400000000)
+        mock_social_links.filter.return_value.update.assert_called_once_with(feeds_etag='', feeds_last_modified='')
+
+        timestamp = str(int(timezone.now().timestamp()))
+        self.provider.get_feeds_response_data('https://example.com/rss', self.social_link, timestamp,
+                                              since=1400000000)
+        mock_get.assert_called_with('https://example.com/rss', headers={})
+        mock_social_links.filter.return_value.update.assert_called_with(feeds_etag='"v2"', feeds_last_modified='')
+
+
+class TestHttpClient(TestCase):
+    """
+    Test case for the HTTP client shared by the providers
+    """
+    def test_session_is_shared(self):
+        assert http_client.get_session() is http_client.get_session()
+
+    def test_session_retries_only_idempotent_requests(self):
+        retry = http_client.get_session().get_adapter('https://graph.facebook.com/').max_retries
+        assert retry.total == settings.FEEDS_HTTP_MAX_RETRIES
+        assert 'POST' not in retry.method_whitelist
+
+    @mock.patch('feeds.http_client.get_session')
+    def test_request_default_timeout(self, mock_get_session):
+        http_client.get('https://www.googleapis.com/youtube/v3/videos/')
+        mock_get_session.return_value.request.assert_called_once_with(
+            'GET', 'https://www.googleapis.com/youtube/v3/videos/',
+            timeout=(settings.FEEDS_HTTP_CONNECT_TIMEOUT, settings.FEEDS_HTTP_READ_TIMEOUT)
+        )
+
+
 class TestCeleryTaskGetstream(TestCase):
     """
     Test case for Celery Task for adding and removing feeds from Getstream .
@@ -413,9 +814,9 @@ class TestCeleryTaskGetstream(TestCase):
         self.existing_tags_ids = [2, 4, 6, 8]
         self.content = MagicMock(spec=Content, id=1)
 
+    @mock.patch.object(StreamHelper, 'remove_content_tags_feeds')
     @mock.patch.object(StreamHelper, 'expert_publish_content')
-    @mock.patch.object(StreamHelper, 'remove_content_tag_feeds')
-    def test_getstream(self, mock_expert_publish_content, mock_remove_content_tag_feeds):
+    def test_getstream(self, mock_expert_publish_content, mock_remove_content_tags_feeds):
         mock_expert_publish_content.return_value = {
             'actor': '1',
             'id': '03955b90-fa5c-11e6-8080-80001ece3378',
@@ -431,11 +832,14 @@ class TestCeleryTaskGetstream(TestCase):
             'target': None,
             'verb': 'post'
         }
-        mock_remove_content_tag_feeds.return_value = None
+        mock_remove_content_tags_feeds.return_value = None
         result = modify_tags_on_getstream(user_id=self.user.id, new_tag_ids=self.new_tag_ids,
                                           existing_tags_ids=self.existing_tags_ids,
                                           content_id=self.content.id)
         assert result is None
+        # all the removed tags at once
+        mock_remove_content_tags_feeds.assert_called_once_with(self.content.id, mock.ANY)
+        assert sorted(mock_remove_content_tags_feeds.call_args[0][1]) == [6, 8]
 
 
 class TestPushSuperAdminFeeds(TestCase):
@@ -503,3 +907,168 @@ class TestStreamFeedsUtils(TestCase):
         assert result is None
         assert self.content.tags == self.tag_ids
         mock_delay.assert_called_once_with(self.content.owner_id, self.tag_ids, self.existing_tags_ids, self.content.id)
+
+
+class TestFilterContents(TestCase):
+    """
+    Test case for leaving the ignored and published contents out of the social feeds
+    """
+    def setUp(self):
+        cache.clear()
+        self.expert = Expert.objects.create(userbase=UserBase.objects.create(email='expert@example.com'))
+        IgnoredContent.objects.create(expert=self.expert, content_id='fb_1')
+        self.content = Content.objects.create(content_id='fb_2', content={}, owner=self.expert.userbase)
+        self.feed_ids = ['fb_1', 'fb_2', 'fb_3', 'fb_4']
+
+    def test_filter_contents_is_served_from_the_index(self):
+        assert filter_contents(self.expert, [{'id': feed_id} for feed_id in self.feed_ids]) == [
+            {'id': 'fb_3'}, {'id': 'fb_4'}
+        ]
+        with self.assertNumQueries(0):
+            assert list(iter_filter_content_ids(self.expert, iter(self.feed_ids))) == ['fb_3', 'fb_4']
+
+    def test_writes_update_the_index(self):
+        list(iter_filter_content_ids(self.expert, self.feed_ids))
+        IgnoredContent.objects.create(expert=self.expert, content_id='fb_3')
+        self.content.is_deleted = True
+        self.content.save()
+        assert list(iter_filter_content_ids(self.expert, self.feed_ids)) == ['fb_2', 'fb_4']
+
+
+class TestContentSerializerQueries(TestCase):
+    """
+    Test case for serializing a page of contents
+    """
+    def setUp(self):
+        domain = Domain.objects.create(name='Health')
+        parent_tag = Tag.objects.create(domain=domain, name='Fitness')
+        child_tag = Tag.objects.create(domain=domain, name='Yoga', parent=parent_tag, tag_type=TagTypes.CHILD.value)
+        expert = Expert.objects.create(userbase=UserBase.objects.create(email='expert@example.com'))
+        self.user = User.objects.create(userbase=UserBase.objects.create(email='user@example.com'))
+
+        self.contents = []
+        for count in range(5):
+            content = Content.objects.create(content_id='{}_{}'.format(count, expert.id), content={},
+                                             owner=expert.userbase)
+            content.tags.add(parent_tag, child_tag)
+            self.contents.append(content)
+        ContentUserActivity.objects.create(content=self.contents[0], user=self.user,
+                                           activity_type=ContentUserActivity.LIKE)
+        ContentUserActivity.objects.create(content=self.contents[1], user=self.user,
+                                           activity_type=ContentUserActivity.FAVORITE)
+
+        self.request = RequestFactory().get('/')
+        self.request.user = self.user.userbase
+
+    def test_queries_do_not_grow_with_contents(self):
+        # contents with their owners, tags and the activities of the user
+        with self.assertNumQueries(3):
+            contents = read_content_feeds_getstream([content.id for content in self.contents])
+            data = ContentSerializer(contents, many=True, context={'request': self.request}).data
+
+        flags = {row['id']: (row['liked_by_current_user'], row['saved_by_current_user']) for row in data}
+        assert flags[self.contents[0].id] == (True, False)
+        assert flags[self.contents[1].id] == (False, True)
+        assert flags[self.contents[2].id] == (False, False)
+        tags = {tag['name']: tag for tag in data[0]['tags']}
+        assert tags['Yoga']['parent']['name'] == 'Fitness'
+
+    def test_single_content_flags(self):
+        data = ContentSerializer(self.contents[0], context={'request': self.request}).data
+        assert data['liked_by_current_user'] is True
+        assert data['saved_by_current_user'] is False
+
+
+class TestAccessTokenRefresh(TestCase):
+    """
+    Test case for renewing the access tokens in the background, once per account
+    """
+    def setUp(self):
+        cache.clear()
+        expert = Expert.objects.create(userbase=UserBase.objects.create(email='expert@example.com'))
+        self.account = SocialAccount.objects.create(
+            expert=expert, provider=FeedProviders.YOUTUBE.value, access_token='old', refresh_token='refresh',
+            access_token_expiry_timestamp=timezone.now() + timedelta(minutes=5)
+        )
+        self.social_link = MagicMock(spec=SocialLink, account=self.account)
+        self.provider = get_provider('YOUTUBE')
+
+    @mock.patch('feeds.tasks.refresh_access_token.delay')
+    def test_expiring_token_is_renewed_once(self, mock_delay):
+        # the fetches keep the valid token and queue a single renewal
+        assert self.provider.get_valid_access_token(self.social_link) == 'old'
+        assert self.provider.get_valid_access_token(self.social_link) == 'old'
+        mock_delay.assert_called_once_with(self.account.id)
+
+        self.account.access_token_expiry_timestamp = timezone.now() - timedelta(minutes=1)
+        assert self.provider.get_valid_access_token(self.social_link) is None
+        assert mock_delay.call_count == 1
+
+    @override_settings(GOOGLE_APP_CLIENT_ID='id', GOOGLE_SECRET_KEY='secret')
+    @mock.patch('feeds.tasks.refresh_access_token.delay')
+    @mock.patch('feeds.providers.http_client.post')
+    def test_renew_access_token(self, mock_post, mock_delay):
+        mock_post.return_value = MagicMock(status_code=200, content=b'{"access_token": "new", "expires_in": 3600}')
+        schedule_access_token_refresh(self.account.id)
+        assert renew_access_token(self.account.id)
+        self.account.refresh_from_db()
+        assert self.account.access_token == 'new'
+        assert self.account.access_token_expiry_timestamp > timezone.now() + timedelta(minutes=55)
+
+        # the lock is released and a renewed token is not renewed again
+        assert schedule_access_token_refresh(self.account.id)
+        assert not renew_access_token(self.account.id)
+        mock_post.assert_called_once()
+
+
+class TestContentLikes(TestCase):
+    """
+    Test case for the likes buffered in the cache and saved in batches
+    """
+    def setUp(self):
+        cache.clear()
+        expert = Expert.objects.create(userbase=UserBase.objects.create(email='expert@example.com'))
+        self.content = Content.objects.create(content_id='fb_1', content={}, owner=expert.userbase)
+
+    @mock.patch('feeds.tasks.flush_content_likes.apply_async')
+    def test_likes_are_saved_in_one_update(self, mock_apply_async):
+        for user_activity in ('like', 'like', 'like', 'dislike'):
+            like_or_unlike_content(self.content.id, user_activity)
+        # a single flush is queued for the likes of the batch
+        mock_apply_async.assert_called_once_with((self.content.id,), countdown=settings.FEEDS_LIKES_FLUSH_DELAY)
+        assert Content.objects.get(id=self.content.id).likes == 2
+
+        assert save_buffered_likes(self.content.id) == 2
+        assert get_buffered_likes(self.content.id) == 0
+        content = Content.objects.get(id=self.content.id)
+        assert content.stats.likes == 2
+        assert content.likes == 2
+
+        like_or_unlike_content(self.content.id, 'like')
+        assert mock_apply_async.call_count == 2
+        with self.assertNumQueries(1):
+            assert save_buffered_likes(self.content.id) == 1
+        assert ContentStats.objects.get(content=self.content).likes == 3
+
+    @mock.patch('feeds.tasks.flush_content_likes.apply_async')
+    def test_failed_save_keeps_the_likes(self, mock_apply_async):
+        like_or_unlike_content(self.content.id, 'like')
+        with mock.patch('feeds.counters.ContentStats.objects.filter', side_effect=ValueError):
+            with pytest.raises(ValueError):
+                save_buffered_likes(self.content.id)
+        # left to the next flush
+        assert get_buffered_likes(self.content.id) == 1
+        assert save_buffered_likes(self.content.id) == 1
+        assert get_buffered_likes(self.content.id) == 0
+
+    @mock.patch('feeds.tasks.flush_content_likes.apply_async')
+    def test_list_loads_the_buffered_likes_at_once(self, mock_apply_async):
+        other_content = Content.objects.create(content_id='fb_2', content={}, owner=self.content.owner)
+        like_or_unlike_content(self.content.id, 'like')
+        request = RequestFactory().get('/')
+        request.user = self.content.owner
+
+        with mock.patch('feeds.counters.get_buffered_likes', side_effect=AssertionError):
+            data = ContentSerializer(Content.objects.order_by('id'), many=True, context={'request': request}).data
+        assert [content['likes'] for content in data] == [1, 0]
+        assert data[1]['id'] == other_content.id
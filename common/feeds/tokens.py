@@ -0,0 +1,100 @@
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from feeds.models import SocialAccount
+
+logger = logging.getLogger(__name__)
+
+# tokens expiring within this many seconds are renewed in the background
+FEEDS_TOKEN_REFRESH_MARGIN = getattr(settings, 'FEEDS_TOKEN_REFRESH_MARGIN', 10 * 60)
+# covers the wait in the queue and the OAuth call, a stuck renewal can be queued again once it expires
+FEEDS_TOKEN_REFRESH_LOCK_TIMEOUT = getattr(settings, 'FEEDS_TOKEN_REFRESH_LOCK_TIMEOUT', 5 * 60)
+
+
+def refresh_lock_key(account_id):
+    return settings.FEED_CACHE_KEY_PREFIX + "_TOKEN_REFRESH_{}".format(account_id)
+
+
+def is_access_token_expiring(account, margin=FEEDS_TOKEN_REFRESH_MARGIN):
+    """
+    Check if the access_token of the account has to be renewed, only the accounts with a refresh_token can be
+    Args:
+        account (obj): SocialAccount
+        margin (int): seconds before the expiry from which the token is renewed
+    return:
+        Boolean True or False
+    """
+    if not account.refresh_token:
+        return False
+    expiry_timestamp = account.access_token_expiry_timestamp
+    return expiry_timestamp is None or expiry_timestamp <= timezone.now() + timezone.timedelta(seconds=margin)
+
+
+def get_access_token(account):
+    """
+    Get the access_token of the account without waiting for its renewal. A token expiring soon is still returned and
+    its renewal is queued, an expired one is not returned since the providers drop the links of an invalid token.
+    Args:
+        account (obj): SocialAccount
+    return:
+        access_token, None if it expired
+    """
+    if not is_access_token_expiring(account):
+        return account.access_token
+    schedule_access_token_refresh(account.id)
+    if is_access_token_expiring(account, margin=0):
+        return None
+    return account.access_token
+
+
+def schedule_access_token_refresh(account_id):
+    """
+    Queue the renewal of the access_token of the account, unless one is queued or running already. The lock is
+    released by the renewal, so concurrent fetches and the periodic task renew a token only once.
+    Args:
+        account_id (id): SocialAccount id
+    return:
+        Boolean True if the renewal was queued
+    """
+    # imported here since the tasks import this module
+    from feeds.tasks import refresh_access_token
+
+    if not cache.add(refresh_lock_key(account_id), True, FEEDS_TOKEN_REFRESH_LOCK_TIMEOUT):
+        return False
+    try:
+        refresh_access_token.delay(account_id)
+    except Exception:
+        cache.delete(refresh_lock_key(account_id))
+        raise
+    return True
+
+
+def renew_access_token(account_id):
+    """
+    Renew the access_token of the account if it still has to be, then release the lock taken when it was queued
+    Args:
+        account_id (id): SocialAccount id
+    return:
+        Boolean True if the access_token was renewed
+    """
+    # imported here since the providers import this module
+    from feeds.providers import ProviderError, get_account_provider
+
+    try:
+        account = SocialAccount.objects.filter(id=account_id).first()
+        # renewed by an earlier task, or deleted meanwhile
+        if account is None or not is_access_token_expiring(account):
+            return False
+        provider_object = get_account_provider(account)[1]
+        try:
+            renewed = provider_object.refresh_access_token(account)
+        except ProviderError:
+            renewed = False
+        if not renewed:
+            logger.warning('Access token of the social account %s could not be renewed', account_id)
+        return renewed
+    finally:
+        cache.delete(refresh_lock_key(account_id))
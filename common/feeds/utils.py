@@ -1,34 +1,17 @@
-from django.utils import timezone
+from django.conf import settings
+from django.core.cache import cache
 
 from experchat.enumerations import TagTypes
 from experchat.models.domains import Tag
+from experchat.versioned_cache import CacheVersion
 from feeds.models import Content, IgnoredContent
 from feeds.tasks import modify_tags_on_getstream
+from streamfeeds.outbox import enqueue_stream_operation
 from streamfeeds.utils import StreamHelper
 
-
-def validate_access_token(db_time, expire_time):
-    """
-    this method is used to validate the access_token, based on the current time and actual expiration time of
-    the access_token
-    Args:
-        db_time (obj): Saved time
-        expire_time (time): seconds
-    Return:
-        Boolean True or False
-    """
-    try:
-        # this is cheked to compare the two times, if one is not having
-        # timezone, then we can't compare
-        db_time.tzinfo
-    except AttributeError:
-        return False
-    current_time = timezone.now()
-    time_difference = current_time - db_time
-    difference_in_second = time_difference.total_seconds()
-    if difference_in_second < 0 or round(difference_in_second) < expire_time:
-        return True
-    return False
+FEEDS_FILTER_INDEX_TTL = getattr(settings, 'FEEDS_FILTER_INDEX_TTL', 60 * 60 * 24)
+# longer than FEEDS_FILTER_INDEX_TTL, so the index cached under a version expires first
+FEEDS_FILTER_INDEX_VERSION_TTL = getattr(settings, 'FEEDS_FILTER_INDEX_VERSION_TTL', 60 * 60 * 24 * 7)
 
 
 class PushFeeds(object):
@@ -51,10 +34,8 @@ class PushFeeds(object):
         tag_ids = list(get_tag_ids_with_parent(tags))
 
         expert_user_id = self.social_link.account.expert.userbase.id
-        stream_feed_helper = StreamHelper()
-        stream_feed_helper.expert_publish_content(
-            expert_user_id, content.id, expert_profile_ids=None, tag_ids=tag_ids
-        )
+        # sent to Getstream once the content is committed
+        enqueue_stream_operation('expert_publish_content', expert_user_id, content.id, None, tag_ids)
 
     def tag_objs(self):
         """
@@ -143,35 +124,78 @@ def update_content_tags_at_getsream(content_id, tag_ids):
     content_obj.save()
 
 
-def filter_contents(expert, content_list):
+class FilteredContentIndex(object):
     """
-    Remove ignored and published contents from content_list.
+    Cached set of the ids of the contents ignored or published by an expert, which are left out of the social feeds
+    of the expert.
 
-    Args:
-        content_list: List of contents to filter.
+    Every write of an IgnoredContent or a Content of the expert bumps the version of the index, so an index built
+    before the write is never read again and simply expires.
     """
-    content_ids = [content['id'] for content in content_list]
+    def __init__(self, expert_id):
+        self.expert_id = expert_id
 
-    ignored_content_ids = list(
-        IgnoredContent.objects.filter(
-            expert=expert,
-            content_id__in=content_ids
+    def version(self):
+        version_key = settings.FEED_CACHE_KEY_PREFIX + "_FILTERED_VERSION_{}".format(self.expert_id)
+        return CacheVersion(version_key, FEEDS_FILTER_INDEX_VERSION_TTL)
+
+    def data_key(self, version):
+        return settings.FEED_CACHE_KEY_PREFIX + "_FILTERED_{}_{}".format(self.expert_id, version)
+
+    def get_content_ids(self):
+        """
+        Get the ids of the contents ignored or published by the expert, they are loaded from the database only
+        when the index is not cached
+        Return:
+            frozenset of content ids
+        """
+        data_key = self.data_key(self.version().get())
+        content_ids = cache.get(data_key)
+        if content_ids is None:
+            content_ids = self.build()
+            cache.set(data_key, content_ids, FEEDS_FILTER_INDEX_TTL)
+        return content_ids
+
+    def build(self):
+        ignored_content_ids = IgnoredContent.objects.filter(
+            expert_id=self.expert_id
         ).values_list('content_id', flat=True)
-    )
 
-    published_content_ids = list(
-        Content.objects.filter(
-            owner=expert.userbase,
-            content_id__in=content_ids,
+        published_content_ids = Content.objects.filter(
+            owner_id=self.expert_id,
             is_deleted=False,
         ).values_list('content_id', flat=True)
-    )
 
-    content_ids_to_filter = ignored_content_ids + published_content_ids
+        return frozenset(ignored_content_ids) | frozenset(published_content_ids)
+
+    def invalidate(self):
+        self.version().invalidate()
+
+
+def filter_contents(expert, content_list):
+    """
+    Remove ignored and published contents from content_list.
+
+    Args:
+        content_list: List of contents to filter.
+    """
+    content_ids_to_filter = FilteredContentIndex(expert.pk).get_content_ids()
 
     return [content for content in content_list if content['id'] not in content_ids_to_filter]
 
 
+def iter_filter_content_ids(expert, content_ids):
+    """
+    Remove ignored and published contents from content_ids lazily.
+
+    Args:
+        content_ids: Iterator of the content ids to filter.
+    """
+    content_ids_to_filter = FilteredContentIndex(expert.pk).get_content_ids()
+
+    return (content_id for content_id in content_ids if content_id not in content_ids_to_filter)
+
+
 def get_tag_ids_with_parent(tags):
     tag_ids = []
     for tag in tags:
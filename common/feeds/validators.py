@@ -1,9 +1,9 @@
 import feedparser
-import requests
 from requests.exceptions import ConnectionError, HTTPError, Timeout
 from rest_framework import status
 from rest_framework.exceptions import ValidationError
 
+from feeds import http_client
 from feeds.utils import validate_feed_list_data
 
 
@@ -23,21 +23,34 @@ def is_valid_rss_feed_data(data):
     return parse_data
 
 
-def is_valid_feed_url(url):
+def get_feed_url_response(url, headers=None):
     """
-    This will validate the provided url is a valid rss feed url or not
+    Download the rss feed, a conditional request may return a 304 without the feed
     Args:
         url (str): url like https://staff.tumblr.com/rss
+        headers (dict): request headers, like If-None-Match
     Return:
-        parse_data (dict): All rss feed data dict
+        response (obj): requests Response with the status 200 or 304
     Raise:
-        ValidationError if url is not a valid rss feed url
+        ValidationError if the url could not be downloaded
     """
     try:
-        response = requests.get(url, timeout=10)
+        response = http_client.get(url, headers=headers)
     except (ConnectionError, HTTPError, Timeout):
         raise ValidationError('ERROR_RSS_FEED_INVALID')
-    if response.status_code != status.HTTP_200_OK:
+    if response.status_code not in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
         raise ValidationError('ERROR_RSS_FEED_INVALID')
+    return response
 
-    return is_valid_rss_feed_data(response.content)
+
+def is_valid_feed_url(url):
+    """
+    This will validate the provided url is a valid rss feed url or not
+    Args:
+        url (str): url like https://staff.tumblr.com/rss
+    Return:
+        parse_data (dict): All rss feed data dict
+    Raise:
+        ValidationError if url is not a valid rss feed url
+    """
+    return is_valid_rss_feed_data(get_feed_url_response(url).content)
@@ -1,6 +1,7 @@
 import logging
 
 from django.conf import settings
+from django.db import transaction
 from django.http import Http404
 from django.utils import dateparse, timezone
 from django_filters.rest_framework import DjangoFilterBackend
@@ -12,7 +13,7 @@ from rest_framework.views import APIView
 from experchat.permissions import IsExpertPermission, IsSuperUser, IsUserPermission
 from experchat.serializers import EmptySerializer
 from experchat.views import ExperChatAPIView
-from feeds.cache_feeds import CacheFeedData
+from feeds.cache_feeds import CacheFeedData, get_feed_items
 from feeds.choices import FeedProviders
 from feeds.models import Content, ContentUserActivity, IgnoredContent, SocialAccount, SocialLink
 from feeds.pagination import paginate_content_results
@@ -23,8 +24,9 @@ from feeds.serializers import (
     SocialLinkPostSerializer, SocialLinkSerializer, SuperAdminContentSerializer
 )
 from feeds.tasks import like_or_unlike_content
-from feeds.utils import filter_contents
-from streamfeeds.utils import StreamHelper
+from feeds.utils import iter_filter_content_ids
+from streamfeeds.outbox import enqueue_stream_operation
+from streamfeeds.utils import prefetch_content_relations
 
 logger = logging.getLogger(__name__)
 
@@ -99,10 +101,10 @@ class SocialUrlGetTokenView(APIView):
                 'access_token')
             # here need to call the util method where we will formating actual
             # expiry date
-            if access_data.get('expire_in'):
+            if access_data.get('expires_in'):
                 access_token_instance.access_token_expiry_timestamp = \
                     provider_instance.make_access_token_expiry_timestamp(access_data[
-                                                                         'expire_in'])
+                                                                         'expires_in'])
             access_token_instance.name = user_info.get(
                 'name', user_info.get('data', {}).get('username'))
             access_token_instance.user_id = \
@@ -114,11 +116,11 @@ class SocialUrlGetTokenView(APIView):
                 {'access_token': access_data.get('access_token')})
             serializer.validated_data.update(
                 {'refresh_token': access_data.get('refresh_token')})
-            if access_data.get('expire_in'):
+            if access_data.get('expires_in'):
                 serializer.validated_data.update({
                     'access_token_expiry_timestamp':
                         provider_instance.make_access_token_expiry_timestamp(access_data[
-                                                                             'expire_in'])
+                                                                             'expires_in'])
                 })
             serializer.validated_data.update({
                 'name': user_info.get('name', user_info.get('data', {}).get('username'))
@@ -171,7 +173,7 @@ class SocialAuthGetFeed(APIView):
         """
         expert = request.user.expert
         social_links = SocialLink.objects.filter(
-            account__expert=expert, is_deleted=False)
+            account__expert=expert, is_deleted=False).select_related('account__expert')
         # Here validating if timestamp is not valid
         try:
             timezone.datetime.fromtimestamp(float(timestamp), dateparse.utc)
@@ -179,10 +181,12 @@ class SocialAuthGetFeed(APIView):
             raise Http404
 
         cache_feed_ins = CacheFeedData(expert.id)
-        feeds = cache_feed_ins.get_cache_feeds(timestamp, social_links)
+        feed_ids, feeds_count = cache_feed_ins.iter_feed_ids(timestamp, social_links)
         # Remove ignored and published contents from content_list.
-        feeds = filter_contents(expert, feeds)
-        return Response(data=paginate_content_results(request, feeds))
+        feed_ids = iter_filter_content_ids(expert, feed_ids)
+        # only the feeds of the page are read from the cache, the count includes the removed contents
+        return Response(data=paginate_content_results(request, feed_ids, load_page=get_feed_items,
+                                                      max_count=feeds_count))
 
 
 class SocialLinkViewSet(viewsets.ModelViewSet):
@@ -238,7 +242,7 @@ class ContentViewSet(viewsets.ModelViewSet):
     http_method_names = ['get', 'delete', 'post']
 
     def get_queryset(self):
-        queryset = super(ContentViewSet, self).get_queryset()
+        queryset = prefetch_content_relations(super(ContentViewSet, self).get_queryset())
         if hasattr(self.request.user, 'expert'):
             queryset = queryset.filter(owner=self.request.user)
         if self.request.query_params.get('activity-type') == 'like':
@@ -345,8 +349,6 @@ class SuperAdminContentViewSet(viewsets.ModelViewSet):
     @detail_route(methods=['GET'])
     def unhide(self, request, pk=None, **kwargs):
         content = Content.objects.get(id=pk)
-        content.activate()
-
         tags_ids = list(content.tags.all().values_list('id', flat=True))
 
         if content.social_link:
@@ -355,11 +357,14 @@ class SuperAdminContentViewSet(viewsets.ModelViewSet):
         else:
             profile_ids = []
 
-        StreamHelper().expert_publish_content(
-            content.owner_id,
-            content.id,
-            expert_profile_ids=profile_ids,
-            tag_ids=tags_ids,
-            super_admin=int(content.content_type) == FeedProviders.EXPERT_CHAT.value
-        )
+        with transaction.atomic():
+            content.activate()
+            enqueue_stream_operation(
+                'expert_publish_content',
+                content.owner_id,
+                content.id,
+                profile_ids,
+                tags_ids,
+                int(content.content_type) == FeedProviders.EXPERT_CHAT.value
+            )
         return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,13 @@
+from django.contrib import admin
+
+from streamfeeds.models import StreamOperation
+
+
+@admin.register(StreamOperation)
+class StreamOperationAdmin(admin.ModelAdmin):
+    """
+    Admin class for StreamOperation Model
+    """
+    list_display = ('id', 'method', 'attempts', 'next_attempt_timestamp', 'created_timestamp')
+    list_display_links = ('id', 'method')
+    list_filter = ('method', 'attempts')
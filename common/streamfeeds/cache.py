@@ -0,0 +1,96 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from experchat.versioned_cache import CacheVersion
+
+CONTENT_CACHE_KEY_PREFIX = getattr(settings, 'CONTENT_CACHE_KEY_PREFIX', 'CONTENT')
+# bounds how long a change which doesn't bump the version (like the owner's display name) takes to show up
+CONTENT_CACHE_TTL = getattr(settings, 'CONTENT_CACHE_TTL', 60 * 60)
+# longer than CONTENT_CACHE_TTL, so the data cached under a version expires first
+CONTENT_CACHE_VERSION_TTL = getattr(settings, 'CONTENT_CACHE_VERSION_TTL', 60 * 60 * 24)
+
+
+class ContentCache(object):
+    """
+    Versioned cache of the serialized contents shown on the Getstream timelines, without the fields which depend on
+    the current user.
+
+    Every write of a content, its tags or its stats bumps the content's version, so data cached under an older version
+    is never read again and simply expires.
+    """
+    def __init__(self, content_id):
+        self.content_id = content_id
+
+    @classmethod
+    def get_many_versions(cls, content_ids):
+        """
+        Get the current versions of many contents with one cache round trip
+        Args:
+            content_ids (iterable): Content ids
+        return:
+            versions (dict): version of each content id
+        """
+        return CacheVersion.get_many({content_id: cls(content_id).version() for content_id in content_ids})
+
+    @classmethod
+    def get_many(cls, versions, excluded_fields=()):
+        """
+        Get the cached data of many contents with one cache round trip
+        Args:
+            versions (dict): version of each content id
+            excluded_fields (tuple): fields left out of the data
+        return:
+            data (dict): cached data of each content id, contents without cached data are left out
+        """
+        keys = {
+            cls(content_id).data_key(version, excluded_fields): content_id for content_id, version in versions.items()
+        }
+        if not keys:
+            return {}
+
+        cached_data = cache.get_many(list(keys))
+        return {keys[key]: data for key, data in cached_data.items()}
+
+    @classmethod
+    def cache_many(cls, data, versions, excluded_fields=()):
+        """
+        Cache the data of many contents with one cache round trip
+        Args:
+            data (dict): serialized data of each content id
+            versions (dict): version of each content id
+            excluded_fields (tuple): fields left out of the data
+        """
+        if not data:
+            return
+
+        cache.set_many({
+            cls(content_id).data_key(versions[content_id], excluded_fields): content_data
+            for content_id, content_data in data.items()
+        }, CONTENT_CACHE_TTL)
+
+    @classmethod
+    def invalidate_many(cls, content_ids):
+        for content_id in content_ids:
+            cls(content_id).invalidate()
+
+    def version(self):
+        return CacheVersion(CONTENT_CACHE_KEY_PREFIX + "_VERSION_{}".format(self.content_id), CONTENT_CACHE_VERSION_TTL)
+
+    def data_key(self, version, excluded_fields=()):
+        """
+        make the key for caching
+        Args:
+            version (int): current version of the content
+            excluded_fields (tuple): fields left out of the data
+        return:
+            key which needs to be cached
+        """
+        return CONTENT_CACHE_KEY_PREFIX + "_{}_{}".format(self.content_id, version) + ''.join(
+            "_-{}".format(field_name) for field_name in sorted(excluded_fields)
+        )
+
+    def get_version(self):
+        return self.version().get()
+
+    def invalidate(self):
+        self.version().invalidate()
@@ -0,0 +1,258 @@
+import json
+import sqlite3
+import threading
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils import timezone
+
+# feed groups read as aggregated feeds, their activities are grouped like the Getstream aggregation format
+# "{{ actor }}_{{ time.strftime('%Y-%m-%d') }}"
+STREAM_LOCAL_AGGREGATED_FEEDS = getattr(
+    settings, 'STREAM_LOCAL_AGGREGATED_FEEDS', [settings.USER_AGGREGATED_TIMELINE_FEED]
+)
+# copy limit of Getstream when a follow doesn't give one
+STREAM_LOCAL_DEFAULT_COPY_LIMIT = 300
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS activity (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    foreign_id TEXT,
+    time TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS activity_foreign_id ON activity (foreign_id, time);
+CREATE TABLE IF NOT EXISTS feed_activity (
+    feed TEXT NOT NULL,
+    activity_seq INTEGER NOT NULL,
+    origin TEXT NOT NULL,
+    PRIMARY KEY (feed, activity_seq, origin)
+);
+CREATE INDEX IF NOT EXISTS feed_activity_origin ON feed_activity (origin, activity_seq);
+CREATE TABLE IF NOT EXISTS follow (
+    source TEXT NOT NULL,
+    target TEXT NOT NULL,
+    PRIMARY KEY (source, target)
+);
+CREATE INDEX IF NOT EXISTS follow_target ON follow (target);
+"""
+
+
+def get_feed_id(feed_slug, user_id):
+    return "{}:{}".format(feed_slug, user_id)
+
+
+class LocalStreamClient(object):
+    """
+    Local stand-in of the Getstream client, with the part of its API used by StreamHelper, backed by SQLite.
+
+    Every feed keeps the activities added to it, with the `to` targets, and the copies of the activities of the feeds
+    it follows. A copy remembers the feed it came from (its origin), so unfollowing a feed or removing an activity
+    from it only drops the copies which came through that feed. Like on Getstream, follows are not transitive and an
+    activity reached through two follows is read once. The feeds are ordered on insertion, the `time` of the
+    activities is not used for sorting.
+
+    The database is an in-memory one by default, a file path shares the feeds between the processes.
+    """
+    def __init__(self, database=':memory:'):
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(database, timeout=30, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        with self.lock:
+            self.connection.executescript(SCHEMA)
+
+    def execute(self, *statements):
+        """
+        Run the statements in one transaction
+        Args:
+            statements: (sql, params) tuples
+        return:
+            cursor of the last statement
+        """
+        with self.lock, self.connection:
+            cursor = None
+            for sql, params in statements:
+                cursor = self.connection.execute(sql, params)
+            return cursor
+
+    def query(self, sql, params=()):
+        with self.lock:
+            return self.connection.execute(sql, params).fetchall()
+
+    def get_activity(self, foreign_id, time):
+        """
+        Get the activity with the foreign_id and the time, activities without a foreign_id are never found
+        return:
+            activity (dict), None if there is none
+        """
+        if foreign_id is None:
+            return None
+        rows = self.query("SELECT data FROM activity WHERE foreign_id = ? AND time = ?", (foreign_id, time))
+        return json.loads(rows[0]['data']) if rows else None
+
+    def feed(self, feed_slug, user_id):
+        return LocalFeed(self, feed_slug, user_id)
+
+    def follow_many(self, follows, activity_copy_limit=None):
+        """
+        Create many follows, like the batch endpoint of Getstream
+        Args:
+            follows (list): dicts with the source and the target feed ids,
+                e.g. {'source': 'user:1_tag', 'target': 'tag:2'}
+            activity_copy_limit (int): activities of the target copied to the source
+        """
+        statements = []
+        for follow in follows:
+            statements.extend(self.follow_statements(follow['source'], follow['target'], activity_copy_limit))
+        self.execute(*statements)
+
+    def follow_statements(self, source, target, activity_copy_limit=None):
+        if activity_copy_limit is None:
+            activity_copy_limit = STREAM_LOCAL_DEFAULT_COPY_LIMIT
+        return [
+            ("INSERT OR IGNORE INTO follow (source, target) VALUES (?, ?)", (source, target)),
+            (
+                "INSERT OR IGNORE INTO feed_activity (feed, activity_seq, origin) "
+                "SELECT ?, activity_seq, ? FROM feed_activity WHERE feed = ? AND origin = ? "
+                "ORDER BY activity_seq DESC LIMIT ?",
+                (source, target, target, target, activity_copy_limit)
+            ),
+        ]
+
+
+class LocalFeed(object):
+    """
+    Local stand-in of a Getstream feed, see LocalStreamClient
+    """
+    def __init__(self, client, feed_slug, user_id):
+        self.client = client
+        self.slug = feed_slug
+        self.user_id = user_id
+        self.id = get_feed_id(feed_slug, user_id)
+
+    def add_activity(self, activity_data):
+        """
+        Add the activity to the feed and to its `to` targets, then copy it to the followers of all of them. Like on
+        Getstream, an activity with the foreign_id and the time of an existing one is that activity, so adding it
+        again (e.g. a retried publish) doesn't duplicate it
+        Args:
+            activity_data (dict): activity with actor, verb, object, foreign_id and to
+        return:
+            activity (dict): the activity with its id and time
+        """
+        activity = dict(activity_data)
+        activity.setdefault('time', timezone.now().replace(tzinfo=None).isoformat())
+        existing_activity = self.client.get_activity(activity.get('foreign_id'), activity['time'])
+
+        statements = []
+        if existing_activity is not None:
+            activity = existing_activity
+        else:
+            activity['id'] = str(uuid.uuid1())
+            statements.append((
+                "INSERT INTO activity (id, foreign_id, time, data) VALUES (?, ?, ?, ?)",
+                (activity['id'], activity.get('foreign_id'), activity['time'], json.dumps(activity))
+            ))
+
+        feeds = [self.id] + [feed for feed in activity_data.get('to', []) if feed != self.id]
+        placeholders = ', '.join('?' * len(feeds))
+        activity_seq = "(SELECT seq FROM activity WHERE id = ?)"
+        self.client.execute(
+            *statements,
+            *[("INSERT OR IGNORE INTO feed_activity (feed, activity_seq, origin) "
+               "VALUES (?, {}, ?)".format(activity_seq), (feed, activity['id'], feed)) for feed in feeds],
+            ("INSERT OR IGNORE INTO feed_activity (feed, activity_seq, origin) "
+             "SELECT source, {}, target FROM follow WHERE target IN ({})".format(activity_seq, placeholders),
+             [activity['id']] + feeds)
+        )
+        return activity
+
+    def remove_activity(self, activity_id=None, foreign_id=None):
+        """
+        Remove the activity from the feed and the copies which came through the feed
+        """
+        if activity_id is not None:
+            condition, value = 'id = ?', activity_id
+        else:
+            condition, value = 'foreign_id = ?', str(foreign_id)
+        self.client.execute((
+            "DELETE FROM feed_activity WHERE (feed = ? OR origin = ?) AND activity_seq IN ("
+            "SELECT activity_seq FROM feed_activity JOIN activity ON activity.seq = activity_seq "
+            "WHERE feed = ? AND {})".format(condition),
+            (self.id, self.id, self.id, value)
+        ))
+
+    def follow(self, target_feed_slug, target_user_id, activity_copy_limit=None):
+        self.client.execute(*self.client.follow_statements(
+            self.id, get_feed_id(target_feed_slug, target_user_id), activity_copy_limit
+        ))
+
+    def unfollow(self, target_feed_slug, target_user_id, keep_history=False):
+        target = get_feed_id(target_feed_slug, target_user_id)
+        statements = [("DELETE FROM follow WHERE source = ? AND target = ?", (self.id, target))]
+        if not keep_history:
+            statements.append(("DELETE FROM feed_activity WHERE feed = ? AND origin = ?", (self.id, target)))
+        self.client.execute(*statements)
+
+    def get_activities(self, limit=None, offset=0, id_lt=None, id_gt=None):
+        """
+        Get the activities of the feed, newest first
+        Args:
+            limit (int): max. activities, None for all of them
+            offset (int): activities skipped
+            id_lt (str): only the activities older than the one with this id
+            id_gt (str): only the activities newer than the one with this id
+        return:
+            activities (list): activity dicts
+        """
+        sql = (
+            "SELECT DISTINCT seq, data FROM feed_activity JOIN activity ON activity.seq = activity_seq "
+            "WHERE feed = ?"
+        )
+        params = [self.id]
+        if id_lt is not None:
+            sql += " AND seq < (SELECT seq FROM activity WHERE id = ?)"
+            params.append(id_lt)
+        if id_gt is not None:
+            sql += " AND seq > (SELECT seq FROM activity WHERE id = ?)"
+            params.append(id_gt)
+        sql += " ORDER BY seq DESC LIMIT ? OFFSET ?"
+        params.extend([-1 if limit is None else limit, offset])
+        return [json.loads(row['data']) for row in self.client.query(sql, params)]
+
+    def get(self, limit=25, offset=0, id_lt=None, id_gt=None, **kwargs):
+        """
+        Read the feed like Getstream, the aggregated feeds return groups of activities
+        return:
+            dict with the results
+        """
+        if self.slug not in STREAM_LOCAL_AGGREGATED_FEEDS:
+            return {'results': self.get_activities(limit, offset, id_lt, id_gt)}
+
+        groups = OrderedDict()
+        for activity in self.get_activities():
+            group = "{}_{}".format(activity['actor'], activity['time'][:10])
+            groups.setdefault(group, []).append(activity)
+
+        results = []
+        for group, activities in groups.items():
+            results.append({
+                # the id of the first activity, so it doesn't change when the group gets new activities
+                'id': activities[-1]['id'],
+                'group': group,
+                'verb': activities[0]['verb'],
+                'activities': activities,
+                'activity_count': len(activities),
+                'actor_count': 1,
+                'created_at': activities[-1]['time'],
+                'updated_at': activities[0]['time'],
+            })
+        ids = [result['id'] for result in results]
+        start, end = 0, len(results)
+        if id_lt is not None:
+            start = ids.index(id_lt) + 1 if id_lt in ids else end
+        if id_gt is not None:
+            end = ids.index(id_gt) if id_gt in ids else 0
+        return {'results': results[start:end][offset:offset + limit]}
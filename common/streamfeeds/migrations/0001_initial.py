@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+import django_mysql.models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StreamOperation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_timestamp', models.DateTimeField(auto_now_add=True, verbose_name='created timestamp')),
+                ('modified_timestamp', models.DateTimeField(auto_now=True, verbose_name='modified timestamp')),
+                ('method', models.CharField(max_length=64, verbose_name='StreamHelper method')),
+                ('args', django_mysql.models.JSONField(default=list, verbose_name='arguments')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='attempts')),
+                ('next_attempt_timestamp', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='next attempt time')),
+            ],
+            options={
+                'ordering': ('id',),
+            },
+        ),
+    ]
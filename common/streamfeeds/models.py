@@ -0,0 +1,26 @@
+from django.db import models
+from django.utils import timezone
+from django.utils.translation import ugettext_lazy as _
+from django_mysql.models import JSONField
+
+from experchat.models.base import ExperChatBaseModel
+
+
+class StreamOperation(ExperChatBaseModel):
+    """
+    Model to store the Getstream writes waiting to be sent, they are saved in the same transaction as the change they
+    reflect and sent by the drain_stream_operations task
+    """
+    method = models.CharField(_('StreamHelper method'), max_length=64)
+    args = JSONField(_('arguments'), default=list)
+    attempts = models.PositiveSmallIntegerField(_('attempts'), default=0)
+    next_attempt_timestamp = models.DateTimeField(_('next attempt time'), default=timezone.now, db_index=True)
+
+    class Meta:
+        ordering = ('id',)
+
+    def __str__(self):
+        return "{id}: {method}".format(
+            id=self.id,
+            method=self.method
+        )
@@ -0,0 +1,164 @@
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from streamfeeds.models import StreamOperation
+from streamfeeds.utils import StreamHelper
+
+logger = logging.getLogger(__name__)
+
+STREAM_OUTBOX_BATCH_SIZE = getattr(settings, 'STREAM_OUTBOX_BATCH_SIZE', 100)
+STREAM_OUTBOX_MAX_ATTEMPTS = getattr(settings, 'STREAM_OUTBOX_MAX_ATTEMPTS', 8)
+STREAM_OUTBOX_RETRY_DELAY = getattr(settings, 'STREAM_OUTBOX_RETRY_DELAY', 30)
+
+# operations whose only argument is a list of follows, consecutive ones are sent as a single request
+MERGEABLE_METHODS = frozenset(['follow_many', 'unfollow_many'])
+
+
+def enqueue_stream_operation(method, *args):
+    """
+    Save a Getstream write in the current transaction, it is sent once the transaction is committed
+    Args:
+        method (str): name of the StreamHelper method
+        args: JSON serializable arguments of the method
+    return:
+        StreamOperation instance
+    """
+    # imported here since the tasks import this module
+    from streamfeeds.tasks import drain_stream_operations
+
+    operation = StreamOperation.objects.create(method=method, args=list(args))
+    transaction.on_commit(drain_stream_operations.delay)
+    return operation
+
+
+def group_stream_operations(operations):
+    """
+    Merge the consecutive operations which can be sent with one request and drop the consecutive repeated ones, the
+    order of the operations is kept
+    Args:
+        operations (list): StreamOperation instances ordered on id
+    return:
+        list of (method, args, operations) tuples
+    """
+    groups = []
+    for operation in operations:
+        if groups and groups[-1][0] == operation.method:
+            method, args, grouped_operations = groups[-1]
+            if method in MERGEABLE_METHODS:
+                args[0].extend(follow for follow in operation.args[0] if follow not in args[0])
+                grouped_operations.append(operation)
+                continue
+            if args == operation.args:
+                grouped_operations.append(operation)
+                continue
+        args = [list(operation.args[0])] if operation.method in MERGEABLE_METHODS else operation.args
+        groups.append((operation.method, args, [operation]))
+    return groups
+
+
+def get_operation_feeds(operation):
+    """
+    Get the source feeds written by an operation, the operations writing the same feed are sent in order
+    Args:
+        operation (obj): StreamOperation instance
+    return:
+        feeds (set): feed ids, None if they are not known and the operation is ordered with all the other ones
+    """
+    if operation.method in MERGEABLE_METHODS:
+        return {source for source, _ in operation.args[0]}
+    if operation.method == 'expert_publish_content':
+        return {"{}:{}".format(settings.STREAM_FEEDS_EXPERTS, operation.args[0])}
+    return None
+
+
+def is_blocked(feeds, blocked_feeds):
+    """
+    Check if an operation writing the feeds has to wait for an earlier operation writing one of the blocked feeds
+    """
+    if feeds is None or None in blocked_feeds:
+        return bool(blocked_feeds)
+    return not feeds.isdisjoint(blocked_feeds)
+
+
+def block_feeds(feeds, blocked_feeds):
+    # None stands for the unknown feeds, which block all the later operations
+    blocked_feeds.update([None] if feeds is None else feeds)
+
+
+def get_operation_kwargs(method, grouped_operations):
+    """
+    Get the keyword arguments added to the StreamHelper method when the operations are sent
+    """
+    if method == 'expert_publish_content':
+        # a stable time with the foreign_id lets Getstream drop the activity when a retry sends it twice
+        return {'time': grouped_operations[0].created_timestamp.replace(tzinfo=None).isoformat()}
+    return {}
+
+
+def send_stream_operations(operations):
+    """
+    Send the operations to Getstream, the sent ones are deleted and the failed ones are retried later with an
+    exponential backoff. The operations are sent in order for each source feed, so the ones after a failed or
+    delayed operation writing the same feed wait until it is sent or dropped.
+    Args:
+        operations (list): StreamOperation instances ordered on id
+    return:
+        number of operations sent
+    """
+    now = timezone.now()
+    blocked_feeds = set()
+    ready_operations = []
+    for operation in operations:
+        feeds = get_operation_feeds(operation)
+        if operation.next_attempt_timestamp > now or is_blocked(feeds, blocked_feeds):
+            block_feeds(feeds, blocked_feeds)
+            continue
+        ready_operations.append(operation)
+
+    stream_helper = StreamHelper()
+    sent_ids = []
+    for method, args, grouped_operations in group_stream_operations(ready_operations):
+        operation_ids = [operation.id for operation in grouped_operations]
+        feeds = set()
+        for operation in grouped_operations:
+            operation_feeds = get_operation_feeds(operation)
+            if feeds is None or operation_feeds is None:
+                feeds = None
+            else:
+                feeds |= operation_feeds
+        if is_blocked(feeds, blocked_feeds):
+            # left for the next drain, after the failed operation
+            block_feeds(feeds, blocked_feeds)
+            continue
+        try:
+            getattr(stream_helper, method)(*args, **get_operation_kwargs(method, grouped_operations))
+        except Exception:
+            block_feeds(feeds, blocked_feeds)
+            attempts = max(operation.attempts for operation in grouped_operations) + 1
+            logger.exception('Getstream operations %s failed (attempt %s)', operation_ids, attempts)
+            if attempts >= STREAM_OUTBOX_MAX_ATTEMPTS:
+                logger.error('Getstream operations %s are not retried anymore', operation_ids)
+            StreamOperation.objects.filter(id__in=operation_ids).update(
+                attempts=attempts,
+                next_attempt_timestamp=timezone.now() + timezone.timedelta(
+                    seconds=STREAM_OUTBOX_RETRY_DELAY * 2 ** (attempts - 1)
+                )
+            )
+            continue
+        sent_ids.extend(operation_ids)
+
+    StreamOperation.objects.filter(id__in=sent_ids).delete()
+    return len(sent_ids)
+
+
+def get_pending_stream_operations():
+    """
+    Get the next batch of operations, ordered on id. The ones waiting for a retry are included since the later
+    operations writing the same feeds wait for them
+    """
+    return list(StreamOperation.objects.filter(
+        attempts__lt=STREAM_OUTBOX_MAX_ATTEMPTS
+    ).order_by('id')[:STREAM_OUTBOX_BATCH_SIZE])
@@ -0,0 +1,27 @@
+from celery.decorators import periodic_task
+from django.conf import settings
+from django.core.cache import cache
+
+from streamfeeds.outbox import STREAM_OUTBOX_BATCH_SIZE, get_pending_stream_operations, send_stream_operations
+
+STREAM_OUTBOX_LOCK_KEY = 'STREAM_OUTBOX_LOCK'
+
+
+@periodic_task(run_every=(settings.STREAM_OUTBOX_TASK_SCHEDULE))
+def drain_stream_operations():
+    """
+    Celery task to send the pending Getstream writes in batches. It runs after every transaction saving some and
+    periodically for the retries, one drainer runs at a time so the writes of each feed are sent in order.
+    Return: None
+    """
+    if not cache.add(STREAM_OUTBOX_LOCK_KEY, True, settings.STREAM_OUTBOX_LOCK_TIMEOUT):
+        return
+
+    try:
+        while True:
+            operations = get_pending_stream_operations()
+            # the operations left are waiting for a retry, or for an earlier operation writing the same feeds
+            if not operations or not send_stream_operations(operations) or len(operations) < STREAM_OUTBOX_BATCH_SIZE:
+                break
+    finally:
+        cache.delete(STREAM_OUTBOX_LOCK_KEY)
@@ -1,7 +1,25 @@
+from unittest import mock
+from unittest.mock import MagicMock
+
 from django.conf import settings
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from experchat.models.domains import Domain, Tag
+from experchat.models.users import Expert, User
+from feeds.counters import add_content_likes, save_buffered_likes
+from feeds.models import Content, ContentUserActivity
+from streamfeeds.cache import ContentCache
+from streamfeeds.local import LocalStreamClient
+from streamfeeds.models import StreamOperation
+from streamfeeds.outbox import get_pending_stream_operations, group_stream_operations, send_stream_operations
+from streamfeeds.utils import LocalStreamHelper, StreamHelper, read_content_feeds_getstream, run_concurrently
+from streamfeeds.views import ContentMapMixin, GlobalUserFeedView
 
-from streamfeeds.utils import StreamHelper
+UserBase = get_user_model()
 
 
 class TestFeed(TestCase):
@@ -33,3 +51,286 @@ class TestFeed(TestCase):
     def test_get_user_global_feed(self):
         result = self.stream_helper.get_user_global()
         assert result == [settings.STREAM_FEEDS_USER + ':{}'.format(settings.STREAM_STATIC_GLOBAL_FEED)]
+
+    def test_get_tag_follows(self):
+        user = MagicMock(id=7)
+        result = self.stream_helper.get_tag_follows(self.valid_data, user)
+        assert result == [('user:7_tag', 'tag:1'), ('user:7_tag', 'tag:2'), ('user:7_tag', 'tag:3')]
+
+    def test_get_expert_follows(self):
+        user = MagicMock(id=7)
+        result = self.stream_helper.get_expert_follows(3, user)
+        assert result == [
+            ('user:7_expert', 'expert:3'),
+            (settings.USER_AGGREGATED_TIMELINE_FEED + ':7_expert', 'expert:3'),
+        ]
+
+    def test_run_concurrently(self):
+        calls = [MagicMock(), MagicMock(side_effect=ValueError)]
+        with self.assertRaises(ValueError):
+            run_concurrently([(call, (count,)) for count, call in enumerate(calls)])
+        calls[0].assert_called_once_with(0)
+        calls[1].assert_called_once_with(1)
+
+
+class TestContentHydration(TestCase):
+    """
+    Test serializing the stream feeds through the ContentCache.
+    """
+    def setUp(self):
+        cache.clear()
+        self.tag = Tag.objects.create(domain=Domain.objects.create(name='Health'), name='Fitness')
+        expert = Expert.objects.create(userbase=UserBase.objects.create(email='expert@example.com'))
+        self.user = User.objects.create(userbase=UserBase.objects.create(email='user@example.com'))
+        self.contents = [
+            Content.objects.create(content_id='{}_{}'.format(count, expert.id), title='Title {}'.format(count),
+                                   content={}, owner=expert.userbase)
+            for count in range(3)
+        ]
+        self.stream_feeds = [str(content.id) for content in reversed(self.contents)]
+        ContentUserActivity.objects.create(content=self.contents[0], user=self.user,
+                                           activity_type=ContentUserActivity.LIKE)
+
+        self.request = RequestFactory().get('/')
+        self.request.user = self.user.userbase
+        self.expert_request = RequestFactory().get('/')
+        self.expert_request.user = expert.userbase
+
+    def test_invalidate_bumps_version(self):
+        content_cache = ContentCache(1)
+        version = content_cache.get_version()
+        content_cache.invalidate()
+        assert content_cache.get_version() == version + 1
+
+    def test_cached_contents_are_served_without_queries(self):
+        ContentMapMixin().hydrate_contents(self.expert_request, self.stream_feeds)
+
+        with self.assertNumQueries(0):
+            response = ContentMapMixin().hydrate_contents(self.expert_request, self.stream_feeds)
+        assert [content['id'] for content in response] == [int(content_id) for content_id in self.stream_feeds]
+
+        # only the activities of the user are loaded
+        with self.assertNumQueries(1):
+            response = ContentMapMixin().hydrate_contents(self.request, self.stream_feeds)
+        flags = {content['id']: content['liked_by_current_user'] for content in response}
+        assert flags == {self.contents[0].id: True, self.contents[1].id: False, self.contents[2].id: False}
+
+    def test_changed_contents_are_serialized_again(self):
+        ContentMapMixin().hydrate_contents(self.request, self.stream_feeds)
+
+        self.contents[1].title = 'Changed'
+        self.contents[1].save()
+        self.contents[2].tags.add(self.tag)
+        response = ContentMapMixin().hydrate_contents(self.request, self.stream_feeds)
+
+        contents = {content['id']: content for content in response}
+        assert contents[self.contents[1].id]['title'] == 'Changed'
+        assert [tag['id'] for tag in contents[self.contents[2].id]['tags']] == [self.tag.id]
+
+    @mock.patch('feeds.tasks.flush_content_likes.apply_async')
+    def test_buffered_likes_are_added_to_the_cached_contents(self, mock_apply_async):
+        ContentMapMixin().hydrate_contents(self.request, self.stream_feeds)
+
+        add_content_likes(self.contents[1].id, 2)
+        response = ContentMapMixin().hydrate_contents(self.request, self.stream_feeds)
+        likes = {content['id']: content['likes'] for content in response}
+        assert likes == {self.contents[0].id: 0, self.contents[1].id: 2, self.contents[2].id: 0}
+
+        # saved and served from the database once the cache is invalidated
+        save_buffered_likes(self.contents[1].id)
+        response = ContentMapMixin().hydrate_contents(self.request, self.stream_feeds)
+        assert {content['id']: content['likes'] for content in response} == likes
+
+    def test_read_content_feeds_getstream_keeps_stream_order(self):
+        Content.objects.filter(id=self.contents[1].id).update(is_deleted=True)
+        feed_ids = self.stream_feeds + ['0']
+
+        # contents and their tags
+        with self.assertNumQueries(2):
+            contents = read_content_feeds_getstream(feed_ids)
+        assert contents == [self.contents[2], self.contents[0]]
+
+    def test_cursor_pagination(self):
+        stream_helper = LocalStreamHelper()
+        stream_helper.client = LocalStreamClient()
+        for content in self.contents:
+            stream_helper.expert_publish_content(content.owner_id, content.id)
+
+        def get_page(**params):
+            request = APIRequestFactory().get('/', params, HTTP_HOST='testserver')
+            force_authenticate(request, self.user.userbase)
+            with mock.patch('streamfeeds.views.StreamHelper', LocalStreamHelper):
+                response = GlobalUserFeedView.as_view()(request)
+            return response.data['metadata'], [content['id'] for content in response.data['results']]
+
+        metadata, ids = get_page(limit=2)
+        assert ids == [self.contents[2].id, self.contents[1].id]
+        assert metadata['previous_cursor'] is None
+
+        # a new activity doesn't shift the next page
+        stream_helper.expert_publish_content(self.contents[0].owner_id, self.contents[0].id)
+        next_metadata, ids = get_page(limit=2, cursor=metadata['next_cursor'])
+        assert ids == [self.contents[0].id]
+        assert next_metadata['next_cursor'] is None
+
+        _, ids = get_page(limit=2, cursor=next_metadata['previous_cursor'])
+        assert ids == [self.contents[0].id, self.contents[2].id]
+
+        request = APIRequestFactory().get('/', {'cursor': 'invalid'}, HTTP_HOST='testserver')
+        force_authenticate(request, self.user.userbase)
+        assert GlobalUserFeedView.as_view()(request).status_code == 404
+
+    def test_excluded_fields_are_not_loaded(self):
+        contents = read_content_feeds_getstream(self.stream_feeds, ('content',))
+        assert all('content' in content.get_deferred_fields() for content in contents)
+
+        with self.assertNumQueries(3):
+            response = ContentMapMixin().hydrate_contents(self.request, self.stream_feeds, ('content',))
+        assert all('content' not in content for content in response)
+        assert all('content' in content for content in ContentMapMixin().hydrate_contents(self.request,
+                                                                                          self.stream_feeds))
+
+
+class TestStreamOutbox(TestCase):
+    """
+    Test sending the Getstream writes saved in the outbox.
+    """
+    def test_group_stream_operations(self):
+        operations = [
+            StreamOperation(id=1, method='follow_many', args=[[['user:1_tag', 'tag:1'], ['user:1_tag', 'tag:2']]]),
+            StreamOperation(id=2, method='follow_many', args=[[['user:2_tag', 'tag:1'], ['user:1_tag', 'tag:2']]]),
+            StreamOperation(id=3, method='unfollow_many', args=[[['user:1_tag', 'tag:1']]]),
+            StreamOperation(id=4, method='expert_publish_content', args=[1, 5, None, [1], False]),
+            StreamOperation(id=5, method='expert_publish_content', args=[1, 5, None, [1], False]),
+            StreamOperation(id=6, method='expert_publish_content', args=[1, 6, None, [1], False]),
+        ]
+        groups = [(method, args, [operation.id for operation in grouped_operations])
+                  for method, args, grouped_operations in group_stream_operations(operations)]
+        assert groups == [
+            ('follow_many', [[['user:1_tag', 'tag:1'], ['user:1_tag', 'tag:2'], ['user:2_tag', 'tag:1']]], [1, 2]),
+            ('unfollow_many', [[['user:1_tag', 'tag:1']]], [3]),
+            ('expert_publish_content', [1, 5, None, [1], False], [4, 5]),
+            ('expert_publish_content', [1, 6, None, [1], False], [6]),
+        ]
+
+    @mock.patch.object(StreamHelper, 'unfollow_many', side_effect=ValueError)
+    @mock.patch.object(StreamHelper, 'follow_many')
+    def test_send_stream_operations(self, mock_follow_many, mock_unfollow_many):
+        StreamOperation.objects.create(method='follow_many', args=[[['user:1_tag', 'tag:1']]])
+        StreamOperation.objects.create(method='follow_many', args=[[['user:1_tag', 'tag:2']]])
+        failed = StreamOperation.objects.create(method='unfollow_many', args=[[['user:1_tag', 'tag:3']]])
+
+        send_stream_operations(list(StreamOperation.objects.all()))
+
+        mock_follow_many.assert_called_once_with([['user:1_tag', 'tag:1'], ['user:1_tag', 'tag:2']])
+        # the failed operation is kept for a retry
+        failed.refresh_from_db()
+        assert list(StreamOperation.objects.values_list('id', flat=True)) == [failed.id]
+        assert failed.attempts == 1
+        assert failed.next_attempt_timestamp > failed.created_timestamp
+
+    @mock.patch.object(StreamHelper, 'unfollow_many')
+    @mock.patch.object(StreamHelper, 'follow_many', side_effect=ValueError)
+    def test_failed_operation_blocks_the_later_writes_of_its_feed(self, mock_follow_many, mock_unfollow_many):
+        failed = StreamOperation.objects.create(method='follow_many', args=[[['user:1_tag', 'tag:1']]])
+        StreamOperation.objects.create(method='unfollow_many', args=[[['user:1_tag', 'tag:1']]])
+        StreamOperation.objects.create(method='unfollow_many', args=[[['user:2_tag', 'tag:1']]])
+
+        assert send_stream_operations(get_pending_stream_operations()) == 0
+        # the unfollow of another feed is not merged with the blocked one
+        assert mock_unfollow_many.call_count == 0
+        assert StreamOperation.objects.count() == 3
+
+        # the failed follow is not retried yet, only the other feed is written
+        assert send_stream_operations(get_pending_stream_operations()) == 1
+        mock_follow_many.assert_called_once_with([['user:1_tag', 'tag:1']])
+        mock_unfollow_many.assert_called_once_with([['user:2_tag', 'tag:1']])
+
+        mock_follow_many.side_effect = None
+        StreamOperation.objects.filter(id=failed.id).update(next_attempt_timestamp=timezone.now())
+        assert send_stream_operations(get_pending_stream_operations()) == 2
+        mock_unfollow_many.assert_called_with([['user:1_tag', 'tag:1']])
+        assert not StreamOperation.objects.exists()
+
+    @mock.patch.object(StreamHelper, 'expert_publish_content')
+    def test_publish_is_sent_with_a_stable_time(self, mock_expert_publish_content):
+        operation = StreamOperation.objects.create(method='expert_publish_content', args=[1, 5, None, [1], False])
+        send_stream_operations([operation])
+        mock_expert_publish_content.assert_called_once_with(
+            1, 5, None, [1], False, time=operation.created_timestamp.replace(tzinfo=None).isoformat()
+        )
+
+
+class TestLocalStream(TestCase):
+    """
+    Test the local feed engine used instead of Getstream.
+    """
+    def setUp(self):
+        self.stream_helper = LocalStreamHelper()
+        self.stream_helper.client = LocalStreamClient()
+        self.user = MagicMock(id=1)
+
+    def test_publish_fans_out_to_followers(self):
+        self.stream_helper.follow_many(self.stream_helper.get_tag_follows([1, 2], self.user))
+        self.stream_helper.follow_many(self.stream_helper.get_expert_follows(7, self.user))
+        self.stream_helper.expert_publish_content(7, 10, tag_ids=[1, 2])
+        self.stream_helper.expert_publish_content(8, 11, tag_ids=[2])
+
+        assert self.stream_helper.get_expert_feed(7) == [10]
+        assert self.stream_helper.get_tag_feeds(2) == [11, 10]
+        assert self.stream_helper.get_user_global_feed() == [11, 10]
+        # reached through both tags, read once
+        assert self.stream_helper.get_user_tag_followed_feeds(self.user) == [11, 10]
+        assert self.stream_helper.get_user_expert_followed_feeds(self.user) == [10]
+        assert self.stream_helper.get_tag_feeds(2, limit=1, offset=1) == [10]
+
+    def test_follow_copies_the_latest_activities(self):
+        for content_id in range(5):
+            self.stream_helper.expert_publish_content(7, content_id, tag_ids=[1])
+        self.stream_helper.follow_many(self.stream_helper.get_tag_follows([1], self.user), activity_copy_limit=2)
+        assert self.stream_helper.get_user_tag_followed_feeds(self.user) == [4, 3]
+
+    def test_unfollow_keeps_the_activities_of_other_follows(self):
+        self.stream_helper.follow_many(self.stream_helper.get_tag_follows([1, 2], self.user))
+        self.stream_helper.expert_publish_content(7, 10, tag_ids=[1, 2])
+        self.stream_helper.expert_publish_content(7, 11, tag_ids=[1])
+
+        self.stream_helper.unfollow_tags([1], self.user)
+        assert self.stream_helper.get_user_tag_followed_feeds(self.user) == [10]
+        self.stream_helper.expert_publish_content(7, 12, tag_ids=[1])
+        assert self.stream_helper.get_user_tag_followed_feeds(self.user) == [10]
+
+    def test_remove_activity_by_foreign_id(self):
+        self.stream_helper.follow_many(self.stream_helper.get_tag_follows([1, 2], self.user))
+        self.stream_helper.expert_publish_content(7, 10, tag_ids=[1, 2])
+
+        self.stream_helper.remove_content_tags_feeds(10, [1])
+        assert self.stream_helper.get_tag_feeds(1) == []
+        assert self.stream_helper.get_user_tag_followed_feeds(self.user) == [10]
+        self.stream_helper.remove_content_tags_feeds(10, [2])
+        assert self.stream_helper.get_user_tag_followed_feeds(self.user) == []
+        assert self.stream_helper.get_expert_feed(7) == [10]
+
+    def test_retried_publish_adds_the_activity_once(self):
+        self.stream_helper.follow_many(self.stream_helper.get_tag_follows([1], self.user))
+        time = timezone.now().replace(tzinfo=None).isoformat()
+        activity = self.stream_helper.expert_publish_content(7, 10, tag_ids=[1], time=time)
+        assert self.stream_helper.expert_publish_content(7, 10, tag_ids=[1], time=time) == activity
+        # a publish at another time is another activity
+        self.stream_helper.expert_publish_content(7, 10, tag_ids=[1])
+
+        assert self.stream_helper.get_expert_feed(7) == [10, 10]
+        assert self.stream_helper.get_user_tag_followed_feeds(self.user) == [10, 10]
+
+    def test_aggregated_timeline(self):
+        self.stream_helper.follow_experts(7, self.user)
+        self.stream_helper.follow_experts(8, self.user)
+        self.stream_helper.expert_publish_content(7, 10)
+        self.stream_helper.expert_publish_content(8, 11)
+        self.stream_helper.expert_publish_content(7, 12)
+
+        date = timezone.now().strftime('%Y-%m-%d')
+        assert self.stream_helper.get_user_aggregated_timeline_feeds(self.user) == [
+            {'activity_count': 2, 'expert': '7', 'date_created': date, 'verb': settings.STREAM_VERBS_POST},
+            {'activity_count': 1, 'expert': '8', 'date_created': date, 'verb': settings.STREAM_VERBS_POST},
+        ]
@@ -1,9 +1,37 @@
+import base64
+import json
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 import stream
 from django.conf import settings
+from django.db.models import Prefetch
 
+from experchat.models.domains import Tag
 from feeds.models import Content
+from streamfeeds.local import LocalStreamClient
+
+STREAM_ACTIVITY_COPY_LIMIT = getattr(settings, 'STREAM_ACTIVITY_COPY_LIMIT', 1000)
+STREAM_MAX_WORKERS = getattr(settings, 'STREAM_MAX_WORKERS', 8)
+# SQLite database of the local feed engine used instead of Getstream, None to use Getstream
+STREAM_LOCAL_DATABASE = getattr(settings, 'STREAM_LOCAL_DATABASE', None)
+
+
+def run_concurrently(calls):
+    """
+    Run the calls on a bounded thread pool and wait for all of them, for the Getstream operations which have no batch
+    endpoint
+    Args:
+        calls (list): (function, args) tuples
+    Raise:
+        the first exception raised by a call, after all of them are done
+    """
+    if not calls:
+        return
+    with ThreadPoolExecutor(max_workers=min(STREAM_MAX_WORKERS, len(calls))) as executor:
+        futures = [executor.submit(function, *args) for function, args in calls]
+    for future in futures:
+        future.result()
 
 
 class Singleton(type):
@@ -37,10 +65,7 @@ class StreamHelper(metaclass=Singleton):
             get_stream_timeline_obj will be created for bellow keys
             "timeline:1_tag" and timline:1_expert"
         """
-        return self.client.feed(
-            settings.STREAM_FEEDS_USER,
-            "{user_id}_{timeline}".format(user_id=user.id, timeline=time_line_name)
-        )
+        return self.client.feed(settings.STREAM_FEEDS_USER, self.get_timeline_key(user, time_line_name))
 
     def get_aggregated_timeline(self, user, time_line_name):
         """
@@ -54,13 +79,10 @@ class StreamHelper(metaclass=Singleton):
             get_stream_timeline_obj will be created for bellow keys
             "timeline:1_tag" and timline:1_expert"
         """
-        return self.client.feed(
-            settings.USER_AGGREGATED_TIMELINE_FEED,
-            "{user_id}_{timeline}".format(user_id=user.id, timeline=time_line_name)
-        )
+        return self.client.feed(settings.USER_AGGREGATED_TIMELINE_FEED, self.get_timeline_key(user, time_line_name))
 
     def expert_publish_content(self, expert_user, content, expert_profile_ids=None,
-                               tag_ids=None, super_admin=False):
+                               tag_ids=None, super_admin=False, time=None):
         """
         Post the feed on Getstream.
         Args:
@@ -69,6 +91,8 @@ class StreamHelper(metaclass=Singleton):
             expert_profile_ids: IDs of profiles associated with expert.
             tag_ids (list): IDs of tags associated with expert profiles.
             super_admin (boolean): Flag for Super Admin
+            time (str): ISO time of the activity, Getstream ignores an activity sent again with the same
+                foreign_id and time
         """
         expert_feed = self.client.feed(settings.STREAM_FEEDS_EXPERTS, expert_user)
 
@@ -81,6 +105,8 @@ class StreamHelper(metaclass=Singleton):
             'foreign_id': content,
             'to': to_stream
         }
+        if time is not None:
+            activity['time'] = time
         return expert_feed.add_activity(activity)
 
     def get_streams(self, expert_profile_ids, tag_ids, super_admin):
@@ -175,6 +201,75 @@ class StreamHelper(metaclass=Singleton):
         # formating with static int for adding all expert feeds to this feed
         return [global_feed + ':{}'.format(settings.STREAM_STATIC_GLOBAL_FEED)]
 
+    def follow_many(self, follows, activity_copy_limit=STREAM_ACTIVITY_COPY_LIMIT):
+        """
+        Create many follows with one request
+        Args:
+            follows (list): (source feed, target feed) tuples, e.g. ('user:1_tag', 'tag:2')
+            activity_copy_limit (int): activities of the target copied to the source
+        return:
+            None
+        """
+        if not follows:
+            return
+        self.client.follow_many(
+            [{'source': source, 'target': target} for source, target in follows],
+            activity_copy_limit=activity_copy_limit
+        )
+
+    def unfollow_many(self, follows):
+        """
+        Remove many follows, Getstream has no batch endpoint for it so the requests are sent concurrently
+        Args:
+            follows (list): (source feed, target feed) tuples, e.g. ('user:1_tag', 'tag:2')
+        return:
+            None
+        """
+        calls = []
+        for source, target in follows:
+            source_feed = self.client.feed(*source.split(':', 1))
+            calls.append((source_feed.unfollow, target.split(':', 1)))
+        run_concurrently(calls)
+
+    def remove_activities(self, feeds, foreign_id):
+        """
+        Remove the activity from many feeds, Getstream has no batch endpoint for it so the requests are sent
+        concurrently
+        Args:
+            feeds (list): feed ids, e.g. ['tag:1', 'tag:2']
+            foreign_id (str): foreign id of the activity
+        return:
+            None
+        """
+        calls = []
+        for feed in feeds:
+            stream_feed = self.client.feed(*feed.split(':', 1))
+            calls.append((stream_feed.remove_activity, (None, foreign_id)))
+        run_concurrently(calls)
+
+    def get_timeline_key(self, user, time_line_name):
+        """
+        Key of the timeline of the user in its feed group, e.g. "1_tag"
+        """
+        return "{user_id}_{timeline}".format(user_id=user.id, timeline=time_line_name)
+
+    def get_timeline_id(self, feed_type, user, time_line_name):
+        """
+        Feed id of the timeline of the user, e.g. "user:1_tag"
+        """
+        return "{}:{}".format(feed_type, self.get_timeline_key(user, time_line_name))
+
+    def get_tag_follows(self, tag_ids, user):
+        source = self.get_timeline_id(settings.STREAM_FEEDS_USER, user, settings.STREAM_FEEDS_TAG)
+        return [(source, target) for target in self.get_tags(tag_ids)]
+
+    def get_expert_follows(self, expert_id, user):
+        target = "{}:{}".format(settings.STREAM_FEEDS_EXPERTS, expert_id)
+        return [
+            (self.get_timeline_id(settings.STREAM_FEEDS_USER, user, settings.STREAM_FEEDS_EXPERTS), target),
+            (self.get_timeline_id(settings.USER_AGGREGATED_TIMELINE_FEED, user, settings.STREAM_FEEDS_EXPERTS), target),
+        ]
+
     def follow_tags(self, followed_tags, user):
         """
         Method for following the tags
@@ -184,9 +279,7 @@ class StreamHelper(metaclass=Singleton):
         return:
             None
         """
-        tags_timeline = self.get_user_timeline(user, settings.STREAM_FEEDS_TAG)
-        for followed_tag in followed_tags:
-            tags_timeline.follow(settings.STREAM_FEEDS_TAG, followed_tag.tag_id, activity_copy_limit=1000)
+        self.follow_many(self.get_tag_follows([followed_tag.tag_id for followed_tag in followed_tags], user))
 
     def unfollow_tags(self, tag_ids, user):
         """
@@ -197,9 +290,7 @@ class StreamHelper(metaclass=Singleton):
         return:
             None
         """
-        tags_timeline = self.get_user_timeline(user, settings.STREAM_FEEDS_TAG)
-        for tag_id in tag_ids:
-            tags_timeline.unfollow(settings.STREAM_FEEDS_TAG, tag_id)
+        self.unfollow_many(self.get_tag_follows(tag_ids, user))
 
     def follow_experts(self, expert_id, user):
         """
@@ -210,10 +301,7 @@ class StreamHelper(metaclass=Singleton):
         return:
             None
         """
-        expert_timeline = self.get_user_timeline(user, settings.STREAM_FEEDS_EXPERTS)
-        aggregated_time_line = self.get_aggregated_timeline(user, settings.STREAM_FEEDS_EXPERTS)
-        expert_timeline.follow(settings.STREAM_FEEDS_EXPERTS, expert_id, activity_copy_limit=1000)
-        aggregated_time_line.follow(settings.STREAM_FEEDS_EXPERTS, expert_id, activity_copy_limit=1000)
+        self.follow_many(self.get_expert_follows(expert_id, user))
 
     def unfollow_expert(self, expert_id, user):
         """
@@ -224,10 +312,7 @@ class StreamHelper(metaclass=Singleton):
         return:
             None
         """
-        expert_timeline = self.get_user_timeline(user, settings.STREAM_FEEDS_EXPERTS)
-        aggregated_time_line = self.get_aggregated_timeline(user, settings.STREAM_FEEDS_EXPERTS)
-        expert_timeline.unfollow(settings.STREAM_FEEDS_EXPERTS, expert_id)
-        aggregated_time_line.unfollow(settings.STREAM_FEEDS_EXPERTS, expert_id)
+        self.unfollow_many(self.get_expert_follows(expert_id, user))
 
     # By default it will give 25 feeds if no limit defined
     def get_expert_feed(self, expert_user_id, limit=settings.STREAM_READ_LIMIT, offset=0):
@@ -246,29 +331,54 @@ class StreamHelper(metaclass=Singleton):
         feed_type = settings.STREAM_FEEDS_USER
         return self.get_feed_from_stream(feed_type, settings.STREAM_STATIC_SUPERADMIN_FEED, limit, offset)
 
+    def get_activities_from_stream(self, feed_type, feed_key_id, limit=settings.STREAM_READ_LIMIT, offset=0,
+                                   id_lt=None, id_gt=None):
+        """
+        Read the activities of a feed, newest first
+        Args:
+            feed_type (str): feed group
+            feed_key_id (str): feed key in the group
+            limit (int): max. activities
+            offset (int): activities skipped
+            id_lt (str): only the activities older than the one with this id
+            id_gt (str): only the activities newer than the one with this id
+        return:
+            list of activity dicts
+        """
+        params = {'limit': limit, 'offset': offset}
+        if id_lt is not None:
+            params['id_lt'] = id_lt
+        if id_gt is not None:
+            params['id_gt'] = id_gt
+        return self.client.feed(feed_type, feed_key_id).get(**params)['results']
+
     def get_feed_from_stream(self, feed_type, feed_key_id, limit=settings.STREAM_READ_LIMIT, offset=0):
-        stream_feed = self.client.feed(feed_type, feed_key_id)
-        activities = stream_feed.get(limit=limit, offset=offset)['results']
+        activities = self.get_activities_from_stream(feed_type, feed_key_id, limit, offset)
         return [activity['object'] for activity in activities]
 
+    def format_aggregated_activity(self, activity):
+        """
+        Make the feed of an aggregated activity, whose group is "<expert id>_<date>"
+        """
+        expert_id, date = activity['group'].split('_')
+        return {
+            'activity_count': activity['activity_count'],
+            'expert': expert_id,
+            'date_created': date,
+            'verb': activity['verb']
+        }
+
     def get_aggregated_feeds_from_stream(self, feed_type, feed_key_id, limit=settings.STREAM_READ_LIMIT, offset=0):
-        stream_feed = self.client.feed(feed_type, feed_key_id)
-        activities = stream_feed.get(limit=limit, offset=offset)['results']
-        aggregated_feeds_list = []
-        for activity in activities:
-            expert_id, date = activity['group'].split('_')
-            aggregated_feeds_list.append({
-                'activity_count': activity['activity_count'],
-                'expert': expert_id,
-                'date_created': date,
-                'verb': activity['verb']
-            })
-        return aggregated_feeds_list
+        activities = self.get_activities_from_stream(feed_type, feed_key_id, limit, offset)
+        return [self.format_aggregated_activity(activity) for activity in activities]
 
     def remove_content_tag_feeds(self, content_id, tag_id):
         feed_type = settings.STREAM_FEEDS_TAG
         return self.remove_feed_from_stream(feed_type, tag_id, content_id)
 
+    def remove_content_tags_feeds(self, content_id, tag_ids):
+        return self.remove_activities(self.get_tags(tag_ids), content_id)
+
     def remove_content_feeds(self, owner_id, content_id):
         feed_type = settings.STREAM_FEEDS_EXPERTS
         return self.remove_feed_from_stream(feed_type, owner_id, content_id)
@@ -283,35 +393,82 @@ class StreamHelper(metaclass=Singleton):
 
     def get_user_expert_followed_feeds(self, user, limit=settings.STREAM_READ_LIMIT, offset=0):
         feed_type = settings.STREAM_FEEDS_USER
-        feed_key = "{}_{}".format(user.id, settings.STREAM_FEEDS_EXPERTS)
+        feed_key = self.get_timeline_key(user, settings.STREAM_FEEDS_EXPERTS)
         return self.get_feed_from_stream(feed_type, feed_key, limit, offset)
 
     def get_user_tag_followed_feeds(self, user, limit=settings.STREAM_READ_LIMIT, offset=0):
         feed_type = settings.STREAM_FEEDS_USER
-        feed_key = "{}_{}".format(user.id, settings.STREAM_FEEDS_TAG)
+        feed_key = self.get_timeline_key(user, settings.STREAM_FEEDS_TAG)
         return self.get_feed_from_stream(feed_type, feed_key, limit, offset)
 
     def get_user_aggregated_timeline_feeds(self, user, limit=settings.STREAM_READ_LIMIT, offset=0):
         feed_type = settings.USER_AGGREGATED_TIMELINE_FEED
-        feed_key = "{}_{}".format(user.id, settings.STREAM_FEEDS_EXPERTS)
+        feed_key = self.get_timeline_key(user, settings.STREAM_FEEDS_EXPERTS)
         return self.get_aggregated_feeds_from_stream(feed_type, feed_key, limit, offset)
 
 
-def paginate_stream_result(request, data, limit, offset):
+def encode_stream_cursor(**position):
+    """
+    Make the opaque cursor of a position in a feed
+    Args:
+        position: id_lt or id_gt activity id
+    Returns:
+        cursor (str)
+    """
+    return base64.urlsafe_b64encode(json.dumps(position).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_stream_cursor(cursor):
+    """
+    Get the position in a feed from a cursor made by encode_stream_cursor
+    Args:
+        cursor (str): cursor given by the client
+    Returns:
+        position (dict): id_lt or id_gt activity id
+    Raise:
+        ValueError if the cursor is invalid
+    """
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8'))
+    except (TypeError, ValueError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(position, dict) or len(position) != 1 or not set(position) <= {'id_lt', 'id_gt'} \
+            or not all(isinstance(activity_id, str) for activity_id in position.values()):
+        raise ValueError('Invalid cursor')
+    return position
+
+
+def paginate_stream_result(request, data, limit, offset, activities=None, position=None):
     """
     Util method to make the pagination data
     Args:
         request (obj): Requests
         data (dict): Data which needs to be rendered in Response
+        limit (int): max. feeds of the page
+        offset (int): feeds skipped
+        activities (list): Getstream activities of the page, their ids make the cursors of the next and previous
+            pages. None for data which is not read from Getstream, it is paginated on offset
+        position (dict): id_lt or id_gt activity id the page was read from, empty for the first page
     Returns:
         dict with next, previous link and data count
     """
+    if activities is None:
+        next_cursor = previous_cursor = None
+        next_link = _get_next_link(request, offset, limit, data)
+        previous_link = _get_previous_link(request, offset, limit)
+    else:
+        next_cursor, previous_cursor = _get_cursors(offset, limit, activities, position or {})
+        next_link = _get_cursor_link(request, next_cursor, limit)
+        previous_link = _get_cursor_link(request, previous_cursor, limit)
+
     return OrderedDict([
         ('metadata', OrderedDict([
          ('count', len(data)),
-         ('next', _get_next_link(request, offset, limit, data)),
-         ('previous', _get_previous_link(request, offset, limit)),
-         ('offset', offset)
+         ('next', next_link),
+         ('previous', previous_link),
+         ('offset', offset),
+         ('next_cursor', next_cursor),
+         ('previous_cursor', previous_cursor),
          ])),
         ('results', data)
         ])
@@ -342,12 +499,57 @@ def _get_previous_link(request, offset, limit):
     return url + "?offset={}&limit={}".format(previous_offset, limit)
 
 
-def read_content_feeds_getstream(feed_ids):
-    queryset = Content.objects.filter(id__in=feed_ids)
-    objects = dict([(str(obj.content_id), obj) for obj in queryset])
-    expert_feeds_ids = [str(obj.content_id) for obj in queryset]
-    sorted_objects = [objects[feed_id] for feed_id in expert_feeds_ids]
-    return sorted_objects
+def _get_cursors(offset, limit, activities, position):
+    """
+    Cursors of the older activities after the page and of the newer ones before it. A page read with id_gt is newer
+    than the page it came from, so there is always a next page after it.
+    """
+    if not activities:
+        return None, None
+    is_full = len(activities) >= limit
+    next_cursor = previous_cursor = None
+    if is_full or 'id_gt' in position:
+        next_cursor = encode_stream_cursor(id_lt=activities[-1]['id'])
+    if offset or 'id_lt' in position or ('id_gt' in position and is_full):
+        previous_cursor = encode_stream_cursor(id_gt=activities[0]['id'])
+    return next_cursor, previous_cursor
+
+
+def _get_cursor_link(request, cursor, limit):
+    if cursor is None:
+        return None
+    return _make_url(request) + "?cursor={}&limit={}".format(cursor, limit)
+
+
+def prefetch_content_relations(queryset):
+    """
+    Load the relations rendered by ContentSerializer along with the contents, so serializing a page of contents runs
+    a fixed number of queries
+    Args:
+        queryset (obj): Content queryset
+    Returns:
+        queryset with the owners, their expert or user, the stats and the tags with their parents
+    """
+    return queryset.select_related('owner__expert', 'owner__user', 'stats').prefetch_related(
+        Prefetch('tags', queryset=Tag.objects.select_related('parent'))
+    )
+
+
+def read_content_feeds_getstream(feed_ids, deferred_fields=()):
+    """
+    Load the contents of the stream feeds with one query, in the order of the stream
+    Args:
+        feed_ids (list): Content ids in the order of the stream
+        deferred_fields (tuple): Content fields which are not loaded, like the heavy content JSON
+    Returns:
+        list of Content, the deleted ones and the ids which are not in the database are left out
+    """
+    feed_ids = [int(feed_id) for feed_id in feed_ids]
+    queryset = prefetch_content_relations(
+        Content.objects.filter(id__in=feed_ids, is_deleted=False).order_by().defer(*deferred_fields)
+    )
+    objects = {obj.id: obj for obj in queryset}
+    return [objects[feed_id] for feed_id in feed_ids if feed_id in objects]
 
 
 class DummyStreamHelper(StreamHelper):
@@ -356,7 +558,7 @@ class DummyStreamHelper(StreamHelper):
         return
 
     def expert_publish_content(self, expert_user, content, expert_profile_ids=None,
-                               tag_ids=None, super_admin=False):
+                               tag_ids=None, super_admin=False, time=None):
         return {}
 
     def get_expert_feed(self, expert_user_id, limit=settings.STREAM_READ_LIMIT, offset=0):
@@ -377,6 +579,30 @@ class DummyStreamHelper(StreamHelper):
     def get_user_tag_followed_feeds(self, user_id, limit=settings.STREAM_READ_LIMIT, offset=0):
         return []
 
+    def get_activities_from_stream(self, feed_type, feed_key_id, limit=settings.STREAM_READ_LIMIT, offset=0,
+                                   id_lt=None, id_gt=None):
+        return []
+
+    def follow_many(self, follows, activity_copy_limit=STREAM_ACTIVITY_COPY_LIMIT):
+        return
+
+    def unfollow_many(self, follows):
+        return
+
+    def remove_activities(self, feeds, foreign_id):
+        return
+
+
+class LocalStreamHelper(StreamHelper):
+    """
+    StreamHelper on the local feed engine, for the load tests and the environments without Getstream
+    """
+
+    def __init__(self):
+        self.client = LocalStreamClient(STREAM_LOCAL_DATABASE or ':memory:')
+
 
-if settings.TEST_MODE:
+if STREAM_LOCAL_DATABASE:
+    StreamHelper = LocalStreamHelper
+elif settings.TEST_MODE:
     StreamHelper = DummyStreamHelper
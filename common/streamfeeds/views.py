@@ -1,21 +1,32 @@
+from collections import OrderedDict
+
 from django.conf import settings
 from django.http import Http404
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from experchat.models.users import Expert, ExpertProfile
 from experchat.permissions import IsUserPermission
-from feeds.models import Content
-from feeds.serializers import ContentSerializer
+from feeds.counters import get_many_buffered_likes
+from feeds.models import Content, ContentUserActivity
+from feeds.serializers import ContentCacheSerializer, get_user_activities
+from streamfeeds.cache import ContentCache
 from streamfeeds.serializers import UserAggregatedFeedSerializer
-from streamfeeds.utils import StreamHelper, paginate_stream_result, read_content_feeds_getstream
+from streamfeeds.utils import StreamHelper, decode_stream_cursor, paginate_stream_result, read_content_feeds_getstream
 from users.models import FollowTags
 
 
 class ContentMapMixin(object):
     """
     Mixin class for mapping the stream feeds with content model
+
+    The feeds are paginated on the activity ids : {?cursor=<next or previous cursor of the metadata>}
+    For leaving out the content JSON : {?exclude=content}
     """
+    # heavy fields which the clients may leave out of the response, they are not loaded from the database either
+    excludable_fields = ('content',)
+
     def get_feed_limits(self, request):
         # Check for the defualt limit and offset to be passed to streamfeed
         try:
@@ -33,6 +44,59 @@ class ContentMapMixin(object):
 
         return limit, offset
 
+    def get_stream_position(self, request):
+        """
+        Get the position in the feed from the cursor of the request
+        Return:
+            position (dict): id_lt or id_gt activity id, empty for the first page or an offset
+        Raise:
+            NotFound if the cursor is invalid
+        """
+        cursor = request.query_params.get('cursor')
+        if not cursor:
+            return {}
+        try:
+            return decode_stream_cursor(cursor)
+        except ValueError:
+            raise NotFound('Invalid cursor.')
+
+    def get_stream_page(self, request, feed_type, feed_key_id):
+        """
+        Read a page of activities of the feed, at the cursor of the request or at its offset
+        Args:
+            request (obj): Requests
+            feed_type (str): feed group
+            feed_key_id (str): feed key in the group
+        Return:
+            activities (list), limit, offset and position of the page
+        """
+        limit, offset = self.get_feed_limits(request)
+        position = self.get_stream_position(request)
+        if position:
+            offset = 0
+        activities = StreamHelper().get_activities_from_stream(feed_type, feed_key_id, limit, offset, **position)
+        return activities, limit, offset, position
+
+    def get_stream_feeds(self, request, feed_type, feed_key_id):
+        """
+        Read a page of the feed and map it with Content model
+        Args:
+            request (obj): Requests
+            feed_type (str): feed group
+            feed_key_id (str): feed key in the group
+        Return:
+            Serialized data with Content Models and the cursors of the next and previous pages
+        """
+        activities, limit, offset, position = self.get_stream_page(request, feed_type, feed_key_id)
+        response = self.hydrate_contents(
+            request, [activity['object'] for activity in activities], self.get_excluded_fields(request)
+        )
+        return paginate_stream_result(request, response, limit, offset, activities, position)
+
+    def get_excluded_fields(self, request):
+        excluded_fields = request.query_params.get('exclude', '').split(',')
+        return tuple(field_name for field_name in self.excludable_fields if field_name in excluded_fields)
+
     def map_to_content_model(self, request, stream_feeds, limit, offset):
         """
         Method to map the Stream feed ids with Content model
@@ -43,10 +107,49 @@ class ContentMapMixin(object):
         Return:
             Serialized data with Content Models
         """
-        sorted_objects = read_content_feeds_getstream(stream_feeds)
-        response = ContentSerializer(sorted_objects, many=True, context={'request': request}).data
+        response = self.hydrate_contents(request, stream_feeds, self.get_excluded_fields(request))
         return paginate_stream_result(request, response, limit, offset)
 
+    def hydrate_contents(self, request, stream_feeds, excluded_fields=()):
+        """
+        Serialize the contents of the stream feeds. The data which is the same for every user is read from the
+        ContentCache, only the contents missing from it are loaded from the database, and the fields of the current
+        user and the likes which are not saved yet are added to it.
+        Args:
+            request (obj): Requests
+            stream_feeds (list): Content ids in the order of the stream
+            excluded_fields (tuple): Content fields left out of the response
+        Return:
+            list of serialized contents
+        """
+        content_ids = list(OrderedDict.fromkeys(int(content_id) for content_id in stream_feeds))
+        versions = ContentCache.get_many_versions(content_ids)
+        contents = ContentCache.get_many(versions, excluded_fields)
+
+        missing_ids = [content_id for content_id in content_ids if content_id not in contents]
+        if missing_ids:
+            serializer = ContentCacheSerializer(
+                read_content_feeds_getstream(missing_ids, excluded_fields), many=True,
+                context={'excluded_fields': excluded_fields}
+            )
+            missing_contents = OrderedDict((content['id'], content) for content in serializer.data)
+            ContentCache.cache_many(missing_contents, versions, excluded_fields)
+            contents.update(missing_contents)
+
+        user_activities = get_user_activities(request, list(contents)) or set()
+        buffered_likes = get_many_buffered_likes(list(contents))
+        response = []
+        for content_id in content_ids:
+            if content_id not in contents:
+                # deleted, but not removed from the stream yet
+                continue
+            content = OrderedDict(contents[content_id])
+            content['likes'] = max(content['likes'] + buffered_likes.get(content_id, 0), 0)
+            content['liked_by_current_user'] = (content_id, ContentUserActivity.LIKE) in user_activities
+            content['saved_by_current_user'] = (content_id, ContentUserActivity.FAVORITE) in user_activities
+            response.append(content)
+        return response
+
 
 class ExpertFeedView(APIView, ContentMapMixin):
 
@@ -56,21 +159,14 @@ class ExpertFeedView(APIView, ContentMapMixin):
         except Expert.DoesNotExist:
             raise Http404
 
-        # Get the offset and limit for pagination
-        limit, offset = self.get_feed_limits(request)
-
-        expert_feeds = StreamHelper().get_expert_feed(expert.userbase_id, limit=limit, offset=offset)
-        paginated_response = self.map_to_content_model(request, expert_feeds, limit, offset)
+        paginated_response = self.get_stream_feeds(request, settings.STREAM_FEEDS_EXPERTS, expert.userbase_id)
         return Response(paginated_response)
 
 
 class TagFeedFeedView(APIView, ContentMapMixin):
 
     def get(self, request, tag_id):
-        # Get the offset and limit
-        limit, offset = self.get_feed_limits(request)
-        tag_feeds = StreamHelper().get_tag_feeds(tag_id, limit=limit, offset=offset)
-        paginated_response = self.map_to_content_model(request, tag_feeds, limit, offset)
+        paginated_response = self.get_stream_feeds(request, settings.STREAM_FEEDS_TAG, tag_id)
         return Response(paginated_response)
 
 
@@ -81,10 +177,7 @@ class ExpertProfileFeedView(APIView, ContentMapMixin):
             expert_id = ExpertProfile.objects.get(id=expert_profile_id).expert.userbase_id
         except ExpertProfile.DoesNotExist:
             raise Http404
-        # Get the offset and limit
-        limit, offset = self.get_feed_limits(request)
-        profile_feeds = StreamHelper().get_expert_feed(expert_id, limit=limit, offset=offset)
-        paginated_response = self.map_to_content_model(request, profile_feeds, limit, offset)
+        paginated_response = self.get_stream_feeds(request, settings.STREAM_FEEDS_EXPERTS, expert_id)
         return Response(paginated_response)
 
 
@@ -93,20 +186,20 @@ class SuperAdminFeedView(APIView, ContentMapMixin):
     Api to return the list of SuperAdmin feeds
     """
     def get(self, request):
-        # Get the offset and limit
-        limit, offset = self.get_feed_limits(request)
         # List of Tag Ids being Followed by the User .
         if hasattr(self.request.user, 'user'):
             followed_tag_ids = FollowTags.objects.filter(user=request.user.user).values_list('tag', flat=True)
             if followed_tag_ids:
+                # Get the offset and limit
+                limit, offset = self.get_feed_limits(request)
                 super_admin_feeds = Content.objects.filter(tags__in=followed_tag_ids).values_list('id', flat=True)
-            else:
-                # If User is not following any Tags , showing the default super-admin feeds
-                super_admin_feeds = StreamHelper().get_super_admin_feed(limit=limit, offset=offset)
-        else:
-            # For Experts or SuperAdmin who don't follow any Tags
-            super_admin_feeds = StreamHelper().get_super_admin_feed(limit=limit, offset=offset)
-        paginated_response = self.map_to_content_model(request, super_admin_feeds, limit, offset)
+                paginated_response = self.map_to_content_model(request, super_admin_feeds, limit, offset)
+                return Response(paginated_response)
+        # If User is not following any Tags, or for Experts or SuperAdmin who don't follow any Tags, showing the
+        # default super-admin feeds
+        paginated_response = self.get_stream_feeds(
+            request, settings.STREAM_FEEDS_USER, settings.STREAM_STATIC_SUPERADMIN_FEED
+        )
         return Response(paginated_response)
 
 
@@ -115,10 +208,9 @@ class GlobalUserFeedView(APIView, ContentMapMixin):
     Api to return the list of Global User feeds
     """
     def get(self, request):
-        # Get the offset and limit
-        limit, offset = self.get_feed_limits(request)
-        user_global_feeds = StreamHelper().get_user_global_feed(limit=limit, offset=offset)
-        paginated_response = self.map_to_content_model(request, user_global_feeds, limit, offset)
+        paginated_response = self.get_stream_feeds(
+            request, settings.STREAM_FEEDS_USER, settings.STREAM_STATIC_GLOBAL_FEED
+        )
         return Response(paginated_response)
 
 
@@ -129,12 +221,8 @@ class FollowingExpertFeeds(APIView, ContentMapMixin):
     permission_classes = (IsUserPermission,)
 
     def get(self, request, *args, **kwargs):
-        # Get the offset and limit
-        limit, offset = self.get_feed_limits(request)
-        user_expert_followed_feeds = StreamHelper().get_user_expert_followed_feeds(
-            request.user.user, limit=limit, offset=offset
-        )
-        paginated_response = self.map_to_content_model(request, user_expert_followed_feeds, limit, offset)
+        feed_key = StreamHelper().get_timeline_key(request.user.user, settings.STREAM_FEEDS_EXPERTS)
+        paginated_response = self.get_stream_feeds(request, settings.STREAM_FEEDS_USER, feed_key)
         return Response(paginated_response)
 
 
@@ -145,37 +233,23 @@ class FollowingTagFeeds(APIView, ContentMapMixin):
     permission_classes = (IsUserPermission,)
 
     def get(self, request, *args, **kwargs):
-        # Get the offset and limit
-        limit, offset = self.get_feed_limits(request)
-        user_tag_followed_feeds = StreamHelper().get_user_tag_followed_feeds(
-            request.user.user, limit=limit, offset=offset
-        )
-        paginated_response = self.map_to_content_model(request, user_tag_followed_feeds, limit, offset)
+        feed_key = StreamHelper().get_timeline_key(request.user.user, settings.STREAM_FEEDS_TAG)
+        paginated_response = self.get_stream_feeds(request, settings.STREAM_FEEDS_USER, feed_key)
         return Response(paginated_response)
 
 
-class UserAggregatedTimelineFeeds(APIView):
+class UserAggregatedTimelineFeeds(APIView, ContentMapMixin):
     """
     Api to return the list of feeds for Tag followed by User
     """
     permission_classes = (IsUserPermission,)
 
     def get(self, request, *args, **kwargs):
-        # Check for the defualt limit and offset to be passed to streamfeed
-        try:
-            offset = int(request.query_params.get('offset', 0))
-        except ValueError:
-            offset = 0
-
-        try:
-            limit = int(request.query_params.get('limit', settings.STREAM_READ_LIMIT))
-        except ValueError:
-            limit = settings.STREAM_READ_LIMIT
-
-        if limit > settings.STREAM_READ_LIMIT:
-            limit = settings.STREAM_READ_LIMIT
-        aggregated_timeline_feeds = StreamHelper().get_user_aggregated_timeline_feeds(
-            request.user.user, limit=limit, offset=offset
+        stream_helper = StreamHelper()
+        feed_key = stream_helper.get_timeline_key(request.user.user, settings.STREAM_FEEDS_EXPERTS)
+        activities, limit, offset, position = self.get_stream_page(
+            request, settings.USER_AGGREGATED_TIMELINE_FEED, feed_key
         )
+        aggregated_timeline_feeds = [stream_helper.format_aggregated_activity(activity) for activity in activities]
         response = UserAggregatedFeedSerializer(aggregated_timeline_feeds, many=True).data
-        return Response(paginate_stream_result(request, response, limit, offset))
+        return Response(paginate_stream_result(request, response, limit, offset, activities, position))
@@ -2,7 +2,7 @@ from datetime import timedelta
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
 from django.db.models import Case, Count, IntegerField, Q, When
 from django.shortcuts import get_object_or_404
 from django.template import loader
@@ -31,12 +31,11 @@ from experchat.serializers import (
     CalendarSerializer, EmptySerializer, ExpertProfileDetailSerializer, ExpertProfileListSerializer,
     ExpertProfileSerializer, SessionRatingSerializer, TagSerializer, UserSerializer
 )
-from experchat.utils import (
-    create_image_thumbnail, custom_send_mail, filter_slots, get_booked_and_available_slots, split_and_update_price
-)
+from experchat.utils import create_image_thumbnail, custom_send_mail, get_available_slots, split_and_update_price
 from experchat.views import ExperChatAPIView
 from feeds.models import SocialLink
 from feeds.serializers import SocialLinkSerializer, SocialLinkUpdateSerializer
+from streamfeeds.outbox import enqueue_stream_operation
 from streamfeeds.utils import StreamHelper
 from users.models import ExpertAccount, FollowTags
 from users.serializers import (
@@ -451,8 +450,7 @@ class ExpertAppointmentsView(ExperChatAPIView):
 
     def get(self, request, user_type=None, expert_id=None, format=None):
         time_zone = request.query_params.get('timezone')
-        available_slots, booked_slots = get_booked_and_available_slots(expert_id)
-        filtered_slots = filter_slots(available_slots, booked_slots)
+        filtered_slots = get_available_slots(expert_id)
         final_slots = split_and_update_price(filtered_slots, time_zone)
         final_data = {'metadata': {'expert_id': expert_id},
                       'results': final_slots}
@@ -544,9 +542,12 @@ class FollowExpertView(APIView):
     def post(self, request, expert_id, *args, **kwargs):
         expert = get_object_or_404(Expert, pk=expert_id)
         try:
-            FollowExpert.objects.create(user=request.user.user, expert=expert)
-            # follow expert in streamfeed
-            StreamHelper().follow_experts(expert.id, request.user.user)
+            with transaction.atomic():
+                FollowExpert.objects.create(user=request.user.user, expert=expert)
+                # follow expert in streamfeed
+                enqueue_stream_operation(
+                    'follow_many', StreamHelper().get_expert_follows(expert.id, request.user.user)
+                )
         except IntegrityError:
             pass
         return Response(status=status.HTTP_204_NO_CONTENT)
@@ -560,10 +561,13 @@ class UnFollowExpertView(APIView):
 
     def post(self, request, expert_id, *args, **kwargs):
         expert = get_object_or_404(Expert, pk=expert_id)
-        instance_deleted = FollowExpert.objects.filter(user__userbase=request.user, expert=expert).delete()
-        if instance_deleted[0] > 0:
-            # unfollow the expert from streamfeeds
-            StreamHelper().unfollow_expert(expert.id, request.user.user)
+        with transaction.atomic():
+            instance_deleted = FollowExpert.objects.filter(user__userbase=request.user, expert=expert).delete()
+            if instance_deleted[0] > 0:
+                # unfollow the expert from streamfeeds
+                enqueue_stream_operation(
+                    'unfollow_many', StreamHelper().get_expert_follows(expert.id, request.user.user)
+                )
 
         return Response(status=status.HTTP_204_NO_CONTENT)
 
@@ -670,20 +674,30 @@ class FollowTagsView(APIView):
             )
 
         # Tag ids already being followed by the user
-        existing_tag_ids = FollowTags.objects.filter(user_id=request.user.user).values_list('tag_id', flat=True)
+        existing_tag_ids = set(
+            FollowTags.objects.filter(user_id=request.user.user).values_list('tag_id', flat=True)
+        )
 
         # Remove Tags which user doesn't want to follow
-        tags_ids_to_be_removed = set(existing_tag_ids) - set(new_tag_ids)
-        # if any tag ids needs to be removed then we need to unfollow that tags from getstream
-        FollowTags.objects.filter(tag_id__in=tags_ids_to_be_removed).delete()
-        stream_helper.unfollow_tags(tags_ids_to_be_removed, request.user.user)
-
+        tags_ids_to_be_removed = existing_tag_ids - set(new_tag_ids)
         # New Tags user wants to follow
-        tags_ids_to_be_added = set(new_tag_ids) - set(existing_tag_ids)
-        # Creating the new tag_ids to follow
-        new_objs = [FollowTags(user=request.user.user, tag=Tag(tag_id)) for tag_id in tags_ids_to_be_added]
-        FollowTags.objects.bulk_create(new_objs)
-        stream_helper.follow_tags(new_objs, request.user.user)
+        tags_ids_to_be_added = set(new_tag_ids) - existing_tag_ids
+
+        with transaction.atomic():
+            # if any tag ids needs to be removed then we need to unfollow that tags from getstream
+            if tags_ids_to_be_removed:
+                FollowTags.objects.filter(user=request.user.user, tag_id__in=tags_ids_to_be_removed).delete()
+                enqueue_stream_operation(
+                    'unfollow_many', stream_helper.get_tag_follows(sorted(tags_ids_to_be_removed), request.user.user)
+                )
+
+            # Creating the new tag_ids to follow
+            if tags_ids_to_be_added:
+                new_objs = [FollowTags(user=request.user.user, tag=Tag(tag_id)) for tag_id in tags_ids_to_be_added]
+                FollowTags.objects.bulk_create(new_objs)
+                enqueue_stream_operation(
+                    'follow_many', stream_helper.get_tag_follows(sorted(tags_ids_to_be_added), request.user.user)
+                )
 
         queryset = self.queryset.filter(id__in=new_tag_ids)
         serializer = self.get_tag_serializer(request, queryset)
@@ -62,3 +62,16 @@ BRAINTREE_PUBLIC_KEY = "********"
 BRAINTREE_PRIVATE_KEY = "********"
 
 TEST_CARD_ID = 1
+
+# CACHE BACKEND
+# Expert availability is cached in this backend and invalidated by the service booking the session, so it needs to be
+# the same backend as the other services.
+CACHES = {
+    "default": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": "redis://127.0.0.1:6379/1",
+        "OPTIONS": {
+            "CLIENT_CLASS": "django_redis.client.DefaultClient",
+        }
+    }
+}
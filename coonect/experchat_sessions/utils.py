@@ -6,7 +6,7 @@ from django.db.models.expressions import RawSQL
 from django.utils import timezone
 
 from experchat.models.promocodes import PromoCode
-from experchat.utils import filter_slots, get_booked_and_available_slots
+from experchat.utils import get_available_slots
 from experchat_sessions.models import Session, SessionEvent
 from payments.models import Transaction
 
@@ -109,8 +109,7 @@ def is_already_scheduled(user, start_date_time, duration):
 
 
 def is_valid_scheduled_slot(expert_id, start_date_time, duration):
-    available_slots, booked_slots = get_booked_and_available_slots(expert_id)
-    filtered_slots = filter_slots(available_slots, booked_slots)
+    filtered_slots = get_available_slots(expert_id)
 
     end_date_time = start_date_time + timezone.timedelta(minutes=duration)
     for slot in filtered_slots:
@@ -61,3 +61,16 @@ SOLR_TAG_COLLECTION_URL = "{solr_protocol}{solr_url}:{solr_port}/solr/{solr_tag_
     solr_port=SOLR_PORT,
     solr_tag_collection_name=SOLR_TAG_COLLECTION_NAME
 )
+
+# CACHE BACKEND
+# Expert availability is cached in this backend and invalidated by the service booking the session, so it needs to be
+# the same backend as the other services.
+CACHES = {
+    "default": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": "redis://127.0.0.1:6379/1",
+        "OPTIONS": {
+            "CLIENT_CLASS": "django_redis.client.DefaultClient",
+        }
+    }
+}